@@ -1,8 +1,19 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, make_response, send_from_directory
 from flask_cors import CORS
-import random
+import atexit
+import calendar
+import csv
+import functools
+import io
+import os
 import time
+from catalogue import SUPPORTED as catalogue_supported
+from json_provider import install as install_json_provider
+from metrics import Metrics
 from models import Database
+from profiling import ENGINES as profiling_engines, ProfileStore, install as install_profiling
+from rng import RandomStreams
+from simulation import run_monte_carlo
 
 """
 Youth Micro-Investing Platform API
@@ -17,14 +28,21 @@ API Documentation:
     
 Endpoints:
     - GET  /health                     - Health check
+    - GET  /metrics                    - Prometheus metrics (requests, SQL, pool, cache)
     - GET  /projects                   - List investment projects
     - POST /invest                     - Make an investment
+    - POST /invest/batch               - Make several investments atomically
     - GET  /portfolio                  - Get user portfolio
+    - GET  /portfolio/export           - Stream investment history as NDJSON or CSV
+    - GET  /portfolio/history          - Portfolio value time series (raw/daily/monthly)
     - GET  /simulation                 - Get simulation data for charts
     - GET  /user/balance              - Get user balance
     - POST /user/reset-balance        - Reset user balance and investments
+    - POST /user/reset-balance/batch  - Reset many users at once
     - POST /user/update-investments   - Update investment values
     - GET  /user/investment-performance - Get investment performance summary
+    - GET  /admin/profiles             - List recorded request profiles (PROFILING=1)
+    - GET  /admin/profiles/<id>        - Download one request profile
 """
 
 #app = Flask(__name__)
@@ -32,9 +50,107 @@ app = Flask(__name__, static_folder="../frontend/build", static_url_path="/")
 
 CORS(app)  # Enable CORS for all routes
 
-# Initialize database
+# Response JSON encoding: orjson when installed, else the standard library
+# (JSON_PROVIDER=stdlib forces the fallback; see json_provider.py)
+json_provider = install_json_provider(app, os.environ.get('JSON_PROVIDER', 'auto'))
 
-db = Database()
+# Request, Database and SQL timings for /metrics (METRICS=0 turns them off)
+metrics = None
+if os.environ.get('METRICS', '1') != '0':
+    slow_query_ms = os.environ.get('SLOW_QUERY_MS')
+    metrics = Metrics(slow_query_ms=float(slow_query_ms) if slow_query_ms else None)
+
+# Seeded per-user, per-day random streams behind all simulated numbers, so
+# the same request on the same day returns the same response (see rng.py)
+streams = RandomStreams(seed=int(os.environ.get('RNG_SEED', 0)))
+
+# Project catalogue read model: one memory-mapped file next to the database
+# shared by every worker (see catalogue.py). Off unless CATALOGUE_READ_MODEL=1:
+# with the page cache in front it has not shown a per-worker memory win
+database_path = os.environ.get('DATABASE_PATH', 'database.db')
+catalogue_path = None
+if catalogue_supported and database_path != ':memory:' and os.environ.get('CATALOGUE_READ_MODEL', '0') == '1':
+    catalogue_path = database_path + '.catalogue'
+
+# Initialize database (pool size is per worker process)
+
+db = Database(
+    database_path,
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+    projects_cache_ttl=float(os.environ.get('PROJECTS_CACHE_TTL', 30)),
+    performance_cache_ttl=float(os.environ.get('PERFORMANCE_CACHE_TTL', 10)),
+    metrics=metrics,
+    streams=streams,
+    catalogue_path=catalogue_path
+)
+atexit.register(db.close)
+
+# Opt-in per-request profiling (see profiling.py); views are only wrapped
+# when PROFILING=1, so it costs nothing otherwise
+PROFILING = os.environ.get('PROFILING', '0') == '1'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN') or None
+profile_store = ProfileStore(size=int(os.environ.get('PROFILE_HISTORY', 20)))
+
+if metrics is not None:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # Label by route pattern, not raw path, to keep the series bounded
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe_request(request.method, route, response.status_code,
+                                    time.perf_counter() - started)
+        return response
+
+def conditional(version):
+    """Answer ``If-None-Match`` with 304 when a GET view's response is unchanged
+    
+    ``version`` returns the parts the response depends on (revision counters,
+    the RNG period, ...) and must be far cheaper than the view: on a match
+    the view is never called. 200 responses carry the version as their ETag,
+    with ``Cache-Control: no-cache`` so clients revalidate every time.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = '-'.join(str(part) for part in version())
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def user_revision():
+    """The requested user id and the revision of that user's balance and portfolio"""
+    user_id = request.args.get('user_id', 1, type=int)
+    return user_id, db.get_user_revision(user_id)
+
+# Most legs accepted by a single /invest/batch request
+MAX_BATCH_INVESTMENTS = 50
+
+# Most users reset by a single /user/reset-balance/batch request
+MAX_BATCH_RESET_USERS = 10000
+
+# Largest page /projects will return when paginating
+MAX_PROJECTS_PAGE = 100
+
+# Rows read per fetchmany() and written per chunk by /portfolio/export
+EXPORT_CHUNK_SIZE = 1000
+
+# Upper bounds for the /simulation Monte Carlo parameters
+MAX_SIMULATION_PATHS = 100000
+MAX_SIMULATION_HORIZON = 120
 
 @app.route("/") 
 def serve_index(): 
@@ -76,7 +192,51 @@ def index():
         'version': '1.0.0'
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Expose request, Database and SQL metrics in Prometheus text format
+    
+    Values are per worker process and start from zero when it starts.
+    
+    Returns:
+        200 text/plain: Prometheus exposition format
+        404 JSON: Metrics are disabled (METRICS=0)
+        
+    Metrics:
+        http_requests_total{method, route, status}      - Requests handled
+        http_request_duration_seconds{method, route}    - Request latency histogram
+        db_method_duration_seconds{method}              - Database method latency histogram
+        db_query_duration_seconds{method, operation}    - SQL execute + fetch histogram
+        db_query_rows_total{method, operation}          - Rows returned or changed
+        db_slow_queries_total{method, operation}        - Statements over SLOW_QUERY_MS
+        db_pool_wait_seconds{pool}                      - Time waiting for a connection
+        db_pool_connections{pool, state}                - Pooled connections in use / idle
+        db_pool_checkouts_total{pool, result}           - Connections reused vs opened
+        cache_lookups_total{cache, result}              - Response cache hits and misses
+    
+    Example:
+        GET /metrics
+        Response: 200 OK
+        # HELP http_requests_total HTTP requests handled
+        # TYPE http_requests_total counter
+        http_requests_total{method="GET",route="/portfolio",status="200"} 42
+        ...
+    
+    Notes:
+        - Statements slower than SLOW_QUERY_MS milliseconds are also logged
+          with the Database method that ran them
+    """
+    if metrics is None:
+        return jsonify({
+            'success': False,
+            'message': 'Metrics are disabled'
+        }), 404
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/projects', methods=['GET'])
+@conditional(lambda: ('projects', db.get_catalogue_revision(), streams.seed, streams.period()))
 def get_projects():
     """
     Get all available investment projects
@@ -85,13 +245,22 @@ def get_projects():
     Each project includes details about the business, funding status, risk level,
     and expected return on investment.
     
+    Filtering, sorting and pagination all run in SQL, so the payload stays
+    small however large the catalogue grows.
+    
     Query Parameters:
         category (optional): Filter projects by category (e.g., "food", "tech", "retail")
         min_funding (optional): Minimum funding percentage
         max_funding (optional): Maximum funding percentage
+        sort (optional): "newest" (default), "roi", "risk" or "funding"
+        order (optional): "asc" or "desc" (default depends on sort)
+        limit (optional): Page size, 1-100 (default: all projects)
+        cursor (optional): next_cursor from the previous page
     
     Returns:
         200 JSON: Success response with projects data
+        304: Unchanged since the ETag sent in If-None-Match
+        400 JSON: Invalid filter, sort or cursor
         500 JSON: Server error
         
     Response Schema:
@@ -111,7 +280,8 @@ def get_projects():
                     "min_investment": <float>
                 }
             ],
-            "total_projects": <int>
+            "total_projects": <int>,
+            "next_cursor": <string> | null
         }
         
     Example:
@@ -133,7 +303,8 @@ def get_projects():
                     "min_investment": 50.0
                 }
             ],
-            "total_projects": 12
+            "total_projects": 12,
+            "next_cursor": null
         }
         
     Error Response:
@@ -143,27 +314,57 @@ def get_projects():
         }
     """
     try:
-        projects = db.get_projects()
+        limit = request.args.get('limit', None, type=int)
+        if limit is not None and not 1 <= limit <= MAX_PROJECTS_PAGE:
+            return jsonify({
+                'success': False,
+                'message': f'limit must be between 1 and {MAX_PROJECTS_PAGE}'
+            }), 400
+        
+        try:
+            page = db.get_projects_page(
+                category=request.args.get('category'),
+                min_funding=request.args.get('min_funding', None, type=float),
+                max_funding=request.args.get('max_funding', None, type=float),
+                sort=request.args.get('sort', 'newest'),
+                order=request.args.get('order'),
+                limit=limit,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        projects = page['projects']
+        
+        # Today's draws for every project id: one row per project, so a
+        # project shows the same numbers whichever page it appears on
+        draws = streams.uniform_table('projects', max((p['id'] for p in projects), default=0) + 1, 3)
         
         # Add some dynamic data for realism
         for project in projects:
+            u_volatility, u_days, u_investors = draws[project['id']].tolist()
+            
             # Calculate funding percentage
             project['funding_percentage'] = (project['current_funding'] / project['funding_goal']) * 100
             
             # Simulate some market volatility for current values
-            volatility = random.uniform(-0.05, 0.05)  # ±5% volatility
+            volatility = -0.05 + 0.1 * u_volatility  # ±5% volatility
             project['current_market_value'] = project['current_funding'] * (1 + volatility)
             
-            # Add time remaining (random for demo)
-            project['days_remaining'] = random.randint(15, 90)
+            # Add time remaining (random for demo, 15-90)
+            project['days_remaining'] = 15 + int(u_days * 76)
             
-            # Add investor count (simulated)
-            project['investor_count'] = random.randint(5, 50)
+            # Add investor count (simulated, 5-50)
+            project['investor_count'] = 5 + int(u_investors * 46)
         
         return jsonify({
             'success': True,
             'projects': projects,
-            'total_projects': len(projects)
+            'total_projects': len(projects),
+            'next_cursor': page['next_cursor']
         })
     
     except Exception as e:
@@ -289,7 +490,126 @@ def invest_in_project():
             'message': f'Error processing investment: {str(e)}'
         }), 500
 
+@app.route('/invest/batch', methods=['POST'])
+def invest_in_projects_batch():
+    """
+    Invest virtual capital in several projects at once
+    
+    Applies a whole basket of investments (e.g. "allocate my $10k across 6
+    projects") in a single database transaction. The basket is validated against
+    the user's balance once, and either every leg is applied or none is.
+    
+    Request Body:
+        {
+            "investments": [
+                {
+                    "project_id": <int> (required) - ID of the project to invest in,
+                    "amount": <float> (required) - Investment amount in USD
+                }
+            ] (required, 1-50 legs),
+            "user_id": <int> (optional) - User ID, defaults to 1
+        }
+    
+    Returns:
+        200 JSON: Every leg was applied
+        400 JSON: Validation error; nothing was applied
+        500 JSON: Server error
+        
+    Response Schema:
+        {
+            "success": <bool>,
+            "message": <string>,
+            "total_amount": <float>,
+            "new_balance": <float>,
+            "results": [
+                {
+                    "project_id": <int>,
+                    "amount": <float>,
+                    "success": <bool>,
+                    "message": <string>,
+                    "investment_id": <int>
+                }
+            ]
+        }
+    
+    Example:
+        POST /invest/batch
+        Request:
+        {
+            "user_id": 1,
+            "investments": [
+                {"project_id": 1, "amount": 500.0},
+                {"project_id": 2, "amount": 250.0}
+            ]
+        }
+        
+        Response: 200 OK
+        {
+            "success": true,
+            "message": "2 investments successful",
+            "total_amount": 750.0,
+            "new_balance": 9250.0,
+            "results": [
+                {"project_id": 1, "amount": 500.0, "success": true, "message": "Investment successful", "investment_id": 7},
+                {"project_id": 2, "amount": 250.0, "success": true, "message": "Investment successful", "investment_id": 8}
+            ]
+        }
+        
+    Error Examples:
+        - Insufficient funds: {"success": false, "message": "Insufficient balance", "results": [...]}
+        - Unknown project: {"success": false, "message": "One or more projects not found", "results": [...]}
+        - Invalid leg: {"success": false, "message": "Investment 2: amount must be positive"}
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('investments'), list) or not data['investments']:
+            return jsonify({
+                'success': False,
+                'message': 'A non-empty list of investments is required'
+            }), 400
+        
+        if len(data['investments']) > MAX_BATCH_INVESTMENTS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BATCH_INVESTMENTS} investments per batch'
+            }), 400
+        
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        legs = []
+        for index, leg in enumerate(data['investments'], start=1):
+            project_id = leg.get('project_id') if isinstance(leg, dict) else None
+            amount = leg.get('amount') if isinstance(leg, dict) else None
+            
+            if not project_id or not amount:
+                return jsonify({
+                    'success': False,
+                    'message': f'Investment {index}: project ID and amount are required'
+                }), 400
+            
+            if amount <= 0:
+                return jsonify({
+                    'success': False,
+                    'message': f'Investment {index}: amount must be positive'
+                }), 400
+            
+            legs.append({'project_id': project_id, 'amount': amount})
+        
+        result = db.make_investments(user_id, legs)
+        
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error processing investments: {str(e)}'
+        }), 500
+
 @app.route('/portfolio', methods=['GET'])
+@conditional(lambda: ('portfolio', *user_revision(), streams.seed, streams.period()))
 def get_portfolio():
     """
     Get user's investment portfolio
@@ -300,9 +620,14 @@ def get_portfolio():
     
     Query Parameters:
         user_id (optional): User ID, defaults to 1
+        format (optional): 'records' (default) for a list of investment
+            objects, or 'columns' for one array per field, which is smaller
+            and faster to encode for large portfolios
     
     Returns:
         200 JSON: Portfolio data with performance calculations
+        304: Unchanged since the ETag sent in If-None-Match
+        400 JSON: Unknown format
         404 JSON: User not found
         500 JSON: Server error
         
@@ -373,10 +698,22 @@ def get_portfolio():
         - Current values are simulated based on time elapsed, risk level, and market volatility
         - Return calculations include both positive and negative scenarios
         - Diversification shows investment distribution across categories
+        - With format=columns, "investments" is {"id": [...], "amount": [...], ...}
+          with every array in the same (newest first) order
     """
     try:
         user_id = request.args.get('user_id', 1, type=int)
-        portfolio = db.get_portfolio(user_id)
+        layout = request.args.get('format', 'records')
+        if layout not in ('records', 'columns'):
+            return jsonify({
+                'success': False,
+                'message': "format must be 'records' or 'columns'"
+            }), 400
+        
+        # Read investments into a compact Positions table (positions.py); the
+        # simulation below runs on its columns and the response lists are
+        # only built once, at the end
+        portfolio = db.get_portfolio(user_id, row_format='positions')
         
         if not portfolio['user']:
             return jsonify({
@@ -384,29 +721,44 @@ def get_portfolio():
                 'message': 'User not found'
             }), 404
         
-        # Simulate investment growth/loss over time
-        for investment in portfolio['investments']:
-            # Simple simulation: random daily change based on risk level
-            days_since_investment = random.randint(1, 30)  # Simulate time passage
-            
-            risk_multiplier = {
-                'Low': 0.002,    # 0.2% daily volatility
-                'Medium': 0.005, # 0.5% daily volatility
-                'High': 0.01     # 1% daily volatility
-            }.get(investment['risk_level'], 0.005)
-            
-            # Calculate simulated returns
-            expected_daily_return = investment['expected_roi'] / 365 / 100
-            random_factor = random.uniform(-risk_multiplier, risk_multiplier)
-            daily_return = expected_daily_return + random_factor
-            
-            # Update current value
-            investment['current_value'] = investment['amount'] * (1 + daily_return * days_since_investment)
-            investment['return_percentage'] = ((investment['current_value'] - investment['amount']) / investment['amount']) * 100
-            investment['return_amount'] = investment['current_value'] - investment['amount']
+        positions = portfolio['investments']
+        amount = positions.amount
+        
+        # Simulate investment growth/loss over time, from the user's stream
+        # for today so the same request returns the same portfolio
+        rng = streams.generator('portfolio', user_id)
+        count = len(amount)
+        days_since_investment = rng.integers(1, 31, count)  # Simulate time passage (1-30 days)
+        uniforms = rng.random(count)
+        
+        # Simple simulation: random daily change based on risk level
+        daily_volatility = {
+            'Low': 0.002,    # 0.2% daily volatility
+            'Medium': 0.005, # 0.5% daily volatility
+            'High': 0.01     # 1% daily volatility
+        }
+        risk_multiplier = positions.map_labels('risk_level', daily_volatility, 0.005)
+        
+        # Calculate simulated returns
+        expected_daily_return = positions.expected_roi / 365 / 100
+        random_factor = risk_multiplier * (2 * uniforms - 1)
+        daily_return = expected_daily_return + random_factor
+        
+        # Update current values
+        current_value = amount * (1 + daily_return * days_since_investment)
+        investments = positions.columns()
+        investments['current_value'] = current_value.tolist()
+        investments['return_percentage'] = ((current_value - amount) / amount * 100).tolist()
+        investments['return_amount'] = (current_value - amount).tolist()
+        
+        if layout == 'records':
+            columns = list(investments)
+            portfolio['investments'] = [dict(zip(columns, row)) for row in zip(*investments.values())]
+        else:
+            portfolio['investments'] = investments
         
         # Recalculate totals
-        total_current_value = sum(inv['current_value'] for inv in portfolio['investments'])
+        total_current_value = sum(investments['current_value'])
         total_return = total_current_value - portfolio['total_invested']
         total_return_percentage = (total_return / portfolio['total_invested'] * 100) if portfolio['total_invested'] > 0 else 0
         
@@ -414,15 +766,8 @@ def get_portfolio():
         portfolio['total_return'] = total_return
         portfolio['total_return_percentage'] = total_return_percentage
         
-        # Add portfolio diversity metrics
-        categories = {}
-        for inv in portfolio['investments']:
-            category = inv['category']
-            if category not in categories:
-                categories[category] = 0
-            categories[category] += inv['amount']
-        
-        portfolio['diversification'] = categories
+        # Portfolio diversity metrics (portfolio['diversification']) are the
+        # per-category totals of the Positions table
         
         return jsonify({
             'success': True,
@@ -435,6 +780,201 @@ def get_portfolio():
             'message': f'Error fetching portfolio: {str(e)}'
         }), 500
 
+@app.route('/portfolio/export', methods=['GET'])
+def export_portfolio():
+    """
+    Stream a user's full investment history as NDJSON or CSV
+    
+    Investments are read with fetchmany() in chunks of EXPORT_CHUNK_SIZE and
+    written out as they are read, so memory use stays flat no matter how
+    long the history is. Values are the stored ones (as last revalued), not
+    the simulated values /portfolio shows.
+    
+    Query Parameters:
+        user_id (optional): User ID, defaults to 1
+        format (optional): 'ndjson' (default) or 'csv'
+        since (optional): Only investments made at or after this UTC date/time
+            (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)
+        until (optional): Only investments made before this UTC date/time
+    
+    Returns:
+        200 NDJSON/CSV: One line per investment, oldest first (CSV has a header row)
+        400 JSON: Unknown format or malformed since/until
+        404 JSON: User not found
+        500 JSON: Server error
+        
+    Line Schema (NDJSON):
+        {
+            "id": <int>,
+            "project_id": <int>,
+            "project_name": <string>,
+            "category": <string>,
+            "risk_level": <string>,
+            "expected_roi": <float>,
+            "amount": <float>,
+            "current_value": <float>,
+            "investment_date": <string>
+        }
+        
+    Example:
+        GET /portfolio/export?user_id=1&format=csv&since=2024-01-01
+        Response: 200 OK (Content-Disposition: attachment; filename=portfolio-1.csv)
+        id,project_id,project_name,category,risk_level,expected_roi,amount,current_value,investment_date
+        1,1,Green Leaf Cafe,Food & Beverage,Medium,12.5,500.0,515.0,2024-01-01 10:00:00
+        
+    Notes:
+        - since is inclusive and until exclusive, so consecutive ranges don't overlap
+        - The export reads one consistent snapshot even if the user invests meanwhile
+    """
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({
+                'success': False,
+                'message': "format must be 'ndjson' or 'csv'"
+            }), 400
+        
+        if not db.get_user(user_id):
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+        
+        try:
+            columns, chunks = db.export_investments(
+                user_id,
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                chunk_size=EXPORT_CHUNK_SIZE
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        if export_format == 'csv':
+            def generate():
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator='\n')
+                writer.writerow(columns)
+                for rows in chunks:
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                yield buffer.getvalue()
+            mimetype = 'text/csv'
+        else:
+            dumps = app.json.dumps
+            def generate():
+                for rows in chunks:
+                    yield ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows)
+            mimetype = 'application/x-ndjson'
+        
+        return Response(generate(), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=portfolio-{user_id}.{export_format}'
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error exporting portfolio: {str(e)}'
+        }), 500
+
+@app.route('/portfolio/history', methods=['GET'])
+def get_portfolio_history():
+    """
+    Get a user's portfolio value over time
+    
+    Reads the snapshot time series recorded by every revaluation (see
+    snapshots.py): raw snapshots, or the precomputed daily or monthly
+    rollups, so a chart over years of history is still a few hundred points.
+    
+    Query Parameters:
+        user_id (optional): User ID, defaults to 1
+        since (optional): Start, UTC date/time (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS);
+            the day or month it falls in is included
+        until (optional): End (exclusive), UTC date/time; defaults to now
+        resolution (optional): 'raw', 'daily', 'monthly' or 'auto' (default),
+            which picks the finest one returning at most 400 points
+        limit (optional): Only the most recent N points
+    
+    Returns:
+        200 JSON: History points, oldest first
+        400 JSON: Malformed date, resolution or limit
+        500 JSON: Server error
+        
+    Response Schema:
+        {
+            "success": true,
+            "resolution": "raw" | "daily" | "monthly",
+            "points": [
+                {
+                    "time": <string>,
+                    "open": <float>,
+                    "high": <float>,
+                    "low": <float>,
+                    "value": <float>,
+                    "invested": <float>,
+                    "samples": <int>
+                }
+            ]
+        }
+        
+    Example:
+        GET /portfolio/history?user_id=1&since=2024-01-01&resolution=monthly
+        Response: 200 OK
+        {
+            "success": true,
+            "resolution": "monthly",
+            "points": [
+                {"time": "2024-01-01T00:00:00Z", "open": 1000.0, "high": 1042.5, "low": 998.1,
+                 "value": 1031.2, "invested": 1000.0, "samples": 31}
+            ]
+        }
+        
+    Notes:
+        - time is the snapshot time (raw) or the start of the UTC day/month
+        - value is the last value in the bucket; open/high/low cover the bucket
+        - A user's history is cleared when they reset their balance
+    """
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        limit = request.args.get('limit', None, type=int)
+        if limit is not None and limit < 1:
+            return jsonify({
+                'success': False,
+                'message': 'limit must be a positive integer'
+            }), 400
+        
+        try:
+            history = db.get_portfolio_history(
+                user_id,
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                resolution=request.args.get('resolution', 'auto'),
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'resolution': history['resolution'],
+            'points': history['points']
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching portfolio history: {str(e)}'
+        }), 500
+
 @app.route('/simulation', methods=['GET'])
 def get_simulation_data():
     """
@@ -444,8 +984,20 @@ def get_simulation_data():
     including portfolio growth over time, risk distribution, economic impact
     metrics, and market trend comparisons.
     
+    Also runs a Monte Carlo projection of the user's actual holdings: every
+    project position is simulated with its expected ROI as drift and its risk
+    level volatility, and the results are summarised as percentile bands.
+    
+    Query Parameters:
+        user_id (optional): User ID, defaults to 1
+        paths (optional): Number of simulated futures, 1-100000 (default 1000)
+        horizon (optional): Months to project, 1-120 (default 12)
+        seed (optional): Integer seed for the Monte Carlo bands; defaults to
+            one derived from the user and day (see RNG_SEED)
+    
     Returns:
         200 JSON: Comprehensive simulation data for visualizations
+        400 JSON: Invalid Monte Carlo parameters or a negative user_id/seed
         500 JSON: Server error
         
     Response Schema:
@@ -478,7 +1030,26 @@ def get_simulation_data():
                         "market_index": <float>,
                         "your_portfolio": <float>
                     }
-                ]
+                ],
+                "monte_carlo": {
+                    "paths": <int>,
+                    "horizon_months": <int>,
+                    "seed": <int>,
+                    "start_value": <float>,
+                    "bands": [
+                        {
+                            "month": <int>,
+                            "mean": <float>,
+                            "p5": <float>,
+                            "p25": <float>,
+                            "p50": <float>,
+                            "p75": <float>,
+                            "p95": <float>
+                        }
+                    ],
+                    "expected_final_value": <float>,
+                    "probability_of_loss": <float>
+                } | null
             }
         }
         
@@ -512,12 +1083,65 @@ def get_simulation_data():
         
     Notes:
         - All data is simulated for educational purposes
-        - Portfolio growth assumes regular monthly investments
+        - Portfolio growth assumes regular monthly investments until the user
+          has revaluation history; then it shows their last 6 monthly closes
         - Economic impact metrics demonstrate local community benefits
-        - Market trends compare portfolio performance to broader market indices
+        - Market trends compare portfolio performance to broader market indices;
+          with at least 2 days of history, your_portfolio is the user's daily
+          close indexed to 100 (and the series is as long as that history)
+        - The same request on the same day returns the same data
+        - monte_carlo is null when the user has no investments
+        - Large path counts are split across a process pool
     """
     try:
+        user_id = request.args.get('user_id', 1, type=int)
+        paths = request.args.get('paths', 1000, type=int)
+        horizon = request.args.get('horizon', 12, type=int)
+        seed = request.args.get('seed', None, type=int)
+        
+        # Seeds and user ids feed np.random.SeedSequence, which rejects negatives
+        if user_id < 0:
+            return jsonify({
+                'success': False,
+                'message': 'user_id must be a non-negative integer'
+            }), 400
+        
+        if seed is not None and seed < 0:
+            return jsonify({
+                'success': False,
+                'message': 'seed must be a non-negative integer'
+            }), 400
+        
+        if seed is None:
+            seed = streams.seed_for('monte_carlo', user_id)
+        
+        if not 1 <= paths <= MAX_SIMULATION_PATHS:
+            return jsonify({
+                'success': False,
+                'message': f'paths must be between 1 and {MAX_SIMULATION_PATHS}'
+            }), 400
+        
+        if not 1 <= horizon <= MAX_SIMULATION_HORIZON:
+            return jsonify({
+                'success': False,
+                'message': f'horizon must be between 1 and {MAX_SIMULATION_HORIZON} months'
+            }), 400
+        
+        # Monte Carlo projection of the user's real holdings
+        monte_carlo = None
+        exposures = db.get_project_exposures(user_id)
+        if exposures:
+            monte_carlo = run_monte_carlo(
+                [e['current_value'] for e in exposures],
+                [e['expected_roi'] for e in exposures],
+                [e['volatility'] for e in exposures],
+                paths=paths,
+                horizon=horizon,
+                seed=seed
+            )
+        
         # Generate mock historical data for charts
+        rng = streams.generator('simulation', user_id)
         months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
         
         # Portfolio growth simulation
@@ -525,7 +1149,7 @@ def get_simulation_data():
         base_value = 10000
         for i, month in enumerate(months):
             # Simulate portfolio growth with some volatility
-            growth_rate = random.uniform(0.01, 0.03)  # 1-3% monthly growth
+            growth_rate = float(rng.uniform(0.01, 0.03))  # 1-3% monthly growth
             base_value *= (1 + growth_rate)
             portfolio_growth.append({
                 'month': month,
@@ -542,10 +1166,10 @@ def get_simulation_data():
         
         # Economic impact simulation
         economic_impact = {
-            'jobs_created': random.randint(15, 25),
-            'local_revenue_generated': random.randint(50000, 100000),
-            'businesses_supported': random.randint(6, 12),
-            'community_projects_funded': random.randint(3, 8)
+            'jobs_created': int(rng.integers(15, 26)),
+            'local_revenue_generated': int(rng.integers(50000, 100001)),
+            'businesses_supported': int(rng.integers(6, 13)),
+            'community_projects_funded': int(rng.integers(3, 9))
         }
         
         # Market trends
@@ -553,17 +1177,35 @@ def get_simulation_data():
         for i in range(30):  # Last 30 days
             market_trends.append({
                 'day': i + 1,
-                'market_index': 100 + random.uniform(-5, 10),  # Base 100 with volatility
-                'your_portfolio': 100 + random.uniform(-3, 12)  # Slightly better performance
+                'market_index': 100 + float(rng.uniform(-5, 10)),  # Base 100 with volatility
+                'your_portfolio': 100 + float(rng.uniform(-3, 12))  # Slightly better performance
             })
         
+        # Once revaluations have recorded some history (see snapshots.py),
+        # the user's own series replace the invented ones
+        monthly = db.get_portfolio_history(user_id, resolution='monthly', limit=len(months))['points']
+        if monthly:
+            portfolio_growth = [{
+                'month': calendar.month_abbr[int(point['time'][5:7])],
+                'value': round(point['value'], 2),
+                'invested': round(point['invested'], 2)
+            } for point in monthly]
+        
+        daily = db.get_portfolio_history(user_id, resolution='daily', limit=len(market_trends))['points']
+        if len(daily) >= 2:
+            # Indexed to 100 on the first day, like the market index
+            market_trends = market_trends[:len(daily)]
+            for trend, point in zip(market_trends, daily):
+                trend['your_portfolio'] = 100 * point['value'] / daily[0]['value']
+        
         return jsonify({
             'success': True,
             'simulation_data': {
                 'portfolio_growth': portfolio_growth,
                 'risk_distribution': risk_distribution,
                 'economic_impact': economic_impact,
-                'market_trends': market_trends
+                'market_trends': market_trends,
+                'monte_carlo': monte_carlo
             }
         })
     
@@ -574,6 +1216,7 @@ def get_simulation_data():
         }), 500
 
 @app.route('/user/balance', methods=['GET'])
+@conditional(lambda: ('balance', *user_revision()))
 def get_user_balance():
     """
     Get current user balance
@@ -585,6 +1228,7 @@ def get_user_balance():
     
     Returns:
         200 JSON: User balance information
+        304: Unchanged since the ETag sent in If-None-Match
         404 JSON: User not found
         500 JSON: Server error
         
@@ -717,6 +1361,89 @@ def reset_user_balance():
             'message': f'Error resetting balance: {str(e)}'
         }), 500
 
+@app.route('/user/reset-balance/batch', methods=['POST'])
+def reset_user_balances_batch():
+    """
+    Reset many users' balances and investments at once
+    
+    Meant for end-of-semester classroom resets: every listed user gets the
+    default balance back, loses all investments, and the projects they had
+    invested in get that funding removed, all in one database transaction.
+    
+    Request Body:
+        {
+            "user_ids": [<int>, ...] (required, 1-10000 ids)
+        }
+    
+    Returns:
+        200 JSON: Reset confirmation with counts
+        400 JSON: Missing or invalid user ids, or the reset failed
+        500 JSON: Server error
+        
+    Response Schema:
+        {
+            "success": true,
+            "balance": 10000.0,
+            "users_reset": <int>,
+            "investments_cleared": <int>,
+            "projects_reset": <int>,
+            "message": <string>
+        }
+        
+    Example:
+        POST /user/reset-balance/batch
+        Request: {"user_ids": [1, 2, 3]}
+        
+        Response: 200 OK
+        {
+            "success": true,
+            "balance": 10000.0,
+            "users_reset": 3,
+            "investments_cleared": 42,
+            "projects_reset": 9,
+            "message": "Reset complete: 3 users reset, 42 investments cleared, 9 projects updated"
+        }
+        
+    Note:
+        Ids that don't exist are skipped; users_reset counts the users that
+        were actually reset. Like /user/reset-balance, this is irreversible.
+    """
+    try:
+        data = request.get_json()
+        user_ids = data.get('user_ids') if isinstance(data, dict) else None
+        
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({
+                'success': False,
+                'message': 'A non-empty list of user_ids is required'
+            }), 400
+        
+        if len(user_ids) > MAX_BATCH_RESET_USERS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BATCH_RESET_USERS} users per batch'
+            }), 400
+        
+        if not all(isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids):
+            return jsonify({
+                'success': False,
+                'message': 'user_ids must be integers'
+            }), 400
+        
+        default_balance = 10000.0
+        result = db.reset_users(user_ids, default_balance)
+        
+        if not result['success']:
+            return jsonify(result), 400
+        
+        return jsonify(dict(result, balance=default_balance))
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error resetting balances: {str(e)}'
+        }), 500
+
 @app.route('/user/update-investments', methods=['POST'])
 def update_user_investments():
     """
@@ -763,7 +1490,7 @@ def update_user_investments():
         2. Apply risk-based volatility (Low: ±0.2%, Medium: ±0.5%, High: ±1.0%)
         3. Update investment current values
         4. Sync balance changes with user account
-        5. Record performance history
+        5. Record performance history (a snapshot for GET /portfolio/history)
         
     Risk Factors:
         - Low Risk: 0.2% daily volatility, stable returns
@@ -773,6 +1500,8 @@ def update_user_investments():
     Note:
         This endpoint simulates real market conditions for educational purposes.
         Values may increase or decrease based on market simulation.
+        Market moves are drawn once per user per day, so calling it again on
+        the same day leaves values and balance unchanged.
     """
     try:
         user_id = request.json.get('user_id', 1) if request.json else 1
@@ -804,6 +1533,7 @@ def update_user_investments():
         }), 500
 
 @app.route('/user/investment-performance', methods=['GET'])
+@conditional(lambda: ('performance', *user_revision()))
 def get_investment_performance():
     """
     Get investment performance summary
@@ -817,6 +1547,7 @@ def get_investment_performance():
     
     Returns:
         200 JSON: Investment performance summary
+        304: Unchanged since the ETag sent in If-None-Match
         500 JSON: Server error
         
     Response Schema:
@@ -846,7 +1577,10 @@ def get_investment_performance():
                         "current_value": <float>,
                         "return_percentage": <float>
                     }
-                }
+                },
+                "total_value": <float>,
+                "total_gain_loss": <float>,
+                "performance_percentage": <float>
             }
         }
         
@@ -886,11 +1620,17 @@ def get_investment_performance():
         - Individual investment rankings
         - Risk category analysis
         - Sector/category performance breakdown
-        - Historical return tracking
         
-    Note:
-        Performance data is calculated from simulated market conditions and 
-        is intended for educational purposes only.
+    Notes:
+        - Computed in one aggregated SQL query from the stored investment values
+          (as of the last revaluation), and cached per user until the user
+          invests, resets or is revalued (PERFORMANCE_CACHE_TTL bounds idle entries)
+        - Holdings are ranked per project: several investments in one project count
+          as one holding. Best/worst are null when the user has no investments
+        - total_value, total_gain_loss and performance_percentage repeat
+          current_value, total_return and total_return_percentage for older clients
+        - Performance data is calculated from simulated market conditions and
+          is intended for educational purposes only
     """
     try:
         user_id = request.args.get('user_id', 1, type=int)
@@ -908,6 +1648,112 @@ def get_investment_performance():
             'message': f'Error getting performance: {str(e)}'
         }), 500
 
+def _profiles_unavailable():
+    """404 for the profile routes when profiling is off or the token is wrong"""
+    if not PROFILING:
+        return jsonify({
+            'success': False,
+            'message': 'Profiling is disabled'
+        }), 404
+    if PROFILING_TOKEN and request.headers.get('X-Profile-Token') != PROFILING_TOKEN:
+        return jsonify({
+            'success': False,
+            'message': 'Profile not found'
+        }), 404
+    return None
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """
+    List the request profiles kept in this worker's ring buffer
+    
+    Profile a request by sending it with an ``X-Profile: 1`` header or a
+    ``profile=1`` query parameter while the app runs with PROFILING=1. Its
+    response carries an ``X-Profile-Id`` header naming the stored profile.
+    
+    Headers:
+        X-Profile-Token (required when PROFILING_TOKEN is set)
+    
+    Returns:
+        200 JSON: Stored profiles, newest first
+        404 JSON: Profiling is disabled
+        
+    Response Schema:
+        {
+            "success": true,
+            "engines": [<string>, ...],
+            "profiles": [
+                {
+                    "id": <int>,
+                    "endpoint": <string>,
+                    "method": <string>,
+                    "path": <string>,
+                    "status": <int>,
+                    "engine": "pyinstrument" | "cprofile",
+                    "duration_ms": <float>,
+                    "size_bytes": <int>,
+                    "created_at": <ISO timestamp>,
+                    "filename": <string>
+                }
+            ]
+        }
+    
+    Example:
+        GET /portfolio?user_id=1&profile=cprofile   (X-Profile-Id: 7)
+        GET /admin/profiles
+        GET /admin/profiles/7
+    
+    Notes:
+        - Profiles live in memory, per worker process; only the last
+          PROFILE_HISTORY (default 20) are kept
+        - ``X-Profile: cprofile`` or ``profile=pyinstrument`` picks the engine;
+          any other value uses the default (pyinstrument when installed)
+    """
+    unavailable = _profiles_unavailable()
+    if unavailable:
+        return unavailable
+    
+    return jsonify({
+        'success': True,
+        'engines': list(profiling_engines),
+        'profiles': profile_store.list()
+    })
+
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    Download one stored request profile
+    
+    Args:
+        profile_id: Id from the ``X-Profile-Id`` response header or /admin/profiles
+    
+    Returns:
+        200: The profile file as an attachment
+            - pyinstrument: speedscope JSON (open in https://www.speedscope.app)
+            - cprofile: pstats file (snakeviz, flameprof, python -m pstats)
+        404 JSON: Profiling is disabled or the profile has rotated out
+    """
+    unavailable = _profiles_unavailable()
+    if unavailable:
+        return unavailable
+    
+    stored = profile_store.get(profile_id)
+    if stored is None:
+        return jsonify({
+            'success': False,
+            'message': 'Profile not found'
+        }), 404
+    
+    info, data = stored
+    mimetype = 'application/json' if info['engine'] == 'pyinstrument' else 'application/octet-stream'
+    return Response(data, mimetype=mimetype, headers={
+        'Content-Disposition': f"attachment; filename={info['filename']}"
+    })
+
+if PROFILING:
+    install_profiling(app, profile_store, token=PROFILING_TOKEN,
+                      exclude=('list_profiles', 'download_profile', 'get_metrics'))
+
 if __name__ == '__main__':
     print("=" * 60)
     print("🎓 Youth Micro-Investing Platform API Server")
@@ -919,14 +1765,21 @@ if __name__ == '__main__':
     print("")
     print("📖 API Documentation:")
     print("   GET  /health                     - Health check and status")
+    print("   GET  /metrics                    - Prometheus metrics")
     print("   GET  /projects                   - List all investment projects")
     print("   POST /invest                     - Make an investment")
+    print("   POST /invest/batch               - Make several investments atomically")
     print("   GET  /portfolio                  - Get user portfolio with performance")
+    print("   GET  /portfolio/export           - Stream investment history (NDJSON/CSV)")
+    print("   GET  /portfolio/history          - Portfolio value over time")
     print("   GET  /simulation                 - Get charts and visualization data")
     print("   GET  /user/balance              - Get current user balance")
     print("   POST /user/reset-balance        - Reset balance and clear investments")
+    print("   POST /user/reset-balance/batch  - Reset many users at once")
     print("   POST /user/update-investments   - Update investment values and balance")
     print("   GET  /user/investment-performance - Get performance analytics")
+    if PROFILING:
+        print("   GET  /admin/profiles            - Recorded request profiles")
     print("")
     print("🎯 Educational Features:")
     print("   • Simulated local business investments")
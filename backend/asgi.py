@@ -0,0 +1,180 @@
+"""
+ASGI serving mode for the Flask API
+
+Wraps the existing Flask app (``app.app``) in a small WSGI-to-ASGI adapter so
+it can be served by an async server such as uvicorn. The event loop owns every
+client connection, including idle keep-alive ones, and only hands a request to
+a thread when there is work to do. Those threads come from one bounded
+executor, and the database connection pools are sized to match, so blocking
+SQLite calls never pile up beyond what the pools can serve.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Environment:
+    ASGI_THREADS - Threads running Flask views per process (default: 16)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+THREADS = int(os.environ.get('ASGI_THREADS', 16))
+
+# Every executor thread may hold a pooled connection at once
+os.environ.setdefault('DB_POOL_SIZE', str(THREADS))
+
+from app import app as flask_app, db  # noqa: E402  (needs DB_POOL_SIZE set first)
+
+executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='flask')
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # PEP 3333 wants the raw UTF-8 bytes seen as latin-1 "bytes-as-str";
+        # ASGI already decoded them, so undo that for Werkzeug to redo it
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            if key in environ:
+                # Repeated headers fold into one; cookies are joined with '; '
+                separator = '; ' if name == 'COOKIE' else ','
+                value = f'{environ[key]}{separator}{value}'
+            environ[key] = value
+    return environ
+
+# Body chunks buffered per response before the worker thread waits for the client
+QUEUE_SIZE = 16
+
+_DONE = object()
+
+class ClientGone(Exception):
+    """Raised inside a worker thread once the client has disconnected"""
+
+def run_wsgi(environ, loop, queue, cancelled):
+    """Run the Flask app in a worker thread, feeding the response into ``queue``
+
+    The whole response, including streamed bodies, is produced on this one
+    thread so Flask's request context stays valid while a generator runs.
+    Puts wait on the bounded queue, so a slow client applies backpressure.
+    """
+    started = []
+
+    def put(item):
+        if cancelled.is_set():
+            raise ClientGone()
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        started.append(True)
+        put((
+            int(status.split(' ', 1)[0]),
+            [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        ))
+
+    try:
+        body = flask_app(environ, start_response)
+        try:
+            for chunk in body:
+                if chunk:
+                    put(chunk)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    except ClientGone:
+        return
+    except Exception:
+        if started:
+            raise
+        put((500, [(b'content-type', b'text/plain')]))
+        put(b'Internal Server Error')
+    finally:
+        if not cancelled.is_set():
+            put(_DONE)
+
+async def read_body(receive):
+    """Collect the full request body"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+async def lifespan(receive, send):
+    """Handle server startup and shutdown events"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            db.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    loop = asyncio.get_running_loop()
+    body = await read_body(receive)
+    environ = build_environ(scope, body)
+
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    cancelled = threading.Event()
+    worker = loop.run_in_executor(executor, run_wsgi, environ, loop, queue, cancelled)
+
+    try:
+        status, headers = await queue.get()
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        while True:
+            chunk = await queue.get()
+            if chunk is _DONE:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if not worker.done():
+            # Client went away mid-response: stop the worker and unblock its puts
+            cancelled.set()
+            while not worker.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+        await worker
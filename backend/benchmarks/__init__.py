@@ -0,0 +1,6 @@
+"""
+Performance benchmarks for the investing platform backend
+
+Run from the backend directory as modules, e.g.:
+    python -m benchmarks.invest_contention
+"""
@@ -0,0 +1,134 @@
+"""
+Per-worker memory of the project catalogue: SQLite + page cache vs read model
+
+Seeds a scratch database with ``--projects`` projects, then starts 1, 2, 4...
+``--workers`` separate processes (spawned, like gunicorn workers, so nothing
+is shared copy-on-write) serving the same mix of ``/projects`` reads through
+``Database.get_projects_page``:
+
+    sql   - the catalogue query with each worker's own TTLCache of pages
+    mmap  - the same page cache, with misses served from the memory-mapped
+            read model (catalogue.py) shared by all workers
+
+Every ``--invest-every`` reads a worker also invests, which bumps the
+catalogue revision as real traffic does (0 turns this off).
+
+Each worker reports the Python memory it still holds once it has served its
+reads (tracemalloc), how much its private memory grew (USS: Private_Clean +
+Private_Dirty in /proc/self/smaps_rollup), and its median time per read.
+The read model's file is counted once in the total, as shared memory.
+Linux only.
+
+Usage:
+    python -m benchmarks.catalogue_workers [--projects 5000] [--workers 8] [--requests 50]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.suite import seed_database
+
+MODES = ('sql', 'mmap')
+
+def private_bytes():
+    """This process's unique set size, in bytes"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+QUERIES = [{}, {'sort': 'roi'}, {'sort': 'funding', 'limit': 20}, {'sort': 'risk', 'limit': 50}]
+
+def serve_reads(db, requests, invest_every, user_id, project_id):
+    """Serve ``requests`` catalogue reads; returns the time of each in milliseconds"""
+    timings = []
+    for request in range(requests):
+        if invest_every and request % invest_every == invest_every - 1:
+            db.make_investment(user_id, project_id, 1.0)
+        started = time.perf_counter()
+        db.get_projects_page(**QUERIES[request % len(QUERIES)])
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def serve(db_path, mode, requests, invest_every, user_id, project_id, results):
+    """Worker body: open the database, serve reads, report (held, USS growth, median ms)"""
+    from models import Database
+
+    db = Database(db_path, pool_size=1,
+                  catalogue_path=db_path + '.catalogue' if mode == 'mmap' else None)
+    db.get_projects_page(limit=1)
+    before = private_bytes()
+
+    timings = serve_reads(db, requests, invest_every, user_id, project_id)
+
+    # A second pass under tracemalloc measures what serving leaves behind
+    tracemalloc.start()
+    serve_reads(db, requests, invest_every, user_id, project_id)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    results.put((held, private_bytes() - before, statistics.median(timings)))
+    db.close()
+
+def run_workers(db_path, mode, workers, requests, invest_every, user_id, project_id):
+    """Start ``workers`` processes at once; returns their (held, USS growth, median ms)"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(target=serve, args=(db_path, mode, requests, invest_every,
+                                            user_id, project_id, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare per-worker catalogue memory')
+    parser.add_argument('--projects', type=int, default=5000, help='Generated projects')
+    parser.add_argument('--workers', type=int, default=8, help='Most worker processes')
+    parser.add_argument('--requests', type=int, default=50, help='Catalogue reads per worker')
+    parser.add_argument('--invest-every', type=int, default=4, help='Reads per investment (0: none)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'catalogue.db')
+        user_ids, project_ids = seed_database(db_path, users=10, projects=args.projects,
+                                              investments=1000, seed=args.seed)
+
+        counts = [1]
+        while counts[-1] * 2 <= args.workers:
+            counts.append(counts[-1] * 2)
+
+        print(f'{args.projects:,} projects, {args.requests} catalogue reads per worker, '
+              f'one investment every {args.invest_every or "-"} reads')
+        print(f"{'':<6} {'workers':>8} {'held MB':>8} {'USS MB':>8} {'total MB':>9} {'read ms':>8}")
+        for mode in MODES:
+            for workers in counts:
+                reports = run_workers(db_path, mode, workers, args.requests, args.invest_every,
+                                      user_ids[0], project_ids[0])
+                held = statistics.mean(report[0] for report in reports)
+                growth = statistics.mean(report[1] for report in reports)
+                total = sum(report[0] for report in reports)
+                if mode == 'mmap':
+                    total += os.path.getsize(db_path + '.catalogue')
+                print(f'{mode:<6} {workers:>8} {held / 2**20:>8.2f} {growth / 2**20:>8.2f} '
+                      f'{total / 2**20:>9.2f} {statistics.median(report[2] for report in reports):>8.2f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
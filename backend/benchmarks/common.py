@@ -0,0 +1,34 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import math
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize_latencies(latencies, elapsed, errors=0):
+    """Summarise request latencies (seconds) as milliseconds and throughput"""
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'requests_per_second': len(ordered) / elapsed if elapsed else 0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] * 1000) if ordered else 0
+    }
+
+def format_row(name, stats):
+    """One aligned result line"""
+    return (f"{name:<28} {stats['requests']:>8} {stats['errors']:>6} "
+            f"{stats['requests_per_second']:>9.1f} {stats['p50_ms']:>8.2f} "
+            f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+HEADER = (f"{'':<28} {'requests':>8} {'errors':>6} {'req/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
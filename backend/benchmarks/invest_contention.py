@@ -0,0 +1,167 @@
+"""
+Contention benchmark for the invest path
+
+Starts N worker processes (standing in for gunicorn workers) that all invest
+from the same few user accounts at once, then checks that every balance adds
+up and reports throughput. Three strategies are compared:
+
+    legacy  - the original read balance / write ``balance - amount`` code
+    coarse  - the same code behind one global lock shared by all workers
+    atomic  - Database.make_investment (BEGIN IMMEDIATE + conditional UPDATE)
+
+Usage:
+    python -m benchmarks.invest_contention [--workers 8] [--ops 200] [--users 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from models import Database
+
+STRATEGIES = ('legacy', 'coarse', 'atomic')
+
+def legacy_make_investment(db, user_id, project_id, amount):
+    """The pre-IMMEDIATE invest path: read, compute in Python, write back"""
+    conn = db.get_connection()
+    try:
+        user = conn.execute('SELECT balance FROM users WHERE id = ?', (user_id,)).fetchone()
+        if not user or user['balance'] < amount:
+            return {'success': False, 'message': 'Insufficient balance'}
+
+        project = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+        if not project:
+            return {'success': False, 'message': 'Project not found'}
+
+        conn.execute('UPDATE users SET balance = ? WHERE id = ?', (user['balance'] - amount, user_id))
+        conn.execute('UPDATE projects SET current_funding = ? WHERE id = ?',
+                     (project['current_funding'] + amount, project_id))
+        conn.execute('''
+            INSERT INTO investments (user_id, project_id, amount, current_value)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, project_id, amount, amount))
+        conn.commit()
+        return {'success': True, 'message': 'Investment successful'}
+    except Exception as e:
+        conn.rollback()
+        return {'success': False, 'message': str(e)}
+    finally:
+        conn.close()
+
+def _worker(db_path, strategy, ops, user_ids, amount, lock, start, seed, results):
+    """Run ``ops`` investments with one strategy and report the outcome"""
+    db = Database(db_path, pool_size=1)
+    rng = random.Random(seed)
+    succeeded = failed = errors = 0
+
+    start.wait()
+    for _ in range(ops):
+        user_id = rng.choice(user_ids)
+        project_id = rng.randint(1, 12)
+        if strategy == 'atomic':
+            result = db.make_investment(user_id, project_id, amount)
+        elif strategy == 'coarse':
+            with lock:
+                result = legacy_make_investment(db, user_id, project_id, amount)
+        else:
+            result = legacy_make_investment(db, user_id, project_id, amount)
+
+        if result['success']:
+            succeeded += 1
+        elif result['message'] in ('Insufficient balance', 'Project not found'):
+            failed += 1
+        else:
+            errors += 1
+    db.close()
+    results.put((succeeded, failed, errors))
+
+def run_strategy(strategy, workers, ops, users, amount, starting_balance):
+    """Run one strategy against a fresh database and verify the balances"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'contention.db')
+    db = Database(db_path)
+    with db.connection() as conn:
+        conn.executemany('INSERT INTO users (username, balance) VALUES (?, ?)',
+                         [(f'investor_{i}', starting_balance) for i in range(users)])
+        user_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM users WHERE username LIKE 'investor_%'")]
+        funding_before = conn.execute('SELECT SUM(current_funding) FROM projects').fetchone()[0]
+        conn.commit()
+    db.close()
+
+    lock = multiprocessing.Lock()
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_worker, args=(
+            db_path, strategy, ops, user_ids, amount, lock, start, seed, results))
+        for seed in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    time.sleep(0.5)  # let every worker open its database first
+
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+
+    succeeded = sum(o[0] for o in outcomes)
+    conn = sqlite3.connect(db_path)
+    placeholders = ', '.join('?' * len(user_ids))
+    balance = conn.execute(f'SELECT SUM(balance) FROM users WHERE id IN ({placeholders})',
+                           user_ids).fetchone()[0]
+    overdrawn = conn.execute(f'SELECT COUNT(*) FROM users WHERE id IN ({placeholders}) AND balance < 0',
+                             user_ids).fetchone()[0]
+    invested = conn.execute(f'SELECT COALESCE(SUM(amount), 0) FROM investments WHERE user_id IN ({placeholders})',
+                            user_ids).fetchone()[0]
+    funding_after = conn.execute('SELECT SUM(current_funding) FROM projects').fetchone()[0]
+    conn.close()
+
+    expected_balance = starting_balance * users - invested
+    return {
+        'strategy': strategy,
+        'succeeded': succeeded,
+        'rejected': sum(o[1] for o in outcomes),
+        'errors': sum(o[2] for o in outcomes),
+        'ops_per_second': succeeded / elapsed if elapsed else 0,
+        'balance_drift': balance - expected_balance,
+        'funding_drift': (funding_after - funding_before) - invested,
+        'overdrawn_accounts': overdrawn,
+        'correct': abs(balance - expected_balance) < 1e-6
+                   and abs((funding_after - funding_before) - invested) < 1e-6
+                   and overdrawn == 0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark concurrent investments')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel investor processes')
+    parser.add_argument('--ops', type=int, default=200, help='Investments attempted per worker')
+    parser.add_argument('--users', type=int, default=2, help='Accounts the workers share')
+    parser.add_argument('--amount', type=float, default=10.0, help='Amount per investment')
+    parser.add_argument('--balance', type=float, default=None,
+                        help='Starting balance per account (default: enough for ~75%% of attempts)')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES))
+    args = parser.parse_args(argv)
+
+    balance = args.balance
+    if balance is None:
+        balance = args.amount * args.workers * args.ops * 0.75 / args.users
+
+    print(f'{args.workers} workers x {args.ops} investments of ${args.amount:g} '
+          f'on {args.users} shared accounts (${balance:,.0f} each)')
+    print(f"{'strategy':<8} {'ok':>6} {'rejected':>8} {'errors':>6} {'ops/s':>9} "
+          f"{'balance drift':>14} {'overdrawn':>9}  correct")
+    for strategy in args.strategies.split(','):
+        r = run_strategy(strategy, args.workers, args.ops, args.users, args.amount, balance)
+        print(f"{r['strategy']:<8} {r['succeeded']:>6} {r['rejected']:>8} {r['errors']:>6} "
+              f"{r['ops_per_second']:>9.0f} {r['balance_drift']:>14.2f} "
+              f"{r['overdrawn_accounts']:>9}  {'yes' if r['correct'] else 'NO'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Large /portfolio response: row formats and JSON providers
+
+Seeds a scratch database with one user holding ``--investments`` positions,
+then times the pieces of a ``GET /portfolio`` for that user: reading the
+investments in each ``Database`` row format, and the whole request with each
+available JSON provider (see ``json_provider.py``) and response layout.
+
+Usage:
+    python -m benchmarks.portfolio_json [--investments 10000] [--repeat 20]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.suite import seed_database
+
+def best_of(repeat, func):
+    """Median and best wall time of ``repeat`` calls, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time a large /portfolio response')
+    parser.add_argument('--investments', type=int, default=10000, help='Positions held by the user')
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per case')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'portfolio.db')
+        user_ids, _ = seed_database(db_path, users=1, projects=args.projects,
+                                    investments=args.investments, seed=args.seed)
+        user_id = user_ids[0]
+
+        os.environ['DATABASE_PATH'] = db_path
+        import app as app_module
+        from json_provider import PROVIDERS, install
+
+        db = app_module.db
+        client = app_module.app.test_client()
+
+        print(f'/portfolio for one user with {args.investments:,} investments, '
+              f'median / best of {args.repeat}')
+        print(f"{'':<34} {'median ms':>10} {'best ms':>10} {'bytes':>10}")
+
+        for row_format in ('dict', 'tuple', 'columns'):
+            median, best = best_of(args.repeat, lambda: db.get_portfolio(user_id, row_format=row_format))
+            print(f"{'Database.get_portfolio ' + row_format:<34} {median:>10.2f} {best:>10.2f} {'':>10}")
+
+        results = {}
+        for provider in sorted(PROVIDERS, key=lambda name: name != 'stdlib'):
+            install(app_module.app, provider)
+            for layout in ('records', 'columns'):
+                path = f'/portfolio?user_id={user_id}&format={layout}'
+                size = len(client.get(path).get_data())
+                median, best = best_of(args.repeat, lambda: client.get(path).get_data())
+                results[(provider, layout)] = median
+                print(f"{'GET /portfolio ' + provider + ' ' + layout:<34} {median:>10.2f} {best:>10.2f} {size:>10,}")
+
+        baseline = results[('stdlib', 'records')]
+        for (provider, layout), median in results.items():
+            if (provider, layout) != ('stdlib', 'records'):
+                print(f'{provider} {layout}: {baseline / median:.2f}x faster than stdlib records')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Memory and time of the in-memory position models for a large portfolio
+
+Seeds a scratch database with one user holding ``--investments`` positions
+and compares the ways the backend has held them:
+
+    dicts      - one dict per investment built from a sqlite3.Row (the
+                 original get_portfolio), with the original per-row
+                 /portfolio loop and diversification sum
+    columns    - Database row_format='columns': one Python list per column
+    positions  - the Positions struct of arrays (positions.py), with the
+                 vectorized /portfolio maths and totals_by('category')
+
+For each it reports the memory still held once loaded and the peak while
+loading (tracemalloc), and the median time to load, to run the portfolio
+maths and to compute the diversification.
+
+Usage:
+    python -m benchmarks.positions_memory [--investments 20000] [--repeat 10]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.suite import seed_database
+from models import Database
+
+DAILY_VOLATILITY = {'Low': 0.002, 'Medium': 0.005, 'High': 0.01}
+
+def load_dicts(db, user_id):
+    return db.get_portfolio(user_id)['investments']
+
+def load_columns(db, user_id):
+    return db.get_portfolio(user_id, row_format='columns')['investments']
+
+def load_positions(db, user_id):
+    return db.get_portfolio(user_id, row_format='positions')['investments']
+
+def legacy_portfolio_math(investments):
+    """The original /portfolio loop: one dict update per investment"""
+    for investment in investments:
+        days_since_investment = random.randint(1, 30)
+        risk_multiplier = DAILY_VOLATILITY.get(investment['risk_level'], 0.005)
+        expected_daily_return = investment['expected_roi'] / 365 / 100
+        random_factor = random.uniform(-risk_multiplier, risk_multiplier)
+        daily_return = expected_daily_return + random_factor
+        investment['current_value'] = investment['amount'] * (1 + daily_return * days_since_investment)
+        investment['return_percentage'] = ((investment['current_value'] - investment['amount']) / investment['amount']) * 100
+        investment['return_amount'] = investment['current_value'] - investment['amount']
+    return sum(investment['current_value'] for investment in investments)
+
+def legacy_diversification(investments):
+    diversification = {}
+    for investment in investments:
+        category = investment['category']
+        diversification[category] = diversification.get(category, 0) + investment['amount']
+    return diversification
+
+def columns_portfolio_math(investments, rng):
+    """The column-list /portfolio maths: NumPy arrays rebuilt from lists"""
+    amount = np.array(investments['amount'], dtype=float)
+    days = rng.integers(1, 31, len(amount))
+    uniforms = rng.random(len(amount))
+    risk = np.array([DAILY_VOLATILITY.get(level, 0.005) for level in investments['risk_level']])
+    daily_return = np.array(investments['expected_roi'], dtype=float) / 365 / 100 + risk * (2 * uniforms - 1)
+    current_value = amount * (1 + daily_return * days)
+    return current_value.sum()
+
+def columns_diversification(investments):
+    diversification = {}
+    for category, amount in zip(investments['category'], investments['amount']):
+        diversification[category] = diversification.get(category, 0) + amount
+    return diversification
+
+def positions_portfolio_math(positions, rng):
+    """The Positions /portfolio maths: straight off the column arrays"""
+    days = rng.integers(1, 31, len(positions))
+    uniforms = rng.random(len(positions))
+    risk = positions.map_labels('risk_level', DAILY_VOLATILITY, 0.005)
+    daily_return = positions.expected_roi / 365 / 100 + risk * (2 * uniforms - 1)
+    current_value = positions.amount * (1 + daily_return * days)
+    return current_value.sum()
+
+MODELS = {
+    'dicts': (load_dicts, lambda data, rng: legacy_portfolio_math(data), legacy_diversification),
+    'columns': (load_columns, columns_portfolio_math, columns_diversification),
+    'positions': (load_positions, positions_portfolio_math, lambda data: data.totals_by('category')),
+}
+
+def median_ms(repeat, func):
+    """Median wall time of ``repeat`` calls, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def measure_memory(load):
+    """(bytes retained by the loaded data, peak bytes while loading)"""
+    tracemalloc.start()
+    try:
+        data = load()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del data
+    return retained, peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare in-memory position models')
+    parser.add_argument('--investments', type=int, default=20000, help='Positions held by the user')
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=10, help='Timed calls per case')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'positions.db')
+        user_ids, _ = seed_database(db_path, users=1, projects=args.projects,
+                                    investments=args.investments, seed=args.seed)
+        user_id = user_ids[0]
+        db = Database(db_path, pool_size=1)
+
+        print(f'One user with {args.investments:,} investments, median of {args.repeat}')
+        print(f"{'':<10} {'held MB':>9} {'peak MB':>9} {'B/pos':>7} "
+              f"{'load ms':>9} {'maths ms':>9} {'divers. ms':>10}")
+
+        results = {}
+        for name, (load, maths, diversification) in MODELS.items():
+            retained, peak = measure_memory(lambda: load(db, user_id))
+            data = load(db, user_id)
+            rng = np.random.default_rng(args.seed)
+            load_ms = median_ms(args.repeat, lambda: load(db, user_id))
+            maths_ms = median_ms(args.repeat, lambda: maths(data, rng))
+            diversification_ms = median_ms(args.repeat, lambda: diversification(data))
+            results[name] = (retained, load_ms + maths_ms + diversification_ms)
+            print(f'{name:<10} {retained / 2**20:>9.2f} {peak / 2**20:>9.2f} '
+                  f'{retained / args.investments:>7.0f} {load_ms:>9.2f} {maths_ms:>9.2f} '
+                  f'{diversification_ms:>10.2f}')
+
+        baseline_bytes, baseline_ms = results['dicts']
+        for name, (retained, total_ms) in results.items():
+            if name != 'dicts':
+                print(f'{name}: {baseline_bytes / retained:.1f}x less memory held, '
+                      f'{baseline_ms / total_ms:.1f}x faster end to end than dicts')
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
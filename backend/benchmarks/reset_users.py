@@ -0,0 +1,133 @@
+"""
+Benchmark for resetting users: per-project loop vs set-based SQL
+
+Seeds a scratch database with generated users, projects and investments,
+then resets a batch of users on a fresh copy with each strategy and checks
+that all of them leave the same balances, funding and investments behind:
+
+    legacy  - the original reset_user_completely: GROUP BY, COUNT, then a
+              SELECT + UPDATE per project in Python, then the DELETEs
+    single  - Database.reset_user_completely (set-based), one call per user
+    bulk    - Database.reset_users, every user in one call
+
+Usage:
+    python -m benchmarks.reset_users [--users 2000] [--investments 200000] [--reset 500]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.suite import seed_database
+from models import Database
+
+STRATEGIES = ('legacy', 'single', 'bulk')
+
+DEFAULT_BALANCE = 10000.0
+
+def legacy_reset_user(db, user_id, default_balance):
+    """The pre-set-based reset path: one SELECT and UPDATE per project"""
+    with db.connection() as conn:
+        user_investments = conn.execute('''
+            SELECT project_id, SUM(amount) as total_investment
+            FROM investments
+            WHERE user_id = ?
+            GROUP BY project_id
+        ''', (user_id,)).fetchall()
+
+        investment_count = conn.execute('''
+            SELECT COUNT(*) FROM investments WHERE user_id = ?
+        ''', (user_id,)).fetchone()[0]
+
+        projects_reset = 0
+        for investment in user_investments:
+            current_funding = conn.execute('''
+                SELECT current_funding FROM projects WHERE id = ?
+            ''', (investment['project_id'],)).fetchone()
+            if current_funding:
+                new_funding = max(0, current_funding['current_funding'] - investment['total_investment'])
+                conn.execute('''
+                    UPDATE projects SET current_funding = ? WHERE id = ?
+                ''', (new_funding, investment['project_id']))
+                projects_reset += 1
+
+        conn.execute('DELETE FROM investments WHERE user_id = ?', (user_id,))
+        conn.execute('DELETE FROM portfolio_summary WHERE user_id = ?', (user_id,))
+        conn.execute('UPDATE users SET balance = ? WHERE id = ?', (default_balance, user_id))
+        conn.commit()
+        return {'success': True, 'investments_cleared': investment_count, 'projects_reset': projects_reset}
+
+def run_strategy(strategy, db_path, user_ids):
+    """Reset ``user_ids`` with one strategy; returns (seconds, investments cleared)"""
+    db = Database(db_path, pool_size=1)
+    try:
+        started = time.perf_counter()
+        if strategy == 'bulk':
+            cleared = db.reset_users(user_ids, DEFAULT_BALANCE)['investments_cleared']
+        else:
+            reset = legacy_reset_user if strategy == 'legacy' else type(db).reset_user_completely
+            cleared = sum(reset(db, user_id, DEFAULT_BALANCE)['investments_cleared'] for user_id in user_ids)
+        return time.perf_counter() - started, cleared
+    finally:
+        db.close()
+
+def most_active_users(db_path, limit):
+    """Ids of the ``limit`` users with the most investments"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute('''
+            SELECT user_id FROM investments GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT ?
+        ''', (limit,))]
+    finally:
+        conn.close()
+
+def fingerprint(db_path):
+    """Totals every strategy must agree on afterwards"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return (
+            round(conn.execute('SELECT SUM(current_funding) FROM projects').fetchone()[0], 6),
+            round(conn.execute('SELECT SUM(balance) FROM users').fetchone()[0], 6),
+            conn.execute('SELECT COUNT(*) FROM investments').fetchone()[0],
+            conn.execute('SELECT COUNT(*) FROM portfolio_summary').fetchone()[0]
+        )
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare user reset strategies')
+    parser.add_argument('--users', type=int, default=2000, help='Generated users')
+    parser.add_argument('--projects', type=int, default=500, help='Generated projects')
+    parser.add_argument('--investments', type=int, default=200000, help='Generated investments')
+    parser.add_argument('--reset', type=int, default=500, help='Most active users reset by each strategy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        seeded = os.path.join(workdir, 'seeded.db')
+        seed_database(seeded, args.users, args.projects, args.investments, seed=args.seed)
+        user_ids = most_active_users(seeded, args.reset)
+
+        print(f'Resetting {len(user_ids)} of {args.users} users '
+              f'({args.investments:,} investments over {args.projects} projects)')
+        print(f"{'':<8} {'seconds':>9} {'users/s':>9} {'cleared':>9}")
+        fingerprints = {}
+        for strategy in STRATEGIES:
+            db_path = os.path.join(workdir, f'{strategy}.db')
+            shutil.copyfile(seeded, db_path)
+            seconds, cleared = run_strategy(strategy, db_path, user_ids)
+            fingerprints[strategy] = fingerprint(db_path)
+            print(f'{strategy:<8} {seconds:>9.3f} {len(user_ids) / seconds:>9.1f} {cleared:>9,}')
+
+        if len(set(fingerprints.values())) != 1:
+            raise SystemExit(f'Strategies disagree: {fingerprints}')
+        print('All strategies left the same balances, funding and investments')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Load-test comparison of the sync (gunicorn) and async (uvicorn + asgi.py) modes
+
+Starts each server on a scratch database, then drives it with many concurrent
+keep-alive clients that mostly sit idle between requests (like a classroom of
+open dashboards) and reports throughput and latency percentiles per mode.
+
+Usage:
+    python -m benchmarks.serving_modes [--clients 200] [--duration 15] [--think 0.5]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import HEADER, format_row, summarize_latencies
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (method, path, body) mix sent by every simulated client
+REQUEST_MIX = [
+    ('GET', '/projects', None),
+    ('GET', '/portfolio', None),
+    ('GET', '/user/balance', None),
+    ('GET', '/user/investment-performance', None),
+    ('POST', '/invest', {'project_id': 1, 'amount': 1}),
+]
+
+def server_commands(port, sync_workers):
+    """Command lines for each serving mode"""
+    return {
+        f'gunicorn sync x{sync_workers}': [
+            sys.executable, '-m', 'gunicorn', '--workers', str(sync_workers),
+            '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'
+        ],
+        'uvicorn asgi x1': [
+            sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+            '--log-level', 'warning'
+        ]
+    }
+
+def wait_for_server(port, timeout=30):
+    """Poll /health until the server answers"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def client_loop(port, stop, think, latencies, errors, seed):
+    """One simulated dashboard: request, then idle for ``think`` seconds"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        method, path, body = rng.choice(REQUEST_MIX)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        stop.wait(rng.uniform(0, 2 * think))
+    conn.close()
+
+def run_mode(name, command, port, clients, duration, think):
+    """Start one server, load it, and stop it again"""
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(command, cwd=workdir, env=env)
+    try:
+        if not wait_for_server(port):
+            raise RuntimeError(f'{name} did not start')
+
+        latencies, errors = [], []
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=client_loop, args=(port, stop, think, latencies, errors, i))
+            for i in range(clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return summarize_latencies(latencies, time.perf_counter() - started, len(errors))
+    finally:
+        server.terminate()
+        server.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare sync and async serving modes')
+    parser.add_argument('--clients', type=int, default=200, help='Concurrent keep-alive clients')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds of load per mode')
+    parser.add_argument('--think', type=float, default=0.5, help='Mean idle seconds between requests')
+    parser.add_argument('--sync-workers', type=int, default=2, help='gunicorn sync worker processes')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args(argv)
+
+    print(f'{args.clients} clients, {args.duration:g}s per mode, '
+          f'~{args.think:g}s think time between requests')
+    print(HEADER)
+    for name, command in server_commands(args.port, args.sync_workers).items():
+        print(format_row(name, run_mode(name, command, args.port, args.clients,
+                                        args.duration, args.think)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""
+Load-test and microbenchmark suite for the backend
+
+Seeds a scratch database with a configurable number of users, projects and
+investments (see ``generate_data.py``), then:
+
+    load     - drives /projects, /invest, /portfolio, /simulation and
+               /user/update-investments concurrently, either in-process through
+               Flask's test client or over HTTP against a local gunicorn, and
+               reports per-endpoint p50/p95/p99 latency and requests per second
+    methods  - times each Database method on its own
+
+Results can be written to a JSON file and compared against an earlier one, so
+a change that makes an endpoint or method slower shows up as a regression.
+
+Usage:
+    python -m benchmarks.suite [--users 200] [--investments 20000] [--clients 8]
+                               [--target testclient|gunicorn] [--output results.json]
+                               [--baseline baseline.json] [--tolerance 0.25]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import HEADER, format_row, summarize_latencies
+from generate_data import DEFAULT_CATEGORIES, generate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Relative weight of each endpoint in the concurrent load mix
+ENDPOINT_WEIGHTS = {
+    'GET /projects': 30,
+    'POST /invest': 20,
+    'GET /portfolio': 25,
+    'GET /simulation': 10,
+    'POST /user/update-investments': 15,
+}
+
+def seed_database(db_path, users, projects, investments, user_skew=1.0, seed=0):
+    """Create a database with the app schema and fill it with generated data"""
+    stats = generate(db_path, users=users, projects=projects, investments=investments,
+                     user_skew=user_skew, balance=1e9, seed=seed)
+    return stats['user_ids'], stats['project_ids']
+
+def pick_request(rng, user_ids, project_ids):
+    """Choose the next (endpoint, method, path, body) from the weighted mix"""
+    endpoint = rng.choices(list(ENDPOINT_WEIGHTS), weights=list(ENDPOINT_WEIGHTS.values()))[0]
+    user_id = rng.choice(user_ids)
+    if endpoint == 'GET /projects':
+        return endpoint, 'GET', '/projects', None
+    if endpoint == 'POST /invest':
+        return endpoint, 'POST', '/invest', {'user_id': user_id, 'project_id': rng.choice(project_ids), 'amount': 5}
+    if endpoint == 'GET /portfolio':
+        return endpoint, 'GET', f'/portfolio?user_id={user_id}', None
+    if endpoint == 'GET /simulation':
+        return endpoint, 'GET', f'/simulation?user_id={user_id}&paths=500', None
+    return endpoint, 'POST', '/user/update-investments', {'user_id': user_id}
+
+class TestClientTarget:
+    """Sends requests in-process through Flask's test client"""
+
+    def __init__(self, db_path):
+        os.environ['DATABASE_PATH'] = db_path
+        import app as app_module
+        self.app = app_module.app
+
+    def client(self):
+        test_client = self.app.test_client()
+
+        def send(method, path, body):
+            response = test_client.open(path, method=method, json=body)
+            response.get_data()
+            return response.status_code
+        return send
+
+    def close(self):
+        pass
+
+class GunicornTarget:
+    """Sends requests over HTTP to a local gunicorn started for the run"""
+
+    def __init__(self, db_path, port, workers):
+        from benchmarks.serving_modes import wait_for_server
+
+        self.port = port
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_PATH=db_path)
+        self.server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+            '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'
+        ], cwd=os.path.dirname(db_path), env=env)
+        if not wait_for_server(port):
+            self.close()
+            raise RuntimeError('gunicorn did not start')
+
+    def client(self):
+        state = {'conn': http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)}
+
+        def send(method, path, body):
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            try:
+                state['conn'].request(method, path, body=payload, headers=headers)
+                response = state['conn'].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                state['conn'].close()
+                state['conn'] = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+                return 0
+        return send
+
+    def close(self):
+        self.server.terminate()
+        self.server.wait()
+
+def run_load(target, user_ids, project_ids, clients, duration, seed=0):
+    """Drive the weighted endpoint mix from ``clients`` threads for ``duration`` seconds"""
+    latencies = {endpoint: [] for endpoint in ENDPOINT_WEIGHTS}
+    errors = {endpoint: 0 for endpoint in ENDPOINT_WEIGHTS}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        send = target.client()
+        while not stop.is_set():
+            endpoint, method, path, body = pick_request(rng, user_ids, project_ids)
+            started = time.perf_counter()
+            status = send(method, path, body)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if 200 <= status < 400:
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+    threads = [threading.Thread(target=worker, args=(seed + i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {endpoint: summarize_latencies(latencies[endpoint], elapsed, errors[endpoint])
+               for endpoint in ENDPOINT_WEIGHTS}
+    results['all'] = summarize_latencies(
+        [value for values in latencies.values() for value in values], elapsed, sum(errors.values()))
+    return results
+
+def method_cases(db, user_ids, project_ids, rng):
+    """(name, callable) pairs for every Database method worth timing on its own"""
+    reset_users = iter(user_ids[::-1])
+    return [
+        ('get_projects', lambda: db.get_projects()),
+        ('get_projects_page (uncached)', lambda: (
+            db.projects_cache.clear(), db.get_projects_page(category=rng.choice(list(DEFAULT_CATEGORIES)), sort='roi', limit=20))),
+        ('get_user', lambda: db.get_user(rng.choice(user_ids))),
+        ('get_portfolio', lambda: db.get_portfolio(rng.choice(user_ids))),
+        ('get_portfolio_summary', lambda: db.get_portfolio_summary(rng.choice(user_ids))),
+        ('get_project_exposures', lambda: db.get_project_exposures(rng.choice(user_ids))),
+        ('get_investment_performance',
+         lambda: db.get_investment_performance_summary(rng.choice(user_ids))),
+        ('make_investment', lambda: db.make_investment(rng.choice(user_ids), rng.choice(project_ids), 5)),
+        ('make_investments (5 legs)', lambda: db.make_investments(rng.choice(user_ids), [
+            {'project_id': rng.choice(project_ids), 'amount': 5} for _ in range(5)])),
+        ('update_investment_values', lambda: db.update_investment_values(rng.choice(user_ids))),
+        # Runs last: each call wipes one user, taken from the end of the id range
+        ('reset_user_completely', lambda: db.reset_user_completely(next(reset_users), 10000.0)),
+    ]
+
+def run_methods(db_path, user_ids, project_ids, iterations, time_budget, seed=0):
+    """Time each Database method for ``iterations`` calls or ``time_budget`` seconds"""
+    from models import Database
+
+    db = Database(db_path)
+    rng = random.Random(seed)
+    results = {}
+    try:
+        for name, call in method_cases(db, user_ids, project_ids, rng):
+            limit = min(iterations, len(user_ids) // 2) if name == 'reset_user_completely' else iterations
+            latencies = []
+            deadline = time.perf_counter() + time_budget
+            started = time.perf_counter()
+            while len(latencies) < limit and time.perf_counter() < deadline:
+                call_started = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - call_started)
+            results[name] = summarize_latencies(latencies, time.perf_counter() - started)
+    finally:
+        db.close()
+    return results
+
+# Metrics compared against a baseline, and whether bigger is better
+COMPARED_METRICS = (('p50_ms', False), ('p95_ms', False), ('requests_per_second', True))
+
+def compare(results, baseline, tolerance):
+    """List the metrics that got worse than the baseline by more than ``tolerance``"""
+    regressions = []
+    for section in ('endpoints', 'methods'):
+        for name, stats in results.get(section, {}).items():
+            base = baseline.get(section, {}).get(name)
+            if not base or not stats['requests'] or not base['requests']:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS:
+                old, new = base[metric], stats[metric]
+                if not old:
+                    continue
+                change = (old - new) / old if higher_is_better else (new - old) / old
+                if change > tolerance:
+                    regressions.append(f'{section}/{name} {metric}: {old:.2f} -> {new:.2f} '
+                                       f'({change:+.0%} worse)')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test endpoints and time Database methods')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--investments', type=int, default=20000)
+    parser.add_argument('--user-skew', type=float, default=1.0,
+                        help='Zipf exponent for investments per user (0 = uniform)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for data and request mix')
+    parser.add_argument('--target', choices=('testclient', 'gunicorn'), default='testclient')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of endpoint load')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per Database method')
+    parser.add_argument('--method-budget', type=float, default=5, help='Max seconds per Database method')
+    parser.add_argument('--skip', choices=('load', 'methods'), action='append', default=[])
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a JSON file written by --output')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown before a metric counts as a regression')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    started = time.perf_counter()
+    user_ids, project_ids = seed_database(
+        db_path, args.users, args.projects, args.investments, args.user_skew, args.seed)
+    print(f'Seeded {len(user_ids)} users, {len(project_ids)} projects and {args.investments} '
+          f'investments in {time.perf_counter() - started:.1f}s ({db_path})')
+
+    results = {
+        'config': {key: getattr(args, key) for key in (
+            'users', 'projects', 'investments', 'user_skew', 'seed', 'target', 'workers', 'clients', 'duration', 'iterations')},
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'recorded_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+    if 'load' not in args.skip:
+        target = (GunicornTarget(db_path, args.port, args.workers) if args.target == 'gunicorn'
+                  else TestClientTarget(db_path))
+        try:
+            results['endpoints'] = run_load(target, user_ids, project_ids, args.clients, args.duration, args.seed)
+        finally:
+            target.close()
+        print(f'\nEndpoints ({args.target}, {args.clients} clients, {args.duration:g}s)')
+        print(HEADER)
+        for name, stats in results['endpoints'].items():
+            print(format_row(name, stats))
+
+    if 'methods' not in args.skip:
+        results['methods'] = run_methods(db_path, user_ids, project_ids,
+                                         args.iterations, args.method_budget, args.seed)
+        print('\nDatabase methods (one caller)')
+        print(HEADER)
+        for name, stats in results['methods'].items():
+            print(format_row(name, stats))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nWrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print(f'\nWarning: {args.baseline} was recorded with different settings; '
+                  f'differences may not be regressions')
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regressions against {args.baseline} '
+                  f'(tolerance {args.tolerance:.0%}):')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print(f'\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+In-process response cache for the backend
+
+A small thread-safe LRU cache whose entries also expire after a time-to-live.
+Callers put a version in the key (e.g. the catalogue revision) so a write in
+any worker process makes older entries unreachable; the LRU bound then drops
+them as new versions come in.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Distinguishes "not cached" from a cached None
+MISSING = object()
+
+class TTLCache:
+    """Bounded LRU cache with per-entry time-to-live and hit/miss counters"""
+
+    def __init__(self, maxsize=128, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        """Get a live entry and mark it most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store an entry, evicting the least recently used one when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Snapshot of cache usage counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
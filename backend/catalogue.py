@@ -0,0 +1,348 @@
+"""
+Memory-mapped read model of the project catalogue, shared by every worker
+
+Each gunicorn worker used to query the same ``projects`` table on every
+``/projects`` cache miss. ``CatalogueReadModel`` instead keeps the catalogue
+in one file next to the database, which every worker maps read-only: the
+pages live once in the OS page cache however many workers there are, and
+filtering, sorting and the project data ``/portfolio`` joins in are read
+straight from the mapping without copying. Each worker's page cache still
+sits in front of it.
+
+File layout (little endian):
+
+    header   MAGIC, catalogue revision, project count, lookups offset and
+             size, rows offset and size, database epoch (HEADER_SIZE bytes)
+    records  one RECORD_DTYPE entry per project, ordered by id
+    lookups  JSON {"risk_levels": [...], "categories": [...], "names": [...]}
+    rows     every project's full row as JSON; records point into it
+
+The header carries the catalogue revision it reflects (the ``revisions`` row
+bumped by every write that changes funding) and the epoch of the database it
+was built from (a random ``revisions`` row drawn when the database file is
+created). A file from another epoch, left over from a recreated database,
+is never used. Readers ask for a snapshot of their epoch at least as new as
+the revision they know about:
+
+- an investment patches the funding of its projects in place, so every
+  worker sees it at once without anything being rebuilt
+- a reset, or any gap in the revisions (a write from another tool, two
+  investments racing), rebuilds the whole file from SQLite and swaps it in
+  atomically with ``os.replace``; old mappings stay valid until dropped
+- each worker checks the file against SQLite when it starts (``verify``)
+  and rebuilds it unless the revision matches exactly, which catches a
+  database restored from a backup under an existing file
+
+Writers serialize on an ``fcntl`` lock file. Without ``fcntl`` (Windows)
+``SUPPORTED`` is False and the backend queries SQLite as before.
+"""
+
+import json
+import mmap
+import os
+import string
+import struct
+import threading
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so no shared model
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency, decodes rows ~3x faster
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+SUPPORTED = fcntl is not None
+
+MAGIC = b'PRJCAT02'
+
+# magic, revision, count, lookups offset, lookups size, rows offset, rows size, epoch
+HEADER = struct.Struct('<8sqqqqqqq')
+HEADER_SIZE = 64
+REVISION_OFFSET = 8
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('current_funding', '<f8'),
+    ('funding_goal', '<f8'),
+    ('expected_roi', '<f8'),
+    ('created_at', '<i8'),
+    ('risk_code', '<i4'),
+    ('category_code', '<i4'),
+    ('row_offset', '<i8'),
+    ('row_size', '<i8'),
+])
+
+# Same ranks as PROJECT_SORT_KEYS['risk'] in models.py
+RISK_RANKS = {'Low': 1, 'Medium': 2, 'High': 3}
+DEFAULT_RISK_RANK = 2
+
+# created_at of projects without one; sorts first, as NULL does in SQLite
+MISSING_CREATED_AT = np.iinfo(np.int64).min
+
+# COLLATE NOCASE folds ASCII letters only
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def created_at_seconds(value):
+    """'YYYY-MM-DD HH:MM:SS' as whole seconds, ordered the same way as the strings"""
+    if value is None:
+        return MISSING_CREATED_AT
+    return np.datetime64(value.replace(' ', 'T'), 's').astype(np.int64).item()
+
+def encode(epoch, revision, projects):
+    """Serialize ``projects`` (full rows as dicts, ordered by id) into the file format"""
+    risk_levels = {}
+    categories = {}
+    rows = []
+    offsets = []
+    offset = 0
+    for project in projects:
+        row = json.dumps(project, separators=(',', ':')).encode('utf-8')
+        rows.append(row)
+        offsets.append(offset)
+        offset += len(row)
+
+    records = np.zeros(len(projects), dtype=RECORD_DTYPE)
+    records['id'] = [project['id'] for project in projects]
+    records['current_funding'] = [project['current_funding'] for project in projects]
+    records['funding_goal'] = [project['funding_goal'] for project in projects]
+    records['expected_roi'] = [project['expected_roi'] for project in projects]
+    records['created_at'] = [created_at_seconds(project['created_at']) for project in projects]
+    records['risk_code'] = [risk_levels.setdefault(project['risk_level'], len(risk_levels))
+                            for project in projects]
+    records['category_code'] = [categories.setdefault(project['category'], len(categories))
+                                for project in projects]
+    records['row_offset'] = offsets
+    records['row_size'] = [len(row) for row in rows]
+
+    lookups = json.dumps({
+        'risk_levels': list(risk_levels),
+        'categories': list(categories),
+        'names': [project['name'] for project in projects]
+    }).encode('utf-8')
+    lookups_offset = HEADER_SIZE + records.nbytes
+    rows_offset = lookups_offset + len(lookups)
+    header = HEADER.pack(MAGIC, revision, len(projects), lookups_offset, len(lookups),
+                         rows_offset, offset, epoch)
+    return b''.join([header.ljust(HEADER_SIZE, b'\0'), records.tobytes(), lookups] + rows)
+
+class CatalogueSnapshot:
+    """One mapping of the catalogue file
+
+    ``records`` is a read-only NumPy view of the mapping. ``revision`` is
+    read from the header on every access, so in-place funding patches by
+    other processes show up immediately.
+    """
+
+    def __init__(self, mapping, inode):
+        self.mapping = mapping
+        self.inode = inode
+        magic, _, count, lookups_offset, lookups_size, rows_offset, rows_size, self.epoch = \
+            HEADER.unpack_from(mapping)
+        if magic != MAGIC:
+            raise ValueError('Not a catalogue read model file')
+        self.records = np.frombuffer(mapping, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+        lookups = json.loads(mapping[lookups_offset:lookups_offset + lookups_size])
+        self.risk_levels = tuple(lookups['risk_levels'])
+        self.categories = tuple(lookups['categories'])
+        self.names = tuple(lookups['names'])
+        self.rows = memoryview(mapping)[rows_offset:rows_offset + rows_size]
+        self.risk_ranks = np.array([RISK_RANKS.get(level, DEFAULT_RISK_RANK)
+                                    for level in self.risk_levels], dtype=np.int64)
+
+    @property
+    def revision(self):
+        return struct.unpack_from('<q', self.mapping, REVISION_OFFSET)[0]
+
+    def __len__(self):
+        return len(self.records)
+
+    def projects(self, indices):
+        """The full rows of the projects at ``indices``, as new dicts"""
+        records = self.records[indices]
+        projects = []
+        for offset, size, funding in zip(records['row_offset'].tolist(), records['row_size'].tolist(),
+                                         records['current_funding'].tolist()):
+            project = _loads(self.rows[offset:offset + size])
+            # Funding is patched in the records, not in the JSON row
+            project['current_funding'] = funding
+            projects.append(project)
+        return projects
+
+    def indices(self, project_ids):
+        """Record index of each project id, -1 where the catalogue has no such project"""
+        ids = self.records['id']
+        project_ids = np.asarray(project_ids, dtype=np.int64)
+        index = np.searchsorted(ids, project_ids)
+        found = index < len(ids)
+        found[found] = ids[index[found]] == project_ids[found]
+        return np.where(found, index, -1)
+
+    def labels(self, index):
+        """(risk level, category, name) of the project at ``index``"""
+        record = self.records[index]
+        return (self.risk_levels[record['risk_code']], self.categories[record['category_code']],
+                self.names[index])
+
+    def funding_percentage(self):
+        """current_funding * 100.0 / funding_goal per project, NaN for a zero goal (NULL in SQL)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentage = self.records['current_funding'] * 100.0 / self.records['funding_goal']
+        percentage[self.records['funding_goal'] == 0] = np.nan
+        return percentage
+
+    def sort_keys(self, sort):
+        """The values PROJECT_SORT_KEYS[sort] evaluates to, per project"""
+        if sort == 'newest':
+            return self.records['created_at']
+        if sort == 'roi':
+            return self.records['expected_roi']
+        if sort == 'risk':
+            return self.risk_ranks[self.records['risk_code']]
+        return self.funding_percentage()
+
+    def category_mask(self, category):
+        """Projects whose category equals ``category`` under COLLATE NOCASE"""
+        wanted = category.translate(_ASCII_LOWER)
+        codes = [code for code, name in enumerate(self.categories)
+                 if name.translate(_ASCII_LOWER) == wanted]
+        return np.isin(self.records['category_code'], codes)
+
+class CatalogueReadModel:
+    """The shared catalogue file at ``path``, rebuilt from ``load`` when stale
+
+    ``epoch`` identifies the database; files stamped with another one are
+    rebuilt. ``load()`` returns ``(revision, projects)``: the catalogue
+    revision, read first, then every project's full row as a dict, ordered
+    by id.
+    """
+
+    def __init__(self, path, load, epoch):
+        self.path = path
+        self.load = load
+        self.epoch = epoch
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, revision):
+        """A snapshot reflecting at least ``revision``, remapping or rebuilding as needed"""
+        snapshot = self._snapshot
+        if self._current(snapshot, revision):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._current(snapshot, revision):
+                # Another worker may already have swapped in a newer file
+                snapshot = self._open()
+                if not self._current(snapshot, revision):
+                    snapshot = self._rebuild()
+                self._snapshot = snapshot
+            return snapshot
+
+    def rebuild(self):
+        """Rebuild the file from SQLite, e.g. after a write that touched many projects"""
+        with self._lock:
+            self._snapshot = self._rebuild()
+
+    def verify(self):
+        """Rebuild the file unless it is this database's at exactly its current revision
+
+        Run once at startup: a newer revision than SQLite's means the file
+        outlived the data it was built from (a restored backup).
+        """
+        with self._lock:
+            self._snapshot = self._rebuild(exact=True)
+
+    def apply_funding(self, revision, funding):
+        """Patch project funding in place after a write committed as ``revision``
+
+        ``funding`` maps project id to its current_funding as committed. The
+        patch only applies on top of ``revision - 1``; if the file is missing
+        a revision in between, it is rebuilt instead.
+        """
+        with self._lock, self._file_lock():
+            try:
+                with open(self.path, 'r+b') as file:
+                    mapping = mmap.mmap(file.fileno(), 0)
+            except (FileNotFoundError, ValueError, struct.error):
+                self._snapshot = self._rebuild(locked=True)
+                return
+            try:
+                epoch = HEADER.unpack_from(mapping)[-1]
+                current = struct.unpack_from('<q', mapping, REVISION_OFFSET)[0]
+                if epoch == self.epoch and current >= revision:
+                    return
+                patched = (epoch == self.epoch and current == revision - 1
+                           and self._patch(mapping, funding))
+                if patched:
+                    struct.pack_into('<q', mapping, REVISION_OFFSET, revision)
+            finally:
+                mapping.close()
+            if not patched:
+                self._snapshot = self._rebuild(locked=True)
+
+    def _patch(self, mapping, funding):
+        """Write new funding values into a writable mapping; False if a project is missing"""
+        _, _, count, *_ = HEADER.unpack_from(mapping)
+        records = np.frombuffer(mapping, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+        try:
+            project_ids = np.array(list(funding), dtype=np.int64)
+            index = np.searchsorted(records['id'], project_ids)
+            if (index >= count).any() or (records['id'][index] != project_ids).any():
+                return False
+            records['current_funding'][index] = list(funding.values())
+            return True
+        finally:
+            # The mapping can't be closed while a view of it exists
+            del records
+
+    def _current(self, snapshot, revision):
+        """Whether ``snapshot`` is of this database and at least ``revision``"""
+        return snapshot is not None and snapshot.epoch == self.epoch and snapshot.revision >= revision
+
+    def _open(self):
+        """Map the current file read-only, or None if it is missing or unreadable"""
+        try:
+            with open(self.path, 'rb') as file:
+                inode = os.fstat(file.fileno()).st_ino
+                if self._snapshot is not None and self._snapshot.inode == inode:
+                    return self._snapshot
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            return CatalogueSnapshot(mapping, inode)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _rebuild(self, locked=False, exact=False):
+        """Write a fresh file and swap it in; skipped if another process just did
+
+        With ``exact`` an existing file is only kept at exactly the loaded
+        revision, not a newer one.
+        """
+        lock = nullcontext() if locked else self._file_lock()
+        with lock:
+            revision, projects = self.load()
+            current = self._open()
+            if self._current(current, revision) and not (exact and current.revision != revision):
+                return current
+            temporary = f'{self.path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as file:
+                file.write(encode(self.epoch, revision, projects))
+            os.replace(temporary, self.path)
+            return self._open()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process writing the file"""
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
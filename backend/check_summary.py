@@ -0,0 +1,47 @@
+"""
+Consistency checker for the portfolio_summary aggregates
+
+Compares every (user, category) row of portfolio_summary with a fresh
+aggregate over the investments table and reports any drift. With --repair the
+table is rebuilt from scratch when something is off.
+
+Usage:
+    python check_summary.py [--db database.db] [--repair]
+"""
+
+import argparse
+import sys
+
+from models import Database
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check portfolio_summary against investments')
+    parser.add_argument('--db', default='database.db', help='Path to the SQLite database')
+    parser.add_argument('--repair', action='store_true', help='Rebuild the table if it is inconsistent')
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        result = db.check_portfolio_summary(repair=args.repair)
+    finally:
+        db.close()
+
+    if result['consistent']:
+        print('portfolio_summary is consistent')
+        return 0
+
+    print(f"portfolio_summary has {len(result['mismatches'])} mismatching rows:")
+    for row in result['mismatches'][:20]:
+        print(
+            f"  user {row['user_id']} / {row['category']}: "
+            f"invested {row['summary_invested']} vs {row['actual_invested']}, "
+            f"value {row['summary_value']} vs {row['actual_value']}, "
+            f"count {row['summary_count']} vs {row['actual_count']}"
+        )
+    if 'rebuilt_rows' in result:
+        print(f"Rebuilt portfolio_summary ({result['rebuilt_rows']} rows)")
+        return 0
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Synthetic data generator for scale testing
+
+Fills a database with generated users, projects and investments so query and
+reset paths can be exercised at realistic sizes (millions of investments).
+Everything is written in one transaction: secondary indexes are dropped
+first and rebuilt once at the end, rows go in through ``executemany`` in
+chunks produced by NumPy, and ``portfolio_summary`` and project funding
+totals are accumulated from the generated arrays rather than re-aggregated
+from the table. A failed run leaves the database as it was.
+
+Distributions:
+    - Users are picked with a Zipf-like skew (``--user-skew``), so a few
+      users hold many positions and most hold a handful; 0 means uniform
+    - Projects are picked with their own skew (``--project-skew``)
+    - Categories and risk levels follow ``--categories`` / ``--risk`` weights
+    - Amounts are log-normal around ``--mean-amount``
+    - Investment dates are spread uniformly over the last ``--years`` years
+    - Current values grow at the project's expected ROI for the time held,
+      with noise scaled by its risk level
+
+Usage:
+    python generate_data.py --db fixture.db --users 100000 --projects 2000 --investments 10000000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from migrations import user_scope
+from revaluation import MIN_VALUE_FRACTION
+
+DEFAULT_CATEGORIES = {
+    'Food & Beverage': 2, 'Education': 1, 'Agriculture': 1, 'Services': 2, 'E-commerce': 1,
+    'Energy': 1, 'Entertainment': 1, 'Retail': 1, 'Technology': 2, 'Fitness': 1
+}
+DEFAULT_RISK = {'Low': 3, 'Medium': 5, 'High': 2}
+
+# Expected ROI range (percent) and yearly value noise for each risk level
+ROI_RANGES = {'Low': (6.0, 10.0), 'Medium': (10.0, 16.0), 'High': (16.0, 25.0)}
+VALUE_NOISE = {'Low': 0.02, 'Medium': 0.05, 'High': 0.10}
+
+# Rows handed to executemany at a time
+CHUNK_SIZE = 500000
+
+# Tables whose secondary indexes are dropped during the load
+DEFERRED_INDEX_TABLES = ('investments', 'projects')
+
+def parse_weights(spec):
+    """Parse 'Name=weight,Name=weight' into a dict"""
+    weights = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = float(weight) if weight else 1.0
+    return weights
+
+def skewed_choice(rng, count, size, skew):
+    """Draw ``size`` indexes in [0, count) with P(rank k) proportional to 1 / k**skew
+
+    Ranks are shuffled so the popular ids are spread over the id range.
+    """
+    if skew <= 0:
+        return rng.integers(0, count, size)
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    ranks = rng.choice(count, size=size, p=weights / weights.sum())
+    return rng.permutation(count)[ranks]
+
+def _max_id(conn, table):
+    return conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+
+def _drop_indexes(conn):
+    """Drop secondary indexes on the bulk-loaded tables and return their SQL"""
+    placeholders = ', '.join('?' * len(DEFERRED_INDEX_TABLES))
+    indexes = conn.execute(f'''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', DEFERRED_INDEX_TABLES).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+def _insert_users(conn, count, first_id, balance):
+    conn.executemany('INSERT INTO users (id, username, balance) VALUES (?, ?, ?)', (
+        (user_id, f'user_{user_id}', balance) for user_id in range(first_id, first_id + count)
+    ))
+
+def _insert_projects(conn, rng, count, first_id, categories, risk, years, now):
+    """Insert generated projects and return their attribute arrays and category names"""
+    category_names = list(categories)
+    category_p = np.array(list(categories.values()), dtype=float)
+    risk_names = list(risk)
+    risk_p = np.array(list(risk.values()), dtype=float)
+
+    project_category = rng.choice(len(category_names), size=count, p=category_p / category_p.sum())
+    project_risk = rng.choice(len(risk_names), size=count, p=risk_p / risk_p.sum())
+    low = np.array([ROI_RANGES.get(name, (8.0, 14.0))[0] for name in risk_names])[project_risk]
+    high = np.array([ROI_RANGES.get(name, (8.0, 14.0))[1] for name in risk_names])[project_risk]
+    roi = np.round(rng.uniform(low, high), 1)
+    noise = np.array([VALUE_NOISE.get(name, 0.05) for name in risk_names])[project_risk]
+    goals = rng.integers(5, 51, count) * 1000.0
+    created = now - rng.integers(0, int(years * 365 * 86400), count)
+
+    ids = np.arange(first_id, first_id + count)
+    conn.executemany('''
+        INSERT INTO projects (id, name, description, category, risk_level, expected_roi,
+                              funding_goal, current_funding, location, image_url, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0.0, ?, NULL, datetime(?, 'unixepoch'))
+    ''', (
+        (project_id, f'Project {project_id}', 'Generated project for scale testing',
+         category_names[c], risk_names[r], expected_roi, goal, 'Generated City', created_at)
+        for project_id, c, r, expected_roi, goal, created_at in zip(
+            ids.tolist(), project_category.tolist(), project_risk.tolist(),
+            roi.tolist(), goals.tolist(), created.tolist())
+    ))
+    return {'id': ids, 'expected_roi': roi, 'noise': noise, 'category': project_category}, category_names
+
+def _load_projects(conn):
+    """Attribute arrays and category names for the projects already in the database"""
+    rows = conn.execute('SELECT id, expected_roi, risk_level, category FROM projects ORDER BY id').fetchall()
+    category_names = sorted({row[3] for row in rows})
+    category_index = {name: index for index, name in enumerate(category_names)}
+    return {
+        'id': np.array([row[0] for row in rows], dtype=np.int64),
+        'expected_roi': np.array([row[1] for row in rows], dtype=float),
+        'noise': np.array([VALUE_NOISE.get(row[2], 0.05) for row in rows]),
+        'category': np.array([category_index[row[3]] for row in rows], dtype=np.int64)
+    }, category_names
+
+def _insert_investments(conn, rng, count, user_ids, projects, category_count,
+                        user_skew, project_skew, mean_amount, years, now, progress):
+    """Insert ``count`` investments in NumPy-generated chunks
+
+    Returns the per-project funding and per-(user, category) totals of what
+    was inserted, accumulated from the same arrays, so they never have to be
+    re-aggregated from the table.
+    """
+    span = int(years * 365 * 86400)
+    sigma = 0.75
+    mu = np.log(mean_amount) - sigma ** 2 / 2
+    cells = len(user_ids) * category_count
+    totals = {
+        'funding': np.zeros(len(projects['id'])),
+        'invested': np.zeros(cells),
+        'current_value': np.zeros(cells),
+        'count': np.zeros(cells, dtype=np.int64)
+    }
+    written = 0
+
+    # investments uses AUTOINCREMENT, which updates sqlite_sequence after
+    # every statement; staging each chunk in a plain temp table and copying it
+    # with one INSERT ... SELECT pays that once per chunk instead of per row
+    conn.execute('''
+        CREATE TEMP TABLE generated_investments (
+            user_id INTEGER, project_id INTEGER, amount REAL, current_value REAL, investment_date INTEGER
+        )
+    ''')
+
+    while written < count:
+        size = min(CHUNK_SIZE, count - written)
+        users = skewed_choice(rng, len(user_ids), size, user_skew)
+        picked = skewed_choice(rng, len(projects['id']), size, project_skew)
+        amounts = np.round(np.maximum(rng.lognormal(mu, sigma, size), 1.0), 2)
+        age = rng.integers(0, span, size)
+
+        # Rows sorted by (user, date) within a chunk make the index builds
+        # at the end noticeably cheaper
+        order = np.lexsort((-age, users))
+        users, picked, amounts, age = users[order], picked[order], amounts[order], age[order]
+        held_years = age / (365 * 86400)
+        growth = (1 + projects['expected_roi'][picked] / 100) ** held_years
+        noise = np.exp(rng.normal(0, projects['noise'][picked] * np.sqrt(held_years)))
+        values = np.round(np.maximum(amounts * growth * noise, amounts * MIN_VALUE_FRACTION), 2)
+
+        conn.executemany('INSERT INTO temp.generated_investments VALUES (?, ?, ?, ?, ?)', zip(
+            user_ids[users].tolist(), projects['id'][picked].tolist(), amounts.tolist(),
+            values.tolist(), (now - age).tolist()))
+        conn.execute('''
+            INSERT INTO investments (user_id, project_id, amount, current_value, investment_date)
+            SELECT user_id, project_id, amount, current_value, datetime(investment_date, 'unixepoch')
+            FROM temp.generated_investments
+        ''')
+        conn.execute('DELETE FROM temp.generated_investments')
+
+        cell = users * category_count + projects['category'][picked]
+        totals['funding'] += np.bincount(picked, weights=amounts, minlength=len(projects['id']))
+        totals['invested'] += np.bincount(cell, weights=amounts, minlength=cells)
+        totals['current_value'] += np.bincount(cell, weights=values, minlength=cells)
+        totals['count'] += np.bincount(cell, minlength=cells)
+
+        written += size
+        if progress:
+            progress(written, count)
+
+    conn.execute('DROP TABLE temp.generated_investments')
+    return totals
+
+def _apply_totals(conn, totals, user_ids, projects, category_names):
+    """Add the inserted investments to project funding and portfolio_summary"""
+    funded = np.nonzero(totals['funding'])[0]
+    conn.executemany('UPDATE projects SET current_funding = current_funding + ? WHERE id = ?',
+                     zip(totals['funding'][funded].tolist(), projects['id'][funded].tolist()))
+
+    cells = np.nonzero(totals['count'])[0]
+    users = user_ids[cells // len(category_names)].tolist()
+    categories = [category_names[c] for c in (cells % len(category_names)).tolist()]
+    conn.executemany('''
+        INSERT INTO portfolio_summary (user_id, category, invested, current_value, investment_count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, category) DO UPDATE SET
+            invested = invested + excluded.invested,
+            current_value = current_value + excluded.current_value,
+            investment_count = investment_count + excluded.investment_count
+    ''', zip(users, categories, totals['invested'][cells].tolist(),
+             totals['current_value'][cells].tolist(), totals['count'][cells].tolist()))
+
+    # Existing users' cached portfolio responses are now out of date
+    conn.executemany('''
+        INSERT INTO revisions (scope, revision) VALUES (?, 1)
+        ON CONFLICT(scope) DO UPDATE SET revision = revision + 1
+    ''', ((user_scope(user_id),) for user_id in sorted(set(users))))
+
+def generate(db_path, users=1000, projects=100, investments=100000,
+             categories=None, risk=None, user_skew=1.0, project_skew=0.8,
+             mean_amount=50.0, years=3.0, balance=10000.0, seed=None, progress=None):
+    """Add generated users, projects and investments to ``db_path`` in one transaction
+
+    When ``users`` or ``projects`` is 0 the investments go to the ones already
+    in the database. Returns counts and timings.
+    """
+    # Make sure the schema (and the demo seed) exist before loading into it
+    from models import Database
+    Database(db_path).close()
+
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # A rollback journal only copies pages that already existed, so a
+        # large load into new pages costs one write instead of WAL + checkpoint.
+        # The default cache size and temp_store are left alone: giving SQLite's
+        # index sorter more memory makes it slower, not faster.
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            index_sql = _drop_indexes(conn)
+
+            if users:
+                first_user = _max_id(conn, 'users') + 1
+                _insert_users(conn, users, first_user, balance)
+                user_ids = np.arange(first_user, first_user + users)
+            else:
+                user_ids = np.array([row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')],
+                                    dtype=np.int64)
+
+            if projects:
+                project_arrays, category_names = _insert_projects(
+                    conn, rng, projects, _max_id(conn, 'projects') + 1,
+                    categories or DEFAULT_CATEGORIES, risk or DEFAULT_RISK, years, now)
+            else:
+                project_arrays, category_names = _load_projects(conn)
+
+            if investments:
+                if not len(user_ids) or not len(project_arrays['id']):
+                    raise ValueError('investments need at least one user and one project')
+                totals = _insert_investments(
+                    conn, rng, investments, user_ids, project_arrays, len(category_names),
+                    user_skew, project_skew, mean_amount, years, now, progress)
+                _apply_totals(conn, totals, user_ids, project_arrays, category_names)
+            loaded = time.perf_counter()
+
+            for sql in index_sql:
+                conn.execute(sql)
+            indexed = time.perf_counter()
+
+            conn.execute("UPDATE revisions SET revision = revision + 1 WHERE scope = 'catalogue'")
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conn.close()
+
+    finished = time.perf_counter()
+    return {
+        'users': users,
+        'projects': projects,
+        'investments': investments,
+        'user_ids': user_ids.tolist(),
+        'project_ids': project_arrays['id'].tolist(),
+        'load_seconds': loaded - started,
+        'index_seconds': indexed - loaded,
+        'total_seconds': finished - started
+    }
+
+def print_progress(written, total):
+    """Print how many investments have been written so far"""
+    print(f'  {written:>12,} / {total:,} investments')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic data')
+    parser.add_argument('--db', default='fixture.db', help='Path to the SQLite database')
+    parser.add_argument('--users', type=int, default=1000, help='Users to add (0 = use existing)')
+    parser.add_argument('--projects', type=int, default=100, help='Projects to add (0 = use existing)')
+    parser.add_argument('--investments', type=int, default=100000, help='Investments to add')
+    parser.add_argument('--categories', type=parse_weights, default=None,
+                        help="Category weights for new projects, e.g. 'Technology=3,Energy=1'")
+    parser.add_argument('--risk', type=parse_weights, default=None,
+                        help="Risk level weights for new projects, e.g. 'Low=3,Medium=5,High=2'")
+    parser.add_argument('--user-skew', type=float, default=1.0, help='Zipf exponent for users (0 = uniform)')
+    parser.add_argument('--project-skew', type=float, default=0.8, help='Zipf exponent for projects (0 = uniform)')
+    parser.add_argument('--mean-amount', type=float, default=50.0, help='Mean investment amount')
+    parser.add_argument('--years', type=float, default=3.0, help='Spread investment dates over this many years')
+    parser.add_argument('--balance', type=float, default=10000.0, help='Balance of each new user')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible fixture')
+    parser.add_argument('--overwrite', action='store_true', help='Delete the database file first')
+    parser.add_argument('--quiet', action='store_true', help='Only print the final summary')
+    args = parser.parse_args(argv)
+
+    if args.overwrite:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    print(f'Generating {args.users:,} users, {args.projects:,} projects and '
+          f'{args.investments:,} investments into {args.db}')
+    stats = generate(
+        args.db, users=args.users, projects=args.projects, investments=args.investments,
+        categories=args.categories, risk=args.risk, user_skew=args.user_skew,
+        project_skew=args.project_skew, mean_amount=args.mean_amount, years=args.years,
+        balance=args.balance, seed=args.seed, progress=None if args.quiet else print_progress
+    )
+    print(f"Done in {stats['total_seconds']:.1f}s "
+          f"(rows {stats['load_seconds']:.1f}s, indexes {stats['index_seconds']:.1f}s, "
+          f"{args.investments / stats['total_seconds']:,.0f} investments/s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Request, Database and SQL metrics in Prometheus text format
+
+``Metrics`` is a small thread-safe registry of counters and histograms that
+renders itself in the Prometheus exposition format for ``GET /metrics``.
+Values are per process: with several gunicorn workers each one reports its
+own numbers, so scrape them individually or sum them in the dashboard.
+
+SQL statements are timed by the ``TimedConnection`` / ``TimedCursor``
+sqlite3 subclasses, which ``Database`` uses when it is given a ``Metrics``
+instance. A statement's duration covers executing it and fetching its rows,
+and is labelled with the ``Database`` method that ran it. Statements slower
+than ``slow_query_ms`` are also logged.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Metrics:
+    """Registry of labelled counters and histograms"""
+
+    def __init__(self, slow_query_ms=None):
+        self.slow_query_ms = slow_query_ms
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.counter('http_requests_total', 'HTTP requests handled', ('method', 'route', 'status'))
+        self.histogram('http_request_duration_seconds', 'Time spent handling HTTP requests',
+                       ('method', 'route'), REQUEST_BUCKETS)
+        self.histogram('db_method_duration_seconds', 'Time spent in Database methods',
+                       ('method',), DB_BUCKETS)
+        self.histogram('db_query_duration_seconds', 'Time spent executing SQL statements and fetching rows',
+                       ('method', 'operation'), DB_BUCKETS)
+        self.counter('db_query_rows_total', 'Rows returned or changed by SQL statements',
+                     ('method', 'operation'))
+        self.counter('db_slow_queries_total', 'SQL statements slower than the slow query threshold',
+                     ('method', 'operation'))
+        self.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+                       ('pool',), DB_BUCKETS)
+
+    def counter(self, name, help_text, labels=()):
+        """Declare a counter"""
+        self._families[name] = {'type': 'counter', 'help': help_text, 'labels': tuple(labels), 'series': {}}
+
+    def histogram(self, name, help_text, labels=(), buckets=REQUEST_BUCKETS):
+        """Declare a histogram"""
+        self._families[name] = {'type': 'histogram', 'help': help_text, 'labels': tuple(labels),
+                                'buckets': tuple(buckets), 'series': {}}
+
+    def inc(self, name, labels=(), amount=1):
+        """Add to a counter"""
+        family = self._families[name]
+        with self._lock:
+            family['series'][labels] = family['series'].get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Record one observation in a histogram"""
+        family = self._families[name]
+        with self._lock:
+            series = family['series'].get(labels)
+            if series is None:
+                series = family['series'][labels] = [[0] * len(family['buckets']), 0.0, 0]
+            for index, bound in enumerate(family['buckets']):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def add_collector(self, collect):
+        """Register a callable returning ``(name, type, help, [(labels dict, value)])`` tuples
+
+        Collectors run at scrape time, for values owned by other objects
+        (pool and cache counters).
+        """
+        self._collectors.append(collect)
+
+    # Tracking which Database method is running on this thread
+
+    @property
+    def current_method(self):
+        return getattr(self._local, 'method', None)
+
+    @current_method.setter
+    def current_method(self, method):
+        self._local.method = method
+
+    def observe_request(self, method, route, status, seconds):
+        self.inc('http_requests_total', (method, route, str(status)))
+        self.observe('http_request_duration_seconds', (method, route), seconds)
+
+    def observe_query(self, sql, seconds, rows):
+        """Record one SQL statement and log it if it was slow"""
+        operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        labels = (self.current_method or 'other', operation)
+        self.observe('db_query_duration_seconds', labels, seconds)
+        if rows:
+            self.inc('db_query_rows_total', labels, rows)
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            self.inc('db_slow_queries_total', labels)
+            logger.warning('Slow query in %s (%.1f ms, %d rows): %s',
+                           labels[0], seconds * 1000, rows, _WHITESPACE.sub(' ', sql).strip()[:500])
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            families = [(name, dict(family, series=dict(family['series'])))
+                        for name, family in self._families.items()]
+            for name, family in families:
+                if family['type'] == 'histogram':
+                    family['series'] = {labels: [list(s[0]), s[1], s[2]]
+                                        for labels, s in family['series'].items()}
+
+        for name, family in families:
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for labels, series in sorted(family['series'].items()):
+                if family['type'] == 'counter':
+                    lines.append(f"{name}{_format_labels(family['labels'], labels)} {_format_value(series)}")
+                    continue
+                counts, total, count = series
+                cumulative = 0
+                for bound, bucket_count in zip(family['buckets'] + (float('inf'),), counts + [0]):
+                    cumulative = count if bound == float('inf') else cumulative + bucket_count
+                    le = ('le', _format_value(float(bound)))
+                    lines.append(f"{name}_bucket{_format_labels(family['labels'], labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(family['labels'], labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(family['labels'], labels)} {count}")
+
+        for collect in self._collectors:
+            for name, metric_type, help_text, samples in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} '
+                                 f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's duration and row count to ``Metrics``
+
+    A statement is reported once it is finished with: all rows fetched, the
+    cursor re-used or closed, or the cursor garbage collected.
+    """
+
+    _sql = None
+
+    def _start(self, sql):
+        self._report()
+        self._sql = sql
+        self._rows = 0
+        self._seconds = 0.0
+
+    def _report(self):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        rows = self._rows if self.description is not None else max(self.rowcount, 0)
+        self.connection.metrics.observe_query(sql, self._seconds, rows)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._seconds += time.perf_counter() - started
+            if self.description is None:
+                self._report()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._seconds += time.perf_counter() - started
+            self._report()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._seconds += time.perf_counter() - started
+        if row is None:
+            self._report()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._seconds += time.perf_counter() - started
+        self._rows += len(rows)
+        if not rows:
+            self._report()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._seconds += time.perf_counter() - started
+        self._rows += len(rows)
+        self._report()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._seconds += time.perf_counter() - started
+            self._report()
+            raise
+        self._seconds += time.perf_counter() - started
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._report()
+        super().close()
+
+    def __del__(self):
+        self._report()
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements all go through ``TimedCursor``
+
+    Set ``metrics`` on the connection right after opening it.
+    """
+
+    metrics = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,186 @@
+"""
+Versioned schema migrations for the investing platform database
+
+The base tables are created by ``Database._create_tables``; everything added
+after that lives here as a numbered migration. The schema version is stored
+in SQLite's ``PRAGMA user_version``, so existing database files are upgraded
+in place the next time the app starts (or by running this module directly).
+
+Each migration is a ``(version, description, steps)`` tuple. A step is either
+a SQL string or a callable taking the connection, and all steps of one
+migration run in a single transaction together with the version bump.
+
+Usage:
+    python migrations.py [path/to/database.db]
+"""
+
+import sys
+
+# Recomputes portfolio_summary rows from the investments table. Used to
+# backfill it in migration 4 and by Database.rebuild_portfolio_summary.
+PORTFOLIO_SUMMARY_REBUILD_SQL = '''
+    INSERT INTO portfolio_summary (user_id, category, invested, current_value, investment_count)
+    SELECT i.user_id, p.category, SUM(i.amount), SUM(i.current_value), COUNT(*)
+    FROM investments i
+    JOIN projects p ON i.project_id = p.id
+    GROUP BY i.user_id, p.category
+'''
+
+# Revision scope versioning one user's balance and portfolio ('user:<id>')
+USER_SCOPE_PREFIX = 'user:'
+
+# Revision scope holding a random identity drawn once per database file, so
+# a copy of catalogue data from another file (a recreated database, a
+# fresh generate_data.py fixture) is never mistaken for this one's
+EPOCH_SCOPE = 'epoch'
+
+def user_scope(user_id):
+    """Name of the revision scope for one user"""
+    return f'{USER_SCOPE_PREFIX}{user_id}'
+
+MIGRATIONS = [
+    (1, 'Index investments and projects for per-user lookups and joins', [
+        # Covers the per-user SUM(amount)/SUM(current_value) scans and the
+        # GROUP BY project_id in reset_user_completely without a table lookup
+        '''CREATE INDEX IF NOT EXISTS idx_investments_user_project
+           ON investments (user_id, project_id, amount, current_value)''',
+        # get_portfolio filters by user and orders by investment date
+        '''CREATE INDEX IF NOT EXISTS idx_investments_user_date
+           ON investments (user_id, investment_date)''',
+        # Joins and lookups coming from the project side
+        '''CREATE INDEX IF NOT EXISTS idx_investments_project
+           ON investments (project_id)''',
+        # get_projects sorts the catalogue by creation date
+        '''CREATE INDEX IF NOT EXISTS idx_projects_created_at
+           ON projects (created_at)''',
+    ]),
+    (2, 'Add revision counters used to version cached responses', [
+        # One row per scope ('catalogue', 'user:<id>', ...); writers bump the
+        # counter in the same transaction as the change it describes
+        '''CREATE TABLE IF NOT EXISTS revisions (
+               scope TEXT PRIMARY KEY,
+               revision INTEGER NOT NULL DEFAULT 0
+           )''',
+        "INSERT OR IGNORE INTO revisions (scope, revision) VALUES ('catalogue', 0)",
+    ]),
+    (3, 'Index the /projects filter and sort keys', [
+        # Expressions must match PROJECT_SORT_KEYS in models.py exactly for
+        # SQLite to use the expression indexes
+        '''CREATE INDEX IF NOT EXISTS idx_projects_category
+           ON projects (category COLLATE NOCASE)''',
+        '''CREATE INDEX IF NOT EXISTS idx_projects_roi
+           ON projects (expected_roi)''',
+        '''CREATE INDEX IF NOT EXISTS idx_projects_risk_rank
+           ON projects ((CASE risk_level WHEN 'Low' THEN 1 WHEN 'Medium' THEN 2
+                                         WHEN 'High' THEN 3 ELSE 2 END))''',
+        '''CREATE INDEX IF NOT EXISTS idx_projects_funding_percentage
+           ON projects ((current_funding * 100.0 / funding_goal))''',
+    ]),
+    (4, 'Add per-user, per-category portfolio_summary aggregates', [
+        # Maintained incrementally by every write to investments, so summary
+        # reads never have to scan a user's investment rows
+        '''CREATE TABLE IF NOT EXISTS portfolio_summary (
+               user_id INTEGER NOT NULL,
+               category TEXT NOT NULL,
+               invested REAL NOT NULL DEFAULT 0.0,
+               current_value REAL NOT NULL DEFAULT 0.0,
+               investment_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, category)
+           ) WITHOUT ROWID''',
+        'DELETE FROM portfolio_summary',
+        PORTFOLIO_SUMMARY_REBUILD_SQL,
+    ]),
+    (5, 'Add the portfolio value time series and its daily/monthly rollups', [
+        # Append-only, written by every revaluation (see snapshots.py);
+        # times are UNIX seconds, rollup buckets start at UTC midnight or
+        # the first of the month
+        '''CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+               user_id INTEGER NOT NULL,
+               taken_at INTEGER NOT NULL,
+               invested REAL NOT NULL,
+               current_value REAL NOT NULL,
+               PRIMARY KEY (user_id, taken_at)
+           ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS portfolio_daily (
+               user_id INTEGER NOT NULL,
+               day_start INTEGER NOT NULL,
+               open_value REAL NOT NULL,
+               high_value REAL NOT NULL,
+               low_value REAL NOT NULL,
+               close_value REAL NOT NULL,
+               invested REAL NOT NULL,
+               samples INTEGER NOT NULL,
+               PRIMARY KEY (user_id, day_start)
+           ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS portfolio_monthly (
+               user_id INTEGER NOT NULL,
+               month_start INTEGER NOT NULL,
+               open_value REAL NOT NULL,
+               high_value REAL NOT NULL,
+               low_value REAL NOT NULL,
+               close_value REAL NOT NULL,
+               invested REAL NOT NULL,
+               samples INTEGER NOT NULL,
+               PRIMARY KEY (user_id, month_start)
+           ) WITHOUT ROWID''',
+    ]),
+    (6, 'Stamp the database with a random identity for derived files', [
+        f"INSERT OR IGNORE INTO revisions (scope, revision) VALUES ('{EPOCH_SCOPE}', random())",
+    ]),
+]
+
+def get_schema_version(conn):
+    """Get the schema version recorded in the database file"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply every migration newer than the database's schema version
+
+    Safe to run from several processes at once (gunicorn workers starting
+    together): the version is re-read once the write lock is held, so a
+    migration another process applied meanwhile is skipped.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    current = get_schema_version(conn)
+
+    for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        current = get_schema_version(conn)
+        if version <= current:
+            conn.rollback()
+            continue
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        current = version
+
+    return applied
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'database.db'
+
+    # Going through Database makes sure the base tables exist before migrating
+    from models import Database
+    db = Database(db_path)
+
+    with db.connection() as conn:
+        print(f'{db_path}: schema version {get_schema_version(conn)}')
+        for version, description, _ in MIGRATIONS:
+            print(f'  {version:>3}  {description}')
+    db.close()
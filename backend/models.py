@@ -1,21 +1,446 @@
 import sqlite3
+import base64
+import functools
 import json
-from datetime import datetime
+import logging
+import os
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from cache import MISSING, TTLCache
+from catalogue import CatalogueReadModel, created_at_seconds
+from metrics import TimedConnection
+from migrations import migrate, user_scope, EPOCH_SCOPE, PORTFOLIO_SUMMARY_REBUILD_SQL, USER_SCOPE_PREFIX
+from revaluation import revalue_all, revalue_user, DEFAULT_CHUNK_SIZE
+from positions import load_positions
+from rng import RandomStreams
+from snapshots import delete_history, history_range
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs applied to every connection. journal_mode is stored in the database
+# file itself, so it only needs to be switched once in init_db; the rest are
+# per-connection settings. Pass profile={} to Database to keep SQLite defaults.
+PERFORMANCE_PROFILE = {
+    'journal_mode': 'WAL',        # readers no longer block on the writer
+    'synchronous': 'NORMAL',      # safe with WAL, one fsync per checkpoint
+    'busy_timeout': 5000,         # ms to wait on a locked database
+    'mmap_size': 268435456,       # 256 MB memory-mapped reads
+    'cache_size': -20000,         # ~20 MB page cache (negative = KiB)
+    'temp_store': 'MEMORY'        # temp tables and sort spills in RAM
+}
+
+# Sort keys accepted by Database.get_projects: (SQL expression, default order).
+# The expressions are indexed by migration 3, so keep them in sync with it.
+PROJECT_SORT_KEYS = {
+    'newest': ('created_at', 'desc'),
+    'roi': ('expected_roi', 'desc'),
+    'risk': ("(CASE risk_level WHEN 'Low' THEN 1 WHEN 'Medium' THEN 2 "
+             "WHEN 'High' THEN 3 ELSE 2 END)", 'asc'),
+    'funding': ('(current_funding * 100.0 / funding_goal)', 'desc')
+}
+
+FUNDING_PERCENTAGE_SQL = PROJECT_SORT_KEYS['funding'][0]
+
+# Columns of Database.export_investments, in order
+EXPORT_COLUMNS = ('id', 'project_id', 'project_name', 'category', 'risk_level', 'expected_roi',
+                  'amount', 'current_value', 'investment_date')
+
+# Shapes read methods can return rows in: dicts (the default), column names
+# plus plain tuples, or one list per column
+ROW_FORMATS = ('dict', 'tuple', 'columns')
+
+class ConnectionPool:
+    """Thread-safe pool of reusable SQLite connections
+    
+    Connections are handed out LIFO so a worker keeps hitting the same warm
+    connection, and a thread that re-enters the pool while it already holds a
+    connection gets that same connection back instead of opening a second one.
+    At most ``size`` connections are open at once; ``acquire`` waits up to
+    ``timeout`` seconds for one to be released before giving up. ``on_wait``,
+    if given, is called with the seconds each checkout spent waiting.
+    """
+    
+    def __init__(self, connect, size=5, timeout=5.0, on_wait=None):
+        self._connect = connect
+        self.on_wait = on_wait
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.health_check_failures = 0
+        self.in_use = 0
+    
+    def acquire(self):
+        """Borrow a connection, reusing the calling thread's one if it has it"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+        
+        if self._closed:
+            raise sqlite3.ProgrammingError('Connection pool is closed')
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f'Connection pool exhausted ({self.size} connections in use)'
+            )
+        
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        if self.on_wait is not None:
+            self.on_wait(time.perf_counter() - started)
+        
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+    
+    def release(self, conn):
+        """Return a connection once the outermost borrower is done with it"""
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        
+        keep = not self._closed
+        try:
+            # Never hand the next borrower a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            keep = False
+        
+        with self._lock:
+            self.in_use -= 1
+            if keep:
+                self._idle.append(conn)
+        if not keep:
+            conn.close()
+        self._slots.release()
+    
+    def _checkout(self):
+        """Pop a healthy idle connection or open a new one"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            if self._is_healthy(conn):
+                with self._lock:
+                    self.hits += 1
+                    self.in_use += 1
+                return conn
+            with self._lock:
+                self.health_check_failures += 1
+            conn.close()
+        
+        conn = self._connect()
+        with self._lock:
+            self.misses += 1
+            self.in_use += 1
+        return conn
+    
+    def _is_healthy(self, conn):
+        """Cheap liveness probe run before an idle connection is reused"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def close(self):
+        """Close idle connections; busy ones are closed when released"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+    
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0,
+                'health_check_failures': self.health_check_failures
+            }
+
+def timed(method):
+    """Record a Database method's duration when the instance has metrics enabled
+    
+    SQL run inside the method is labelled with its name in the query metrics.
+    """
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        
+        outer = metrics.current_method
+        metrics.current_method = name
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.observe('db_method_duration_seconds', (name,), time.perf_counter() - started)
+            metrics.current_method = outer
+    return wrapper
 
 class Database:
-    def __init__(self, db_path='database.db'):
+    def __init__(self, db_path='database.db', pool_size=5, pool_timeout=5.0, profile=None,
+                 projects_cache_size=64, projects_cache_ttl=30.0, revision_check_interval=1.0,
+                 metrics=None, streams=None, performance_cache_size=1024, performance_cache_ttl=10.0,
+                 catalogue_path=None):
         self.db_path = db_path
+        
+        # Seeded random streams behind simulated market moves (rng.py)
+        self.streams = streams if streams is not None else RandomStreams()
+        self.profile = dict(PERFORMANCE_PROFILE if profile is None else profile)
+        
+        # Optional metrics.Metrics registry: times methods, SQL and pool waits
+        self.metrics = metrics
+        self.pool = ConnectionPool(self.get_connection, size=pool_size, timeout=pool_timeout,
+                                   on_wait=self._pool_wait_recorder('readwrite'))
+        
+        # Catalogue cache, keyed on the catalogue revision. The revision lives
+        # in SQLite so writes from other worker processes invalidate it too;
+        # it is re-read at most once per revision_check_interval seconds.
+        self.projects_cache = TTLCache(maxsize=projects_cache_size, ttl=projects_cache_ttl)
+        self.revision_check_interval = revision_check_interval
+        
+        # Per-user performance analytics, keyed on (user id, user revision)
+        self.performance_cache = TTLCache(maxsize=performance_cache_size, ttl=performance_cache_ttl)
+        
+        # Optional catalogue read model (set up below, once the schema exists)
+        self.catalogue = None
+        self._catalogue_revision = None
+        self._catalogue_checked_at = 0.0
+        
         self.init_db()
+        
+        # Read-only connections for GET routes; an in-memory database has no
+        # file to share, so it falls back to the read-write pool
+        if db_path == ':memory:':
+            self.read_pool = self.pool
+        else:
+            self.read_pool = ConnectionPool(
+                lambda: self.get_connection(readonly=True), size=pool_size, timeout=pool_timeout,
+                on_wait=self._pool_wait_recorder('readonly')
+            )
+        
+        # Catalogue read model memory-mapped by every worker (catalogue.py);
+        # without one, catalogue reads query SQLite. A file left over from
+        # another database, or newer than this one, is rebuilt here.
+        if catalogue_path:
+            self.catalogue = CatalogueReadModel(catalogue_path, self._load_catalogue,
+                                                self.get_revision(EPOCH_SCOPE))
+            try:
+                self.catalogue.verify()
+            except Exception:
+                logger.exception('Could not verify the catalogue read model; the first reader rebuilds it')
+        
+        if metrics is not None:
+            metrics.add_collector(self._collect_metrics)
     
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+    def get_connection(self, readonly=False):
+        """Open a new, unpooled connection (use ``connection()`` in methods)"""
+        factory = sqlite3.Connection if self.metrics is None else TimedConnection
+        if readonly:
+            uri = Path(os.path.abspath(self.db_path)).as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=factory)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=factory)
+        if self.metrics is not None:
+            conn.metrics = self.metrics
         conn.row_factory = sqlite3.Row
+        self._apply_profile(conn)
+        if readonly:
+            conn.execute('PRAGMA query_only = ON')
         return conn
     
+    def _apply_profile(self, conn):
+        """Apply the per-connection PRAGMAs from the performance profile"""
+        for pragma, value in self.profile.items():
+            if pragma != 'journal_mode':
+                conn.execute(f'PRAGMA {pragma} = {value}')
+    
+    @contextmanager
+    def connection(self, readonly=False):
+        """Borrow a pooled connection for the duration of a ``with`` block
+        
+        Pass ``readonly=True`` from read paths: those connections come from a
+        separate pool and, under WAL, never wait on an in-flight write.
+        """
+        pool = self.read_pool if readonly else self.pool
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+    
+    def get_revision(self, scope):
+        """Get the current revision counter for a scope such as 'catalogue'"""
+        with self.connection(readonly=True) as conn:
+            row = conn.execute('''
+                SELECT revision FROM revisions WHERE scope = ?
+            ''', (scope,)).fetchone()
+        return row['revision'] if row else 0
+    
+    def _bump_revision(self, conn, scope):
+        """Bump a revision counter inside the caller's transaction"""
+        conn.execute('''
+            INSERT INTO revisions (scope, revision) VALUES (?, 1)
+            ON CONFLICT(scope) DO UPDATE SET revision = revision + 1
+        ''', (scope,))
+    
+    def get_user_revision(self, user_id):
+        """Get the revision of one user's balance and portfolio (0 until first changed)"""
+        return self.get_revision(user_scope(user_id))
+    
+    def get_catalogue_revision(self):
+        """Get the catalogue revision, re-reading it from SQLite only periodically"""
+        now = time.monotonic()
+        if self._catalogue_revision is None or now - self._catalogue_checked_at >= self.revision_check_interval:
+            self._catalogue_revision = self.get_revision('catalogue')
+            self._catalogue_checked_at = now
+        return self._catalogue_revision
+    
+    def _invalidate_catalogue(self, funding=None):
+        """Forget cached catalogue data after this process changed it
+        
+        ``funding`` is the (revision, {project id: funding}) a write read with
+        ``_read_funding`` before committing: the read model is patched with
+        it. Without it the read model is rebuilt. Call it after the write has
+        committed and never fail the write over it: a read model that can't be
+        updated is logged and left stale, and the next reader rebuilds it.
+        """
+        self._catalogue_revision = None
+        self.projects_cache.clear()
+        if self.catalogue is not None:
+            try:
+                if funding is None:
+                    self.catalogue.rebuild()
+                else:
+                    self.catalogue.apply_funding(*funding)
+            except Exception:
+                logger.exception('Could not refresh the catalogue read model; leaving it stale')
+    
+    def _read_funding(self, conn, project_ids):
+        """Catalogue revision and funding of ``project_ids``, inside a write transaction"""
+        if self.catalogue is None:
+            return None
+        revision = conn.execute("SELECT revision FROM revisions WHERE scope = 'catalogue'").fetchone()[0]
+        placeholders = ', '.join('?' * len(project_ids))
+        return revision, {
+            row['id']: row['current_funding'] for row in conn.execute(
+                f'SELECT id, current_funding FROM projects WHERE id IN ({placeholders})',
+                list(project_ids)
+            )
+        }
+    
+    def _load_catalogue(self):
+        """Catalogue revision, then every project row ordered by id, for the read model"""
+        with self.connection(readonly=True) as conn:
+            revision = conn.execute("SELECT revision FROM revisions WHERE scope = 'catalogue'").fetchone()
+            projects = [dict(row) for row in conn.execute('SELECT * FROM projects ORDER BY id')]
+        return (revision['revision'] if revision else 0), projects
+    
+    def _catalogue_snapshot(self):
+        """Read model snapshot at least as new as the catalogue revision, or None"""
+        if self.catalogue is None:
+            return None
+        return self.catalogue.snapshot(self.get_catalogue_revision())
+    
+    def cache_stats(self):
+        """Get response cache hit/miss counters"""
+        return {'projects': self.projects_cache.stats(), 'performance': self.performance_cache.stats()}
+    
+    def pool_stats(self):
+        """Get connection pool hit/miss counters"""
+        stats = self.pool.stats()
+        if self.read_pool is not self.pool:
+            stats['readonly'] = self.read_pool.stats()
+        return stats
+    
+    def _pool_wait_recorder(self, pool_name):
+        """Pool ``on_wait`` callback feeding db_pool_wait_seconds, if metrics are on"""
+        if self.metrics is None:
+            return None
+        return lambda seconds: self.metrics.observe('db_pool_wait_seconds', (pool_name,), seconds)
+    
+    def _collect_metrics(self):
+        """Pool and cache counters in the shape Metrics.add_collector expects"""
+        pools = [('readwrite', self.pool.stats())]
+        if self.read_pool is not self.pool:
+            pools.append(('readonly', self.read_pool.stats()))
+        caches = [('projects', self.projects_cache.stats()), ('performance', self.performance_cache.stats())]
+        return [
+            ('db_pool_connections', 'gauge', 'Pooled SQLite connections by state', [
+                ({'pool': name, 'state': state}, stats[state])
+                for name, stats in pools for state in ('in_use', 'idle')
+            ]),
+            ('db_pool_checkouts_total', 'counter', 'Pool checkouts that reused or opened a connection', [
+                ({'pool': name, 'result': result}, stats[key])
+                for name, stats in pools for result, key in (('reused', 'hits'), ('opened', 'misses'))
+            ]),
+            ('db_pool_health_check_failures_total', 'counter', 'Idle connections dropped by the health check', [
+                ({'pool': name}, stats['health_check_failures']) for name, stats in pools
+            ]),
+            ('cache_lookups_total', 'counter', 'Response cache lookups', [
+                ({'cache': name, 'result': result}, stats[key])
+                for name, stats in caches for result, key in (('hit', 'hits'), ('miss', 'misses'))
+            ]),
+            ('cache_evictions_total', 'counter', 'Response cache entries evicted by the LRU bound', [
+                ({'cache': name}, stats['evictions']) for name, stats in caches
+            ]),
+            ('cache_expirations_total', 'counter', 'Response cache entries dropped after their TTL', [
+                ({'cache': name}, stats['expirations']) for name, stats in caches
+            ]),
+            ('cache_entries', 'gauge', 'Entries currently held by the response cache', [
+                ({'cache': name}, stats['size']) for name, stats in caches
+            ])
+        ]
+    
+    def close(self):
+        """Shut down the connection pools"""
+        self.pool.close()
+        self.read_pool.close()
+    
+    @timed
     def init_db(self):
         """Initialize database with required tables"""
-        conn = self.get_connection()
+        with self.connection() as conn:
+            journal_mode = self.profile.get('journal_mode')
+            if journal_mode and self.db_path != ':memory:':
+                conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+            self._create_tables(conn)
+            
+            # Bring older database files up to the current schema
+            migrate(conn)
         
+        # Seed initial data
+        self.seed_data()
+    
+    def _create_tables(self, conn):
+        """Create the base schema if it does not exist yet"""
         # Users table
         conn.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -58,21 +483,19 @@ class Database:
         ''')
         
         conn.commit()
-        conn.close()
-        
-        # Seed initial data
-        self.seed_data()
     
     def seed_data(self):
         """Seed database with initial project data"""
-        conn = self.get_connection()
-        
-        # Check if we already have projects
-        existing_projects = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
-        if existing_projects > 0:
-            conn.close()
-            return
-        
+        with self.connection() as conn:
+            # Check if we already have projects
+            existing_projects = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            if existing_projects > 0:
+                return
+            
+            self._seed_projects(conn)
+    
+    def _seed_projects(self, conn):
+        """Insert the demo user and the mock project catalogue"""
         # Create default user
         conn.execute('''
             INSERT OR IGNORE INTO users (username, balance) 
@@ -227,250 +650,719 @@ class Database:
             ))
         
         conn.commit()
-        conn.close()
     
-    def get_projects(self):
-        """Get all available projects"""
-        conn = self.get_connection()
-        projects = conn.execute('''
-            SELECT * FROM projects ORDER BY created_at DESC
-        ''').fetchall()
-        conn.close()
-        return [dict(project) for project in projects]
+    @timed
+    def get_projects(self, **filters):
+        """Get available projects, optionally filtered, sorted and paginated
+        
+        Accepts the same keyword arguments as ``get_projects_page``.
+        """
+        return self.get_projects_page(**filters)['projects']
+    
+    @timed
+    def get_projects_page(self, category=None, min_funding=None, max_funding=None,
+                          sort='newest', order=None, limit=None, cursor=None):
+        """Get one page of projects with filtering and sorting done in SQL,
+        or on the catalogue read model when there is one
+        
+        Args:
+            category: Exact category name (case-insensitive)
+            min_funding / max_funding: Bounds on the funding percentage
+            sort: One of PROJECT_SORT_KEYS ('newest', 'roi', 'risk', 'funding')
+            order: 'asc' or 'desc' (defaults depend on the sort key)
+            limit: Maximum number of projects to return
+            cursor: ``next_cursor`` from the previous page (keyset pagination)
+        
+        Returns:
+            dict with 'projects' and 'next_cursor' (None on the last page)
+        
+        Raises:
+            ValueError: If a parameter or the cursor is invalid
+        """
+        if sort not in PROJECT_SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(PROJECT_SORT_KEYS)}")
+        sort_sql, default_order = PROJECT_SORT_KEYS[sort]
+        order = (order or default_order).lower()
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be a positive integer')
+        after = self._decode_projects_cursor(cursor, sort) if cursor else None
+        
+        key = ('projects', self.get_catalogue_revision(),
+               category, min_funding, max_funding, sort, order, limit, cursor)
+        page = self.projects_cache.get(key)
+        
+        if page is MISSING:
+            # Only a miss reads the shared read model (or SQLite without one)
+            if self.catalogue is not None:
+                page = self._catalogue_projects(category, min_funding, max_funding,
+                                                sort, order, limit, after)
+            else:
+                page = self._query_projects(category, min_funding, max_funding,
+                                            sort, sort_sql, order, limit, after)
+            self.projects_cache.set(key, page)
+        
+        # Callers decorate the dicts, so never hand out the cached ones
+        return {
+            'projects': [dict(project) for project in page['projects']],
+            'next_cursor': page['next_cursor']
+        }
+    
+    def _query_projects(self, category, min_funding, max_funding, sort, sort_sql, order, limit, after):
+        """Run the filtered, keyset-paginated catalogue query"""
+        conditions = []
+        params = []
+        
+        if category:
+            conditions.append('category = ? COLLATE NOCASE')
+            params.append(category)
+        if min_funding is not None:
+            conditions.append(f'{FUNDING_PERCENTAGE_SQL} >= ?')
+            params.append(min_funding)
+        if max_funding is not None:
+            conditions.append(f'{FUNDING_PERCENTAGE_SQL} <= ?')
+            params.append(max_funding)
+        if after is not None:
+            # Row-value comparison continues right after the previous page; the
+            # plain bound on the sort key lets SQLite seek into its index
+            conditions.append(f"{sort_sql} {'<=' if order == 'desc' else '>='} ?")
+            conditions.append(f"({sort_sql}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params.append(after[0])
+            params.extend(after)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        query = f'''
+            SELECT *, {sort_sql} AS sort_key FROM projects
+            {where}
+            ORDER BY {sort_sql} {order.upper()}, id {order.upper()}
+        '''
+        if limit is not None:
+            # Fetch one extra row to learn whether another page exists
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        
+        with self.connection(readonly=True) as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_projects_cursor(rows[-1]['sort_key'], rows[-1]['id'], sort)
+        
+        projects = []
+        for row in rows:
+            project = dict(row)
+            del project['sort_key']
+            projects.append(project)
+        
+        return {'projects': projects, 'next_cursor': next_cursor}
+    
+    def _catalogue_projects(self, category, min_funding, max_funding, sort, order, limit, after):
+        """The same page as ``_query_projects``, filtered and sorted on the read model"""
+        catalogue = self._catalogue_snapshot()
+        ids = catalogue.records['id']
+        keys = catalogue.sort_keys(sort)
+        selected = np.ones(len(catalogue), dtype=bool)
+        
+        if category:
+            selected &= catalogue.category_mask(category)
+        if min_funding is not None or max_funding is not None:
+            funding = catalogue.funding_percentage()
+            if min_funding is not None:
+                selected &= funding >= min_funding
+            if max_funding is not None:
+                selected &= funding <= max_funding
+        if after is not None:
+            sort_value, after_id = after
+            if sort == 'newest':
+                if not isinstance(sort_value, str):
+                    raise ValueError('Invalid cursor')
+                sort_value = created_at_seconds(sort_value)
+            elif isinstance(sort_value, bool) or not isinstance(sort_value, (int, float)):
+                raise ValueError('Invalid cursor')
+            if order == 'desc':
+                selected &= (keys < sort_value) | ((keys == sort_value) & (ids < after_id))
+            else:
+                selected &= (keys > sort_value) | ((keys == sort_value) & (ids > after_id))
+        
+        # ORDER BY key, id in the requested direction
+        indices = np.flatnonzero(selected)
+        indices = indices[np.lexsort((ids[indices], keys[indices]))]
+        if order == 'desc':
+            indices = indices[::-1]
+        
+        has_more = limit is not None and len(indices) > limit
+        if has_more:
+            indices = indices[:limit]
+        projects = catalogue.projects(indices)
+        
+        next_cursor = None
+        if has_more:
+            last = projects[-1]
+            sort_value = last['created_at'] if sort == 'newest' else keys[indices[-1]].item()
+            next_cursor = self._encode_projects_cursor(sort_value, last['id'], sort)
+        
+        return {'projects': projects, 'next_cursor': next_cursor}
+    
+    def _encode_projects_cursor(self, sort_value, project_id, sort):
+        """Encode the last row of a page as an opaque cursor"""
+        raw = json.dumps([sort, sort_value, project_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    def _decode_projects_cursor(self, cursor, sort):
+        """Decode a cursor back into (sort value, id)"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            cursor_sort, sort_value, project_id = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        if cursor_sort != sort:
+            raise ValueError('Cursor belongs to a different sort order')
+        return sort_value, project_id
     
+    @timed
     def get_user(self, user_id=1):
         """Get user information"""
-        conn = self.get_connection()
-        user = conn.execute('''
-            SELECT * FROM users WHERE id = ?
-        ''', (user_id,)).fetchone()
-        conn.close()
+        with self.connection(readonly=True) as conn:
+            user = conn.execute('''
+                SELECT * FROM users WHERE id = ?
+            ''', (user_id,)).fetchone()
         return dict(user) if user else None
     
+    @timed
     def make_investment(self, user_id, project_id, amount):
-        """Make an investment in a project"""
-        conn = self.get_connection()
+        """Make an investment in a project
         
-        try:
-            # Check if user has sufficient balance
-            user = conn.execute('SELECT balance FROM users WHERE id = ?', (user_id,)).fetchone()
-            if not user or user['balance'] < amount:
-                return {'success': False, 'message': 'Insufficient balance'}
-            
-            # Check if project exists
-            project = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
-            if not project:
-                return {'success': False, 'message': 'Project not found'}
-            
-            # Update user balance
-            new_balance = user['balance'] - amount
-            conn.execute('UPDATE users SET balance = ? WHERE id = ?', (new_balance, user_id))
+        Race-free under concurrent workers: the write lock is taken up front
+        with BEGIN IMMEDIATE and the balance is debited with a conditional
+        UPDATE, so two requests can never both spend the same money.
+        """
+        with self.connection() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                
+                # Debit the balance only if it covers the amount
+                debited = conn.execute('''
+                    UPDATE users SET balance = balance - ?
+                    WHERE id = ? AND balance >= ?
+                ''', (amount, user_id, amount)).rowcount
+                if not debited:
+                    conn.rollback()
+                    return {'success': False, 'message': 'Insufficient balance'}
+                
+                # Credit the project's funding, which also checks it exists
+                credited = conn.execute('''
+                    UPDATE projects SET current_funding = current_funding + ?
+                    WHERE id = ?
+                ''', (amount, project_id)).rowcount
+                if not credited:
+                    conn.rollback()
+                    return {'success': False, 'message': 'Project not found'}
+                
+                project = conn.execute('SELECT category FROM projects WHERE id = ?', (project_id,)).fetchone()
+                
+                # Create investment record
+                conn.execute('''
+                    INSERT INTO investments (user_id, project_id, amount, current_value)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, project_id, amount, amount))
+                self._add_to_portfolio_summary(conn, user_id, project['category'], amount, amount, 1)
+                
+                self._bump_revision(conn, 'catalogue')
+                self._bump_revision(conn, user_scope(user_id))
+                committed_funding = self._read_funding(conn, [project_id])
+                conn.commit()
             
-            # Update project funding
-            new_funding = project['current_funding'] + amount
-            conn.execute('UPDATE projects SET current_funding = ? WHERE id = ?', (new_funding, project_id))
+            except Exception as e:
+                conn.rollback()
+                return {'success': False, 'message': str(e)}
+        
+        # Committed: from here on the investment stands whatever happens
+        self._invalidate_catalogue(committed_funding)
+        return {'success': True, 'message': 'Investment successful'}
+    
+    @timed
+    def make_investments(self, user_id, legs):
+        """Make several investments atomically in one transaction
+        
+        ``legs`` is a list of {'project_id': <int>, 'amount': <float>}. The whole
+        basket is checked against the balance once; either every leg is applied
+        or none is. Returns per-leg results in the order the legs were given.
+        """
+        with self.connection() as conn:
+            try:
+                # Take the write lock up front so nothing else spends the balance
+                conn.execute('BEGIN IMMEDIATE')
+                
+                user = conn.execute('SELECT balance FROM users WHERE id = ?', (user_id,)).fetchone()
+                if not user:
+                    conn.rollback()
+                    return {'success': False, 'message': 'User not found', 'results': []}
+                
+                project_ids = sorted({leg['project_id'] for leg in legs})
+                placeholders = ', '.join('?' * len(project_ids))
+                projects = {
+                    row['id']: row for row in conn.execute(
+                        f'SELECT id, category FROM projects WHERE id IN ({placeholders})',
+                        project_ids
+                    )
+                }
+                
+                results = []
+                for leg in legs:
+                    if leg['project_id'] not in projects:
+                        results.append({'project_id': leg['project_id'], 'amount': leg['amount'],
+                                        'success': False, 'message': 'Project not found'})
+                    else:
+                        results.append({'project_id': leg['project_id'], 'amount': leg['amount'],
+                                        'success': True, 'message': 'Investment successful'})
+                
+                total = sum(leg['amount'] for leg in legs)
+                failed = [r for r in results if not r['success']]
+                debited = 0
+                if not failed:
+                    # Same conditional debit as make_investment, for the whole basket
+                    debited = conn.execute('''
+                        UPDATE users SET balance = balance - ?
+                        WHERE id = ? AND balance >= ?
+                    ''', (total, user_id, total)).rowcount
+                
+                if not debited:
+                    conn.rollback()
+                    message = 'Insufficient balance' if not failed else 'One or more projects not found'
+                    for result in results:
+                        if result['success']:
+                            result['success'] = False
+                            result['message'] = f'Not applied: {message.lower()}'
+                    return {'success': False, 'message': message, 'results': results}
+                
+                # One funding update and one summary update per project/category
+                funding = {}
+                by_category = {}
+                for leg in legs:
+                    funding[leg['project_id']] = funding.get(leg['project_id'], 0) + leg['amount']
+                    category = projects[leg['project_id']]['category']
+                    invested, count = by_category.get(category, (0, 0))
+                    by_category[category] = (invested + leg['amount'], count + 1)
+                
+                conn.executemany('''
+                    UPDATE projects SET current_funding = current_funding + ? WHERE id = ?
+                ''', [(amount, project_id) for project_id, amount in funding.items()])
+                
+                for leg, result in zip(legs, results):
+                    cursor = conn.execute('''
+                        INSERT INTO investments (user_id, project_id, amount, current_value)
+                        VALUES (?, ?, ?, ?)
+                    ''', (user_id, leg['project_id'], leg['amount'], leg['amount']))
+                    result['investment_id'] = cursor.lastrowid
+                
+                for category, (invested, count) in by_category.items():
+                    self._add_to_portfolio_summary(conn, user_id, category, invested, invested, count)
+                
+                self._bump_revision(conn, 'catalogue')
+                self._bump_revision(conn, user_scope(user_id))
+                committed_funding = self._read_funding(conn, list(funding))
+                conn.commit()
+                
+                result = {
+                    'success': True,
+                    'message': f'{len(legs)} investments successful',
+                    'total_amount': total,
+                    'new_balance': user['balance'] - total,
+                    'results': results
+                }
+                
+            except Exception as e:
+                conn.rollback()
+                return {'success': False, 'message': str(e), 'results': []}
+        
+        self._invalidate_catalogue(committed_funding)
+        return result
+    
+    def _fetch(self, conn, sql, parameters=(), row_format='dict'):
+        """Run a query and return its rows in ``row_format`` (see ROW_FORMATS)"""
+        if row_format not in ROW_FORMATS:
+            raise ValueError(f"row_format must be one of: {', '.join(ROW_FORMATS)}")
+        cursor = conn.cursor()
+        if row_format != 'dict':
+            # Plain tuples skip building a sqlite3.Row per row
+            cursor.row_factory = None
+        rows = cursor.execute(sql, parameters).fetchall()
+        if row_format == 'dict':
+            return [dict(row) for row in rows]
+        columns = [column[0] for column in cursor.description]
+        if row_format == 'tuple':
+            return {'columns': columns, 'rows': rows}
+        values = list(zip(*rows)) or [()] * len(columns)
+        return {column: list(value) for column, value in zip(columns, values)}
+    
+    @timed
+    def get_portfolio(self, user_id=1, row_format='dict'):
+        """Get user's investment portfolio
+        
+        ``row_format`` picks the shape of ``investments``: a list of dicts,
+        column names plus tuples, one list per column, or 'positions' for a
+        compact ``Positions`` table (positions.py). With 'positions' the totals
+        and diversification are summed from the table itself rather than read
+        from portfolio_summary, saving a query, and the project columns come
+        from the catalogue read model when there is one.
+        """
+        with self.connection(readonly=True) as conn:
+            # Get user info
+            user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
             
-            # Create investment record
-            conn.execute('''
-                INSERT INTO investments (user_id, project_id, amount, current_value)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, project_id, amount, amount))
+            if row_format == 'positions':
+                positions = load_positions(conn, 'i.user_id = ?', (user_id,),
+                                           order='i.investment_date DESC',
+                                           catalogue=self._catalogue_snapshot())
+                return {
+                    'user': dict(user) if user else None,
+                    'investments': positions,
+                    'total_invested': positions.amount.sum().item(),
+                    'current_value': positions.current_value.sum().item(),
+                    'diversification': positions.totals_by('category')
+                }
             
-            conn.commit()
-            return {'success': True, 'message': 'Investment successful'}
+            # Get investments with project details
+            investments = self._fetch(conn, '''
+                SELECT i.*, p.name as project_name, p.risk_level, p.expected_roi, p.category
+                FROM investments i
+                JOIN projects p ON i.project_id = p.id
+                WHERE i.user_id = ?
+                ORDER BY i.investment_date DESC
+            ''', (user_id,), row_format)
             
-        except Exception as e:
-            conn.rollback()
-            return {'success': False, 'message': str(e)}
-        finally:
-            conn.close()
+            # Totals come from the maintained aggregates, read in the same snapshot
+            summary = self._read_portfolio_summary(conn, user_id)
+        
+        portfolio = {
+            'user': dict(user) if user else None,
+            'investments': investments,
+            'total_invested': sum(row['invested'] for row in summary),
+            'current_value': sum(row['current_value'] for row in summary),
+            'diversification': {row['category']: row['invested'] for row in summary}
+        }
+        
+        return portfolio
     
-    def get_portfolio(self, user_id=1):
-        """Get user's investment portfolio"""
-        conn = self.get_connection()
+    def export_investments(self, user_id, since=None, until=None, chunk_size=1000):
+        """Stream a user's investments, oldest first, in chunks of ``chunk_size`` tuples
         
-        # Get user info
-        user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        Returns ``(columns, chunks)``; ``chunks`` is a generator, so memory
+        stays flat however long the history is. ``since`` (inclusive) and
+        ``until`` (exclusive) are ISO dates or datetimes in UTC. Raises
+        ValueError for a malformed bound before anything is read.
+        """
+        clauses = ['i.user_id = ?']
+        parameters = [user_id]
+        for operator, bound in (('>=', since), ('<', until)):
+            if bound is not None:
+                clauses.append(f'i.investment_date {operator} ?')
+                parameters.append(self._parse_timestamp(bound))
         
-        # Get investments with project details
-        investments = conn.execute('''
-            SELECT i.*, p.name as project_name, p.risk_level, p.expected_roi, p.category
+        sql = f'''
+            SELECT i.id, i.project_id, p.name, p.category, p.risk_level, p.expected_roi,
+                   i.amount, i.current_value, i.investment_date
             FROM investments i
             JOIN projects p ON i.project_id = p.id
-            WHERE i.user_id = ?
-            ORDER BY i.investment_date DESC
+            WHERE {' AND '.join(clauses)}
+            ORDER BY i.investment_date, i.id
+        '''
+        return EXPORT_COLUMNS, self._stream_rows(sql, parameters, chunk_size)
+    
+    def _stream_rows(self, sql, parameters, chunk_size):
+        """Yield a query's rows as lists of tuples read with ``fetchmany``
+        
+        Uses its own read-only connection rather than a pooled one, so a
+        slow download doesn't hold a pool slot. The statement reads one
+        snapshot from start to finish; the connection is closed once the
+        generator is exhausted or closed (e.g. the client disconnects).
+        """
+        if self.read_pool is self.pool:
+            connection = self.connection(readonly=True)
+        else:
+            connection = closing(self.get_connection(readonly=True))
+        with connection as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, parameters)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    @staticmethod
+    def _parse_datetime(value):
+        """Parse an ISO date or datetime into a naive UTC datetime"""
+        try:
+            parsed = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid date '{value}': expected YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    
+    def _parse_timestamp(self, value):
+        """Convert an ISO date or datetime to the 'YYYY-MM-DD HH:MM:SS' UTC form SQLite stores"""
+        return self._parse_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _parse_unix_time(self, value):
+        """Convert an ISO date or datetime (UTC) to UNIX seconds"""
+        return int(self._parse_datetime(value).replace(tzinfo=timezone.utc).timestamp())
+    
+    @timed
+    def get_portfolio_history(self, user_id=1, since=None, until=None, resolution='auto', limit=None):
+        """Get a user's portfolio value over time from the snapshot time series
+        
+        ``since`` (inclusive) and ``until`` (exclusive) are ISO dates or
+        datetimes in UTC; ``resolution`` is 'raw', 'daily', 'monthly' or
+        'auto' (see snapshots.history_range). Raises ValueError for bad input.
+        """
+        start = 0 if since is None else self._parse_unix_time(since)
+        end = int(time.time()) + 1 if until is None else self._parse_unix_time(until)
+        with self.connection(readonly=True) as conn:
+            resolution, points = history_range(conn, user_id, start, end, resolution, limit)
+        return {'resolution': resolution, 'points': points}
+    
+    @timed
+    def get_portfolio_summary(self, user_id=1):
+        """Get a user's invested amount, value and position count per category"""
+        with self.connection(readonly=True) as conn:
+            return self._read_portfolio_summary(conn, user_id)
+    
+    def _read_portfolio_summary(self, conn, user_id):
+        """Read portfolio_summary rows for one user"""
+        rows = conn.execute('''
+            SELECT category, invested, current_value, investment_count
+            FROM portfolio_summary
+            WHERE user_id = ? AND investment_count > 0
+            ORDER BY category
         ''', (user_id,)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def _add_to_portfolio_summary(self, conn, user_id, category, invested, current_value, count):
+        """Apply a change to one portfolio_summary row inside the caller's transaction"""
+        conn.execute('''
+            INSERT INTO portfolio_summary (user_id, category, invested, current_value, investment_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, category) DO UPDATE SET
+                invested = invested + excluded.invested,
+                current_value = current_value + excluded.current_value,
+                investment_count = investment_count + excluded.investment_count
+        ''', (user_id, category, invested, current_value, count))
+    
+    @timed
+    def rebuild_portfolio_summary(self):
+        """Rebuild portfolio_summary from scratch out of the investments table"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM portfolio_summary')
+            conn.execute(PORTFOLIO_SUMMARY_REBUILD_SQL)
+            rows = conn.execute('SELECT COUNT(*) FROM portfolio_summary').fetchone()[0]
+            conn.commit()
+        return {'success': True, 'rows': rows}
+    
+    @timed
+    def check_portfolio_summary(self, tolerance=1e-6, repair=False):
+        """Compare portfolio_summary with fresh aggregates over investments
         
-        conn.close()
+        Returns the mismatching (user_id, category) rows. Small float drift from
+        incremental updates is ignored up to ``tolerance`` (relative). With
+        ``repair=True`` the table is rebuilt when anything is off.
+        """
+        with self.connection(readonly=True) as conn:
+            rows = conn.execute('''
+                WITH actual AS (
+                    SELECT i.user_id, p.category, SUM(i.amount) AS invested,
+                           SUM(i.current_value) AS current_value, COUNT(*) AS investment_count
+                    FROM investments i
+                    JOIN projects p ON i.project_id = p.id
+                    GROUP BY i.user_id, p.category
+                ),
+                keys AS (
+                    SELECT user_id, category FROM actual
+                    UNION
+                    SELECT user_id, category FROM portfolio_summary WHERE investment_count > 0
+                )
+                SELECT k.user_id, k.category,
+                       a.invested AS actual_invested, s.invested AS summary_invested,
+                       a.current_value AS actual_value, s.current_value AS summary_value,
+                       a.investment_count AS actual_count, s.investment_count AS summary_count
+                FROM keys k
+                LEFT JOIN actual a ON a.user_id = k.user_id AND a.category = k.category
+                LEFT JOIN portfolio_summary s ON s.user_id = k.user_id AND s.category = k.category
+            ''').fetchall()
         
-        portfolio = {
-            'user': dict(user) if user else None,
-            'investments': [dict(inv) for inv in investments],
-            'total_invested': sum(inv['amount'] for inv in investments),
-            'current_value': sum(inv['current_value'] for inv in investments)
-        }
+        def differs(a, b):
+            a, b = a or 0, b or 0
+            return abs(a - b) > tolerance * max(1.0, abs(a), abs(b))
         
-        return portfolio
+        mismatches = [
+            dict(row) for row in rows
+            if (row['actual_count'] or 0) != (row['summary_count'] or 0)
+            or differs(row['actual_invested'], row['summary_invested'])
+            or differs(row['actual_value'], row['summary_value'])
+        ]
+        
+        result = {'consistent': not mismatches, 'mismatches': mismatches}
+        if mismatches and repair:
+            result['rebuilt_rows'] = self.rebuild_portfolio_summary()['rows']
+        return result
     
+    @timed
+    def get_project_exposures(self, user_id=1):
+        """Get a user's current value per project with the project's ROI and volatility"""
+        with self.connection(readonly=True) as conn:
+            rows = conn.execute('''
+                SELECT i.project_id, SUM(i.current_value) as current_value,
+                       p.expected_roi, p.risk_level
+                FROM investments i
+                JOIN projects p ON i.project_id = p.id
+                WHERE i.user_id = ?
+                GROUP BY i.project_id
+            ''', (user_id,)).fetchall()
+        
+        exposures = []
+        for row in rows:
+            exposure = dict(row)
+            exposure['volatility'] = self._get_risk_multiplier(row['risk_level'])
+            exposures.append(exposure)
+        return exposures
+    
+    @timed
     def update_user_balance(self, user_id, new_balance):
         """Update user balance"""
         try:
-            conn = self.get_connection()
-            conn.execute('''
-                UPDATE users SET balance = ? WHERE id = ?
-            ''', (new_balance, user_id))
-            conn.commit()
-            conn.close()
-            return True
+            with self.connection() as conn:
+                conn.execute('''
+                    UPDATE users SET balance = ? WHERE id = ?
+                ''', (new_balance, user_id))
+                self._bump_revision(conn, user_scope(user_id))
+                conn.commit()
+                return True
         except Exception as e:
             return False
     
+    @timed
     def reset_user_completely(self, user_id, default_balance):
         """Reset user balance and clear all investments, also reset project funding"""
-        try:
-            conn = self.get_connection()
-            
-            # Get user's current investments to calculate funding to subtract from projects
-            user_investments = conn.execute('''
-                SELECT project_id, SUM(amount) as total_investment
-                FROM investments 
-                WHERE user_id = ?
-                GROUP BY project_id
-            ''', (user_id,)).fetchall()
-            
-            # Count investments being cleared
-            investment_count = conn.execute('''
-                SELECT COUNT(*) FROM investments WHERE user_id = ?
-            ''', (user_id,)).fetchone()[0]
-            
-            # Reset project funding by subtracting user's investments
-            projects_reset = 0
-            for investment in user_investments:
-                project_id = investment['project_id']
-                amount_to_subtract = investment['total_investment']
-                
-                # Get current project funding
-                current_funding = conn.execute('''
-                    SELECT current_funding FROM projects WHERE id = ?
-                ''', (project_id,)).fetchone()
-                
-                if current_funding:
-                    new_funding = max(0, current_funding['current_funding'] - amount_to_subtract)
-                    conn.execute('''
-                        UPDATE projects SET current_funding = ? WHERE id = ?
-                    ''', (new_funding, project_id))
-                    projects_reset += 1
-            
-            # Clear all user investments
-            conn.execute('''
-                DELETE FROM investments WHERE user_id = ?
-            ''', (user_id,))
-            
-            # Reset user balance
-            conn.execute('''
-                UPDATE users SET balance = ? WHERE id = ?
-            ''', (default_balance, user_id))
-            
-            conn.commit()
-            conn.close()
-            
-            return {
-                'success': True,
-                'investments_cleared': investment_count,
-                'projects_reset': projects_reset,
-                'message': f'Reset complete: {investment_count} investments cleared, {projects_reset} projects updated'
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'message': f'Error during complete reset: {str(e)}'
-            }
+        result = self.reset_users([user_id], default_balance)
+        if result['success']:
+            result['message'] = (f"Reset complete: {result['investments_cleared']} investments cleared, "
+                                 f"{result['projects_reset']} projects updated")
+        return result
     
-    def update_investment_values(self, user_id=1):
-        """Update investment values based on project performance and sync with user balance"""
-        import random
-        import math
-        from datetime import datetime, timedelta
+    @timed
+    def reset_users(self, user_ids, default_balance):
+        """Reset many users at once (e.g. a whole class at the end of a semester)
         
-        try:
-            conn = self.get_connection()
-            
-            # Get all user investments with project details
-            investments = conn.execute('''
-                SELECT i.id, i.user_id, i.project_id, i.amount, i.current_value, 
-                       i.investment_date, p.expected_roi, p.risk_level, p.name
-                FROM investments i
-                JOIN projects p ON i.project_id = p.id
-                WHERE i.user_id = ?
-            ''', (user_id,)).fetchall()
-            
-            if not investments:
-                return {'success': True, 'message': 'No investments to update', 'total_change': 0}
-            
-            total_balance_change = 0
-            updated_investments = 0
-            
-            for investment in investments:
-                # Calculate time since investment (simulate market performance over time)
-                investment_date = datetime.fromisoformat(investment['investment_date'])
-                days_invested = (datetime.now() - investment_date).days
-                
-                if days_invested < 1:
-                    continue  # Don't update same-day investments
-                
-                # Calculate performance based on expected ROI and risk level
-                expected_roi = investment['expected_roi'] / 100  # Convert percentage to decimal
-                risk_multiplier = self._get_risk_multiplier(investment['risk_level'])
+        Set-based: one UPDATE ... FROM an aggregate hands every affected
+        project its funding back, and one DELETE per table clears the users'
+        rows (investments, summaries and value history), all in a single
+        write transaction however many users and investments are involved.
+        """
+        with self.connection() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
                 
-                # Add some randomness based on risk level
-                random_factor = random.uniform(-risk_multiplier, risk_multiplier)
-                daily_performance = (expected_roi / 365) + (random_factor / 365)
+                conn.execute('CREATE TEMP TABLE IF NOT EXISTS reset_user_ids (id INTEGER PRIMARY KEY)')
+                conn.execute('DELETE FROM temp.reset_user_ids')
+                conn.executemany('''
+                    INSERT OR IGNORE INTO temp.reset_user_ids (id) VALUES (?)
+                ''', ((user_id,) for user_id in user_ids))
                 
-                # Calculate new value with compound growth
-                original_amount = investment['amount']
-                new_value = original_amount * (1 + daily_performance) ** days_invested
+                # Subtract the users' investments from project funding, never below zero
+                projects_reset = conn.execute('''
+                    UPDATE projects SET current_funding = MAX(0, current_funding - r.total)
+                    FROM (
+                        SELECT project_id, SUM(amount) AS total
+                        FROM investments
+                        WHERE user_id IN (SELECT id FROM temp.reset_user_ids)
+                        GROUP BY project_id
+                    ) r
+                    WHERE projects.id = r.project_id
+                ''').rowcount
                 
-                # Ensure minimum value (can't lose more than 90% for safety)
-                new_value = max(new_value, original_amount * 0.1)
-                
-                # Calculate the change in value
-                old_value = investment['current_value']
-                value_change = new_value - old_value
-                
-                # Update investment value
+                # rowcount is sqlite3_changes(), so the DELETE counts for itself
+                investments_cleared = conn.execute('''
+                    DELETE FROM investments WHERE user_id IN (SELECT id FROM temp.reset_user_ids)
+                ''').rowcount
                 conn.execute('''
-                    UPDATE investments SET current_value = ? WHERE id = ?
-                ''', (new_value, investment['id']))
-                
-                total_balance_change += value_change
-                updated_investments += 1
-            
-            # Update user balance with the total change
-            if total_balance_change != 0:
-                current_balance = conn.execute('''
-                    SELECT balance FROM users WHERE id = ?
-                ''', (user_id,)).fetchone()['balance']
+                    DELETE FROM portfolio_summary WHERE user_id IN (SELECT id FROM temp.reset_user_ids)
+                ''')
+                delete_history(conn, 'SELECT id FROM temp.reset_user_ids')
                 
-                new_balance = current_balance + total_balance_change
+                users_reset = conn.execute('''
+                    UPDATE users SET balance = ? WHERE id IN (SELECT id FROM temp.reset_user_ids)
+                ''', (default_balance,)).rowcount
                 conn.execute('''
-                    UPDATE users SET balance = ? WHERE id = ?
-                ''', (new_balance, user_id))
+                    INSERT INTO revisions (scope, revision)
+                    SELECT ? || id, 1 FROM users WHERE id IN (SELECT id FROM temp.reset_user_ids)
+                    ON CONFLICT(scope) DO UPDATE SET revision = revision + 1
+                ''', (USER_SCOPE_PREFIX,))
+                
+                if projects_reset:
+                    self._bump_revision(conn, 'catalogue')
+                conn.commit()
             
-            conn.commit()
-            conn.close()
+            except Exception as e:
+                conn.rollback()
+                return {
+                    'success': False,
+                    'message': f'Error during complete reset: {str(e)}'
+                }
+        
+        # After the commit, outside the try: a failed refresh must not turn
+        # a committed reset into an error
+        if projects_reset:
+            self._invalidate_catalogue()
+        return {
+            'success': True,
+            'users_reset': users_reset,
+            'investments_cleared': investments_cleared,
+            'projects_reset': projects_reset,
+            'message': (f'Reset complete: {users_reset} users reset, {investments_cleared} '
+                        f'investments cleared, {projects_reset} projects updated')
+        }
+    
+    @timed
+    def update_investment_values(self, user_id=1):
+        """Update investment values based on project performance and sync with user balance"""
+        try:
+            with self.connection() as conn:
+                try:
+                    result = revalue_user(conn, user_id, self._get_risk_multiplier, self.streams)
+                    conn.commit()
+                    return result
+                except Exception:
+                    conn.rollback()
+                    raise
             
+        except Exception as e:
             return {
-                'success': True,
-                'message': f'Updated {updated_investments} investments',
-                'total_change': total_balance_change,
-                'investments_updated': updated_investments
+                'success': False,
+                'message': f'Error updating investments: {str(e)}'
             }
+    
+    @timed
+    def revalue_all_users(self, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Revalue every user's investments in chunked, set-based batches"""
+        try:
+            with self.connection() as conn:
+                try:
+                    return revalue_all(conn, self._get_risk_multiplier, chunk_size=chunk_size,
+                                       streams=self.streams, progress=progress)
+                except Exception:
+                    # Chunks already committed stay revalued
+                    conn.rollback()
+                    raise
             
         except Exception as e:
             return {
                 'success': False,
-                'message': f'Error updating investments: {str(e)}'
+                'message': f'Error revaluing investments: {str(e)}'
             }
     
     def _get_risk_multiplier(self, risk_level):
@@ -482,43 +1374,104 @@ class Database:
         }
         return risk_multipliers.get(risk_level, 0.05)
     
+    @timed
     def get_investment_performance_summary(self, user_id=1):
-        """Get summary of investment performance"""
+        """Get portfolio-wide, per-holding, per-risk and per-category performance
+        
+        One aggregated query over investments joined to projects: holdings are
+        grouped per project, ranked with window functions for the best and
+        worst performer, then grouped by category and risk level. Results are
+        cached per user and keyed on the user's revision, so any investment,
+        revaluation or reset is picked up straight away; the TTL only bounds
+        how long an idle user's entry is kept. The returned dict is shared
+        with the cache, so don't modify it.
+        """
+        key = (user_id, self.get_user_revision(user_id))
+        summary = self.performance_cache.get(key)
+        if summary is not MISSING:
+            return summary
+        
         try:
-            conn = self.get_connection()
-            
-            investments = conn.execute('''
-                SELECT SUM(amount) as total_invested, SUM(current_value) as total_value
-                FROM investments WHERE user_id = ?
-            ''', (user_id,)).fetchone()
-            
-            conn.close()
-            
-            if not investments or not investments['total_invested']:
-                return {
-                    'total_invested': 0,
-                    'total_value': 0,
-                    'total_gain_loss': 0,
-                    'performance_percentage': 0
-                }
-            
-            total_invested = investments['total_invested']
-            total_value = investments['total_value']
-            total_gain_loss = total_value - total_invested
-            performance_percentage = (total_gain_loss / total_invested) * 100 if total_invested > 0 else 0
-            
-            return {
-                'total_invested': total_invested,
-                'total_value': total_value,
-                'total_gain_loss': total_gain_loss,
-                'performance_percentage': performance_percentage
-            }
+            with self.connection(readonly=True) as conn:
+                groups = conn.execute('''
+                    WITH holdings AS (
+                        SELECT p.name AS project_name, p.category, p.risk_level,
+                               SUM(i.amount) AS invested, SUM(i.current_value) AS current_value
+                        FROM investments i
+                        JOIN projects p ON p.id = i.project_id
+                        WHERE i.user_id = ?
+                        GROUP BY i.project_id
+                    ),
+                    returns AS (
+                        SELECT *, CASE WHEN invested > 0
+                                       THEN (current_value - invested) * 100.0 / invested
+                                       ELSE 0 END AS return_percentage
+                        FROM holdings
+                    ),
+                    ranked AS (
+                        SELECT *,
+                               ROW_NUMBER() OVER (ORDER BY return_percentage DESC, project_name) AS best_rank,
+                               ROW_NUMBER() OVER (ORDER BY return_percentage ASC, project_name) AS worst_rank
+                        FROM returns
+                    )
+                    SELECT category, risk_level,
+                           SUM(invested) AS invested, SUM(current_value) AS current_value,
+                           MAX(CASE WHEN best_rank = 1 THEN project_name END) AS best_name,
+                           MAX(CASE WHEN best_rank = 1 THEN return_percentage END) AS best_return,
+                           MAX(CASE WHEN worst_rank = 1 THEN project_name END) AS worst_name,
+                           MAX(CASE WHEN worst_rank = 1 THEN return_percentage END) AS worst_return
+                    FROM ranked
+                    GROUP BY category, risk_level
+                ''', (user_id,)).fetchall()
             
         except Exception as e:
-            return {
-                'total_invested': 0,
-                'total_value': 0,
-                'total_gain_loss': 0,
-                'performance_percentage': 0
-            }
+            return self._performance_summary([])
+        
+        summary = self._performance_summary(groups)
+        self.performance_cache.set(key, summary)
+        return summary
+    
+    @staticmethod
+    def _performance_summary(groups):
+        """Fold the per-(category, risk level) rows into the response shape"""
+        risk_distribution = {'Low': 0.0, 'Medium': 0.0, 'High': 0.0}
+        categories = {}
+        best = worst = None
+        
+        for group in groups:
+            risk_distribution[group['risk_level']] = risk_distribution.get(group['risk_level'], 0.0) + group['invested']
+            totals = categories.setdefault(group['category'], [0.0, 0.0])
+            totals[0] += group['invested']
+            totals[1] += group['current_value']
+            if group['best_name'] is not None:
+                best = {'project_name': group['best_name'], 'return_percentage': group['best_return']}
+            if group['worst_name'] is not None:
+                worst = {'project_name': group['worst_name'], 'return_percentage': group['worst_return']}
+        
+        total_invested = sum(invested for invested, _ in categories.values())
+        total_value = sum(value for _, value in categories.values())
+        total_return = total_value - total_invested
+        total_return_percentage = (total_return / total_invested) * 100 if total_invested > 0 else 0
+        
+        return {
+            'total_invested': total_invested,
+            'current_value': total_value,
+            'total_return': total_return,
+            'total_return_percentage': total_return_percentage,
+            'best_performing_investment': best,
+            'worst_performing_investment': worst,
+            'risk_distribution': risk_distribution,
+            'category_performance': {
+                category: {
+                    'invested': invested,
+                    'current_value': value,
+                    'return_percentage': ((value - invested) / invested) * 100 if invested > 0 else 0
+                }
+                for category, (invested, value) in sorted(categories.items())
+            },
+            # Names used before the full analytics, kept for existing clients
+            'total_value': total_value,
+            'total_gain_loss': total_return,
+            'performance_percentage': total_return_percentage
+        }
         
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Compact, column-oriented investment positions for in-memory analytics
+
+``load_positions`` reads investments joined to their projects with one query
+into a ``Positions`` table: one typed ``array`` per column, exposed as NumPy
+arrays without copying (struct of arrays). Numbers are stored as 8-byte ints
+and floats, the investment date as a UNIX time, and the repetitive text
+columns (risk level, category, project name) as integer codes into a lookup
+tuple. The columns take 68 bytes per position, against some 600 for a dict
+built from a ``sqlite3.Row``.
+
+The text columns depend only on the project, so the main query reads numbers
+alone and a second, small one reads the labels of the distinct projects held;
+no string is created per position. Rows are fetched in chunks, so the tuples
+SQLite hands back never pile up. ``Position`` gives a ``__slots__`` view of
+one row when code wants records.
+
+Usage:
+    positions = load_positions(conn, 'i.user_id = ?', (user_id,))
+    positions.amount.sum()
+    positions.totals_by('category')     # {'Food & Beverage': 1200.0, ...}
+    for position in positions:
+        position.project_name, position.current_value
+"""
+
+import json
+from array import array
+
+import numpy as np
+
+# Rows read per fetchmany() while loading
+FETCH_CHUNK_SIZE = 4096
+
+# Numeric columns: name -> array typecode
+NUMERIC_COLUMNS = {
+    'id': 'q',
+    'user_id': 'q',
+    'project_id': 'q',
+    'amount': 'd',
+    'current_value': 'd',
+    'investment_time': 'q',
+    'expected_roi': 'd',
+}
+
+# Text columns stored as codes: label name -> (code column, lookup attribute)
+CODED_COLUMNS = {
+    'risk_level': ('risk_code', 'risk_levels'),
+    'category': ('category_code', 'categories'),
+    'project_name': ('project_code', 'project_names'),
+}
+
+# Columns in the order of ``SELECT i.*`` plus the joined project columns,
+# as Positions.columns() returns them
+RECORD_COLUMNS = ('id', 'user_id', 'project_id', 'amount', 'current_value', 'investment_date',
+                  'project_name', 'risk_level', 'expected_roi', 'category')
+
+# investment_time is the stored UTC date/time as if it were a naive local
+# one, which is how the rest of the backend compares it against now
+POSITIONS_SQL = '''
+    SELECT i.id, i.user_id, i.project_id, i.amount, i.current_value,
+           CAST(strftime('%s', i.investment_date) AS INTEGER), p.expected_roi
+    FROM investments i
+    JOIN projects p ON i.project_id = p.id
+    WHERE {where}
+    ORDER BY {order}
+'''
+
+# POSITIONS_SQL without the join, for when a catalogue read model supplies
+# the project columns
+INVESTMENTS_SQL = '''
+    SELECT i.id, i.user_id, i.project_id, i.amount, i.current_value,
+           CAST(strftime('%s', i.investment_date) AS INTEGER)
+    FROM investments i
+    WHERE {where}
+    ORDER BY {order}
+'''
+
+# Text columns of the projects in a JSON array of ids, in CODED_COLUMNS order
+PROJECT_LABELS_SQL = '''
+    SELECT id, risk_level, category, name
+    FROM projects
+    WHERE id IN (SELECT value FROM json_each(?))
+'''
+
+class Position:
+    """Read-only view of one row of a ``Positions`` table
+
+    Holds only the table and the row index; attributes are read from the
+    columns on access (``position.amount``, ``position.category``, ...).
+    """
+
+    __slots__ = ('positions', 'index')
+
+    def __init__(self, positions, index):
+        self.positions = positions
+        self.index = index
+
+    def __getattr__(self, name):
+        return self.positions.value(name, self.index)
+
+    def as_dict(self):
+        """The row as a dict with RECORD_COLUMNS keys"""
+        return {name: self.positions.value(name, self.index) for name in RECORD_COLUMNS}
+
+    def __repr__(self):
+        return f'Position({self.as_dict()!r})'
+
+class Positions:
+    """Investment positions stored column by column
+
+    Numeric columns are NumPy arrays (see NUMERIC_COLUMNS); text columns are
+    ``*_code`` arrays indexing the ``risk_levels``, ``categories`` and
+    ``project_names`` tuples. Every array has one entry per position, in the
+    order the positions were loaded.
+    """
+
+    __slots__ = tuple(NUMERIC_COLUMNS) + tuple(
+        attribute for pair in CODED_COLUMNS.values() for attribute in pair
+    )
+
+    def __init__(self, columns, lookups):
+        for name, values in columns.items():
+            setattr(self, name, values)
+        for attribute, labels in lookups.items():
+            setattr(self, attribute, labels)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('position index out of range')
+        return Position(self, index)
+
+    def __iter__(self):
+        return (Position(self, index) for index in range(len(self)))
+
+    def _columns(self):
+        columns = {name: getattr(self, name) for name in NUMERIC_COLUMNS}
+        columns.update((code, getattr(self, code)) for code, _ in CODED_COLUMNS.values())
+        return columns
+
+    def _lookups(self):
+        return {attribute: getattr(self, attribute) for _, attribute in CODED_COLUMNS.values()}
+
+    def select(self, selector):
+        """A new table with the positions picked by a boolean mask or index array"""
+        return Positions({name: values[selector] for name, values in self._columns().items()},
+                         self._lookups())
+
+    def value(self, name, index):
+        """One field of one position as a plain Python value"""
+        if name in CODED_COLUMNS:
+            code, attribute = CODED_COLUMNS[name]
+            return getattr(self, attribute)[getattr(self, code)[index]]
+        if name == 'investment_date':
+            return _format_dates(self.investment_time[index:index + 1])[0]
+        if name in NUMERIC_COLUMNS:
+            return getattr(self, name)[index].item()
+        raise AttributeError(f"Position has no field '{name}'")
+
+    def labels(self, name):
+        """A coded column decoded to a list of strings"""
+        code, attribute = CODED_COLUMNS[name]
+        lookup = getattr(self, attribute)
+        return [lookup[code] for code in getattr(self, code).tolist()]
+
+    def map_labels(self, name, mapping, default=None):
+        """Map each position's label through ``mapping`` (a dict or a callable)
+
+        The mapping runs once per distinct label, not once per position.
+        """
+        code, attribute = CODED_COLUMNS[name]
+        lookup = getattr(self, attribute)
+        if callable(mapping):
+            mapped = [mapping(label) for label in lookup]
+        else:
+            mapped = [mapping.get(label, default) for label in lookup]
+        return np.array(mapped, dtype=np.float64)[getattr(self, code)]
+
+    def totals_by(self, name, column='amount'):
+        """Sum of a numeric column per label of a coded column, e.g. invested per category"""
+        code, attribute = CODED_COLUMNS[name]
+        codes = getattr(self, code)
+        lookup = getattr(self, attribute)
+        counts = np.bincount(codes, minlength=len(lookup))
+        totals = np.bincount(codes, weights=getattr(self, column), minlength=len(lookup))
+        return {lookup[i]: totals[i].item() for i in np.flatnonzero(counts).tolist()}
+
+    def investment_dates(self):
+        """Investment dates as 'YYYY-MM-DD HH:MM:SS' strings, as SQLite stores them"""
+        return _format_dates(self.investment_time)
+
+    def columns(self):
+        """Every RECORD_COLUMNS column as a plain list, for JSON responses"""
+        return {
+            name: (self.labels(name) if name in CODED_COLUMNS
+                   else self.investment_dates() if name == 'investment_date'
+                   else getattr(self, name).tolist())
+            for name in RECORD_COLUMNS
+        }
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays (lookup tuples not included)"""
+        return sum(values.nbytes for values in self._columns().values())
+
+def load_positions(conn, where, parameters=(), order='i.id', chunk_size=FETCH_CHUNK_SIZE,
+                   catalogue=None):
+    """Load the positions matching a WHERE clause over ``investments i`` / ``projects p``
+
+    ``where`` and ``order`` are SQL fragments from the caller, never user input.
+    With a catalogue read model snapshot (catalogue.py), the project columns
+    come from it and SQLite only reads ``investments``, so ``where`` and
+    ``order`` may only refer to ``i``. Returns an empty table when nothing
+    matches.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    sql = POSITIONS_SQL if catalogue is None else INVESTMENTS_SQL
+    cursor.execute(sql.format(where=where, order=order), parameters)
+
+    numeric = {name: array(typecode) for name, typecode in NUMERIC_COLUMNS.items()}
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for name, column in zip(NUMERIC_COLUMNS, zip(*rows)):
+            numeric[name].extend(column)
+    columns = {name: _as_numpy(values) for name, values in numeric.items()}
+
+    if catalogue is not None:
+        # Join on the read model, dropping positions in unknown projects
+        # as the JOIN would
+        index = catalogue.indices(columns['project_id'])
+        held = index >= 0
+        if not held.all():
+            columns = {name: values[held] for name, values in columns.items()}
+            index = index[held]
+        columns['expected_roi'] = catalogue.records['expected_roi'][index]
+
+    # Text columns depend only on the project: code the projects, then look
+    # up each distinct project's labels once
+    project_ids, project_codes = np.unique(columns['project_id'], return_inverse=True)
+    if catalogue is None:
+        labels = {row[0]: row[1:] for row in cursor.execute(
+            PROJECT_LABELS_SQL, (json.dumps(project_ids.tolist()),)
+        )}
+    else:
+        labels = {
+            project_id: catalogue.labels(index)
+            for project_id, index in zip(project_ids.tolist(), catalogue.indices(project_ids).tolist())
+        }
+    lookups = {}
+    for position, (name, (code, attribute)) in enumerate(CODED_COLUMNS.items()):
+        encoder = {}
+        per_project = [encoder.setdefault(labels[project_id][position], len(encoder))
+                       for project_id in project_ids.tolist()]
+        columns[code] = np.array(per_project, dtype=np.uint32)[project_codes]
+        lookups[attribute] = tuple(encoder)
+    return Positions(columns, lookups)
+
+def _format_dates(times):
+    """UNIX times to 'YYYY-MM-DD HH:MM:SS' strings"""
+    dates = np.datetime_as_string(times.astype('datetime64[s]'))
+    return [date.replace('T', ' ') for date in dates.tolist()]
+
+def _as_numpy(values):
+    """View a typed array as a NumPy array, sharing its memory instead of copying it"""
+    if not values:
+        return np.empty(0, dtype=values.typecode)
+    return np.frombuffer(values, dtype=values.typecode)
@@ -0,0 +1,147 @@
+"""
+Opt-in per-request profiling
+
+When enabled (``PROFILING=1``), ``install`` wraps every Flask view so that a
+request carrying an ``X-Profile`` header or a ``profile`` query parameter is
+run under a profiler. The result is kept in an in-memory ring buffer of the
+last N profiles and can be downloaded from ``/admin/profiles``. When
+profiling is disabled nothing is wrapped, so requests pay nothing for it.
+
+Engines:
+    pyinstrument - statistical profiler (optional dependency); saved as
+                   speedscope JSON, which https://www.speedscope.app shows
+                   as a flamegraph
+    cprofile     - the standard library's deterministic profiler; saved as a
+                   pstats file for snakeviz, ``flameprof`` or ``python -m pstats``
+
+Only one request is profiled at a time; a second profiling request that
+arrives meanwhile runs normally and is answered with ``X-Profile: busy``.
+"""
+
+import cProfile
+import functools
+import marshal
+import pstats
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import make_response, request
+
+try:
+    from pyinstrument import Profiler as InstrumentProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # optional dependency
+    InstrumentProfiler = None
+
+ENGINES = ('pyinstrument', 'cprofile') if InstrumentProfiler is not None else ('cprofile',)
+DEFAULT_ENGINE = ENGINES[0]
+
+# Sampling interval for pyinstrument, in seconds
+SAMPLE_INTERVAL = 0.0005
+
+class ProfileStore:
+    """Thread-safe ring buffer holding the most recent request profiles"""
+
+    def __init__(self, size=20):
+        self._profiles = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def add(self, info, data):
+        """Store a profile and return its id"""
+        with self._lock:
+            profile_id = self._next_id
+            self._next_id += 1
+            self._profiles.append((dict(info, id=profile_id), data))
+        return profile_id
+
+    def list(self):
+        """Metadata of the stored profiles, newest first"""
+        with self._lock:
+            return [dict(info) for info, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        """Return ``(info, data)`` for a stored profile, or None once it has rotated out"""
+        with self._lock:
+            for info, data in self._profiles:
+                if info['id'] == profile_id:
+                    return dict(info), data
+        return None
+
+def run_profiled(engine, view, *args, **kwargs):
+    """Call ``view`` under ``engine`` and return ``(result, data, filename_suffix)``"""
+    if engine == 'pyinstrument':
+        profiler = InstrumentProfiler(interval=SAMPLE_INTERVAL, async_mode='disabled')
+        profiler.start()
+        try:
+            result = view(*args, **kwargs)
+        finally:
+            profiler.stop()
+        return result, profiler.output(SpeedscopeRenderer()).encode('utf-8'), '.speedscope.json'
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = view(*args, **kwargs)
+    finally:
+        profiler.disable()
+    return result, marshal.dumps(pstats.Stats(profiler).stats), '.prof'
+
+def requested_engine(token=None):
+    """Engine asked for by the current request, or None when it should not be profiled"""
+    value = request.headers.get('X-Profile') or request.args.get('profile')
+    if not value or value.lower() in ('0', 'false', 'no'):
+        return None
+    if token and request.headers.get('X-Profile-Token') != token:
+        return None
+    value = value.lower()
+    return value if value in ENGINES else DEFAULT_ENGINE
+
+def install(app, store, token=None, exclude=()):
+    """Wrap every registered view of ``app`` so it can be profiled on request
+
+    Call it after all routes are defined. Endpoints named in ``exclude``
+    (such as the profile download routes) are left alone.
+    """
+    busy = threading.Lock()
+
+    def profiled(view, endpoint):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            engine = requested_engine(token)
+            if engine is None:
+                return view(*args, **kwargs)
+            if not busy.acquire(blocking=False):
+                response = make_response(view(*args, **kwargs))
+                response.headers['X-Profile'] = 'busy'
+                return response
+
+            try:
+                started = time.perf_counter()
+                result, data, suffix = run_profiled(engine, view, *args, **kwargs)
+                duration = time.perf_counter() - started
+            finally:
+                busy.release()
+
+            response = make_response(result)
+            created_at = datetime.now()
+            profile_id = store.add({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'status': response.status_code,
+                'engine': engine,
+                'duration_ms': round(duration * 1000, 3),
+                'size_bytes': len(data),
+                'created_at': created_at.isoformat(timespec='seconds'),
+                'filename': f"{endpoint}-{created_at.strftime('%Y%m%d-%H%M%S')}{suffix}"
+            }, data)
+            response.headers['X-Profile-Id'] = str(profile_id)
+            return response
+        return wrapper
+
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint not in exclude and endpoint != 'static':
+            app.view_functions[endpoint] = profiled(view, endpoint)
@@ -0,0 +1,300 @@
+"""
+Vectorized revaluation engine for investment positions
+
+Loads a user's positions into a column-oriented ``Positions`` table (see
+``positions.py``), computes every new value in one pass and writes them back
+with a single ``executemany``. The maths mirrors the
+original per-row loop in ``Database.update_investment_values`` exactly:
+
+    daily_performance = expected_roi / 365 + uniform(-vol, vol) / 365
+    new_value = max(amount * (1 + daily_performance) ** days, amount * 0.1)
+
+Random draws come from ``RandomStreams`` (see ``rng.py``): one 'revaluation'
+stream per user and day, one draw per position in id order. ``revalue_user``
+and ``revalue_all`` therefore give a user the same values on the same day, and
+revaluing twice in one day changes nothing the second time.
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+
+from migrations import USER_SCOPE_PREFIX, user_scope
+from positions import load_positions
+from rng import RandomStreams
+from snapshots import record_snapshots
+
+# Positions younger than this many days are left untouched
+MIN_DAYS_INVESTED = 1
+
+# Floor on a position's value as a fraction of the amount invested
+MIN_VALUE_FRACTION = 0.1
+
+# Users revalued per transaction by revalue_all
+DEFAULT_CHUNK_SIZE = 500
+
+def load_user_positions(conn, user_id):
+    """Load a user's positions in investment id order"""
+    return load_positions(conn, 'i.user_id = ?', (user_id,))
+
+def load_positions_for_users(conn, first_user_id, last_user_id):
+    """Load the positions of every user with an id in [first, last]
+
+    Rows come back ordered by user then investment id, the same order
+    ``load_user_positions`` gives each user's rows in.
+    """
+    return load_positions(conn, 'i.user_id BETWEEN ? AND ?', (first_user_id, last_user_id),
+                          order='i.user_id, i.id')
+
+def days_invested(investment_times, now=None):
+    """Whole days elapsed since each investment time (floored like timedelta.days)
+
+    Investment times are whole seconds, so dropping the microseconds of
+    ``now`` never changes the result.
+    """
+    now = np.datetime64(now or datetime.now(), 's').astype(np.int64)
+    return (now - investment_times) // 86400
+
+def compute_new_values(positions, volatility, days, uniforms):
+    """Compute new values for the positions selected by the caller
+
+    ``volatility``, ``days`` and ``uniforms`` (draws in [0, 1)) must line up
+    with the arrays in ``positions``.
+    """
+    expected_roi = positions.expected_roi / 100
+
+    # Same operation order as random.uniform(-vol, vol)
+    random_factor = -volatility + (volatility + volatility) * uniforms
+    daily_performance = (expected_roi / 365) + (random_factor / 365)
+
+    # NumPy's SIMD power kernels can differ from the C library's pow() in the
+    # last bit, so growth factors go through the builtin pow to keep results
+    # identical whichever kernel a given NumPy build picks
+    growth = np.fromiter(
+        map(pow, (1 + daily_performance).tolist(), days.tolist()),
+        dtype=np.float64, count=len(days)
+    )
+
+    amount = positions.amount
+    new_values = amount * growth
+    return np.maximum(new_values, amount * MIN_VALUE_FRACTION)
+
+def draw_uniforms(streams, user_ids, now=None):
+    """One uniform draw per position from each user's revaluation stream
+
+    ``user_ids`` must be grouped by user (as the loaders return them); each
+    user's positions get the first draws of that user's stream, in order.
+    """
+    uniforms = np.empty(len(user_ids))
+    users, starts, counts = np.unique(user_ids, return_index=True, return_counts=True)
+    for user_id, start, count in zip(users.tolist(), starts.tolist(), counts.tolist()):
+        uniforms[start:start + count] = streams.generator('revaluation', user_id, now=now).random(count)
+    return uniforms
+
+def _timestamp(now=None):
+    """UNIX time in whole seconds of a naive local datetime (default: now)"""
+    return int((now or datetime.now()).timestamp())
+
+def revalue_user(conn, user_id, risk_multiplier, streams=None, now=None):
+    """Revalue all of a user's positions and sync the change into their balance
+
+    Opens the transaction with BEGIN IMMEDIATE before reading the positions,
+    so concurrent revaluations of the same user run one after the other and
+    each applies the change from the values the previous one wrote; the
+    caller commits (or rolls back). The user's portfolio value is then
+    recorded in the snapshot time series.
+    """
+    streams = streams or RandomStreams()
+    conn.execute('BEGIN IMMEDIATE')
+    positions = load_user_positions(conn, user_id)
+    if not len(positions):
+        return {'success': True, 'message': 'No investments to update', 'total_change': 0}
+
+    days = days_invested(positions.investment_time, now)
+    eligible = days >= MIN_DAYS_INVESTED
+    updated_investments = int(eligible.sum())
+
+    if not updated_investments:
+        record_snapshots(conn, user_id, user_id, _timestamp(now))
+        return {
+            'success': True,
+            'message': 'Updated 0 investments',
+            'total_change': 0,
+            'investments_updated': 0
+        }
+
+    selected = positions.select(eligible)
+    volatility = selected.map_labels('risk_level', risk_multiplier)
+    uniforms = draw_uniforms(streams, positions.user_id, now)[eligible]
+    new_values = compute_new_values(selected, volatility, days[eligible], uniforms)
+
+    conn.executemany('''
+        UPDATE investments SET current_value = ? WHERE id = ?
+    ''', zip(new_values.tolist(), selected.id.tolist()))
+
+    deltas = new_values - selected.current_value
+
+    # Keep the per-category aggregates in step with the new values
+    codes = selected.category_code
+    conn.executemany('''
+        UPDATE portfolio_summary SET current_value = current_value + ?
+        WHERE user_id = ? AND category = ?
+    ''', [
+        (float(deltas[codes == code].sum()), user_id, selected.categories[code])
+        for code in set(codes.tolist())
+    ])
+
+    # Summed left to right so the total matches the per-row loop bit for bit
+    total_balance_change = sum(deltas.tolist())
+
+    if total_balance_change != 0:
+        conn.execute('''
+            UPDATE users SET balance = balance + ? WHERE id = ?
+        ''', (total_balance_change, user_id))
+
+    # New version of the user's portfolio, unless nothing moved (a repeat
+    # revaluation on the same day)
+    if deltas.any():
+        conn.execute('''
+            INSERT INTO revisions (scope, revision) VALUES (?, 1)
+            ON CONFLICT(scope) DO UPDATE SET revision = revision + 1
+        ''', (user_scope(user_id),))
+
+    record_snapshots(conn, user_id, user_id, _timestamp(now))
+
+    return {
+        'success': True,
+        'message': f'Updated {updated_investments} investments',
+        'total_change': total_balance_change,
+        'investments_updated': updated_investments
+    }
+
+def revalue_all(conn, risk_multiplier, chunk_size=DEFAULT_CHUNK_SIZE, streams=None,
+                now=None, progress=None):
+    """Revalue every user's positions in chunks of ``chunk_size`` users
+
+    Each chunk is computed in one vectorized pass and applied with set-based
+    SQL (a temp table joined into ``UPDATE ... FROM``) in its own transaction,
+    so the write lock is only held for one chunk at a time, together with
+    the chunk's portfolio snapshots. The lock is taken before the chunk's
+    positions are read, so a concurrent ``revalue_user`` is never applied on
+    top of stale values. ``progress`` is called after every
+    chunk with running totals.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    streams = streams or RandomStreams()
+    totals = {
+        'users_processed': 0,
+        'investments_updated': 0,
+        'total_change': 0.0,
+        'chunks': 0
+    }
+
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS revalued (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            new_value REAL NOT NULL,
+            delta REAL NOT NULL
+        )
+    ''')
+
+    last_user_id = 0
+    while True:
+        user_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_user_id, chunk_size))]
+        if not user_ids:
+            break
+
+        conn.execute('BEGIN IMMEDIATE')
+        changed = _revalue_chunk(conn, user_ids[0], user_ids[-1], risk_multiplier, streams, now)
+        record_snapshots(conn, user_ids[0], user_ids[-1], _timestamp(now))
+        conn.commit()
+
+        last_user_id = user_ids[-1]
+        totals['users_processed'] += len(user_ids)
+        totals['investments_updated'] += changed['investments_updated']
+        totals['total_change'] += changed['total_change']
+        totals['chunks'] += 1
+
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress(dict(
+                totals,
+                last_user_id=last_user_id,
+                elapsed_seconds=elapsed,
+                investments_per_second=totals['investments_updated'] / elapsed if elapsed else 0
+            ))
+
+    conn.execute('DROP TABLE IF EXISTS temp.revalued')
+
+    elapsed = time.perf_counter() - started
+    totals['elapsed_seconds'] = elapsed
+    totals['investments_per_second'] = totals['investments_updated'] / elapsed if elapsed else 0
+    totals['success'] = True
+    totals['message'] = (
+        f"Updated {totals['investments_updated']} investments "
+        f"for {totals['users_processed']} users"
+    )
+    return totals
+
+def _revalue_chunk(conn, first_user_id, last_user_id, risk_multiplier, streams, now):
+    """Revalue one chunk of users and apply it with set-based UPDATEs"""
+    positions = load_positions_for_users(conn, first_user_id, last_user_id)
+    if not len(positions):
+        return {'investments_updated': 0, 'total_change': 0.0}
+
+    days = days_invested(positions.investment_time, now)
+    eligible = days >= MIN_DAYS_INVESTED
+    count = int(eligible.sum())
+    if not count:
+        return {'investments_updated': 0, 'total_change': 0.0}
+
+    selected = positions.select(eligible)
+    volatility = selected.map_labels('risk_level', risk_multiplier)
+    uniforms = draw_uniforms(streams, positions.user_id, now)[eligible]
+    new_values = compute_new_values(selected, volatility, days[eligible], uniforms)
+    deltas = new_values - selected.current_value
+
+    conn.execute('DELETE FROM temp.revalued')
+    conn.executemany('''
+        INSERT INTO temp.revalued (id, user_id, category, new_value, delta) VALUES (?, ?, ?, ?, ?)
+    ''', zip(selected.id.tolist(), selected.user_id.tolist(),
+            selected.labels('category'), new_values.tolist(), deltas.tolist()))
+
+    conn.execute('''
+        UPDATE investments SET current_value = r.new_value
+        FROM temp.revalued r
+        WHERE investments.id = r.id
+    ''')
+    conn.execute('''
+        UPDATE users SET balance = balance + d.delta
+        FROM (
+            SELECT user_id, SUM(delta) AS delta
+            FROM temp.revalued
+            GROUP BY user_id
+        ) d
+        WHERE users.id = d.user_id AND d.delta != 0
+    ''')
+    conn.execute('''
+        UPDATE portfolio_summary SET current_value = current_value + d.delta
+        FROM (
+            SELECT user_id, category, SUM(delta) AS delta
+            FROM temp.revalued
+            GROUP BY user_id, category
+        ) d
+        WHERE portfolio_summary.user_id = d.user_id
+          AND portfolio_summary.category = d.category
+    ''')
+    # A new portfolio version for every user whose values moved
+    conn.execute('''
+        INSERT INTO revisions (scope, revision)
+        SELECT DISTINCT ? || user_id, 1 FROM temp.revalued WHERE delta != 0
+        ON CONFLICT(scope) DO UPDATE SET revision = revision + 1
+    ''', (USER_SCOPE_PREFIX,))
+
+    return {'investments_updated': count, 'total_change': float(deltas.sum())}
@@ -0,0 +1,61 @@
+"""
+Nightly revaluation job for every user on the platform
+
+Runs the same market simulation as ``POST /user/update-investments``, but for
+all users at once and outside the Flask request path, so it can be scheduled
+from cron (or a Heroku Scheduler job) instead of relying on each client to
+trigger it.
+
+Usage:
+    python revalue_all.py [--db database.db] [--chunk-size 500] [--quiet]
+
+Example crontab entry (every night at 02:00):
+    0 2 * * * cd /path/to/backend && python revalue_all.py >> revalue.log 2>&1
+"""
+
+import argparse
+import sys
+
+from models import Database
+from revaluation import DEFAULT_CHUNK_SIZE
+
+def print_progress(stats):
+    """Print one progress line per processed chunk"""
+    print(
+        f"  chunk {stats['chunks']:>5}: "
+        f"{stats['users_processed']:>8} users, "
+        f"{stats['investments_updated']:>10} investments, "
+        f"{stats['investments_per_second']:>10.0f} investments/s"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Revalue every user\'s investments')
+    parser.add_argument('--db', default='database.db', help='Path to the SQLite database')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Users revalued per transaction')
+    parser.add_argument('--quiet', action='store_true', help='Only print the final summary')
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        print(f'Revaluing investments in {args.db} ({args.chunk_size} users per chunk)')
+        result = db.revalue_all_users(
+            chunk_size=args.chunk_size,
+            progress=None if args.quiet else print_progress
+        )
+    finally:
+        db.close()
+
+    if not result['success']:
+        print(result['message'], file=sys.stderr)
+        return 1
+
+    print(
+        f"{result['message']} in {result['elapsed_seconds']:.2f}s "
+        f"({result['investments_per_second']:.0f} investments/s), "
+        f"net change ${result['total_change']:,.2f}"
+    )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Deterministic random streams for the simulated market data
+
+Every random number the API hands out comes from a NumPy ``Generator``
+seeded from a base seed, a purpose ('portfolio', 'revaluation', ...), a
+user id and the current period (a UTC day by default). The same request in
+the same period therefore returns the same bytes, which makes responses
+cacheable and load tests reproducible, while the numbers still move from
+one day to the next.
+
+Usage:
+    streams = RandomStreams(seed=42)
+    rng = streams.generator('portfolio', user_id=7)
+    rng.uniform(-0.01, 0.01, size=3)
+"""
+
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+# Length of one period in seconds; draws change when the period does
+DAY = 86400
+
+class RandomStreams:
+    """Factory for seeded per-purpose, per-user, per-period NumPy generators"""
+
+    def __init__(self, seed=0, period_seconds=DAY):
+        self.seed = seed
+        self.period_seconds = period_seconds
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def period(self, now=None):
+        """Index of the period containing ``now`` (a datetime or UNIX timestamp)"""
+        if now is None:
+            now = time.time()
+        elif isinstance(now, datetime):
+            now = now.timestamp()
+        return int(now // self.period_seconds)
+
+    def _entropy(self, purpose, user_id, period, key):
+        return [self.seed, period, zlib.crc32(purpose.encode('utf-8')), user_id, *key]
+
+    def generator(self, purpose, user_id=0, key=(), now=None):
+        """A fresh generator for one purpose, user and period
+
+        ``key`` adds further non-negative integers to the seed (e.g. an id)
+        when one user needs several independent streams for the same purpose.
+        """
+        return np.random.default_rng(self._entropy(purpose, user_id, self.period(now), key))
+
+    def seed_for(self, purpose, user_id=0, now=None):
+        """A 32-bit integer seed, for code that takes a seed rather than a generator"""
+        return int(self.generator(purpose, user_id, now=now).integers(0, 2 ** 32))
+
+    def uniform_table(self, purpose, size, columns=1, now=None):
+        """Uniform [0, 1) draws laid out as ``size`` rows of ``columns``
+
+        Row ``i`` is the same for any ``size`` greater than ``i`` within a
+        period, so the table can be indexed by id (e.g. a project id) and
+        every id keeps its numbers no matter which other ids are asked for.
+        The table for the current period is cached and grown on demand.
+        """
+        period = self.period(now)
+        cache_key = (purpose, columns)
+        with self._lock:
+            cached = self._tables.get(cache_key)
+            if cached is None or cached[0] != period or len(cached[1]) < size:
+                rows = max(size, 2 * len(cached[1]) if cached and cached[0] == period else size)
+                rng = np.random.default_rng(self._entropy(purpose, 0, period, ()))
+                table = rng.random((rows, columns))
+                table.flags.writeable = False  # shared by every request
+                cached = (period, table)
+                self._tables[cache_key] = cached
+            return cached[1]
@@ -0,0 +1,129 @@
+"""
+Monte Carlo simulation engine for portfolio projections
+
+Simulates thousands of possible futures for a user's actual holdings and
+summarises them as percentile bands for the /simulation charts. Each project
+position follows a geometric Brownian motion driven by its ``expected_roi``
+(drift) and its risk level volatility (see ``Database._get_risk_multiplier``),
+stepped monthly.
+
+Paths are generated in fixed-size batches, each with its own child seed
+spawned from the request seed, so a given seed produces the same bands whether
+the batches run in this process or are spread over the process pool.
+"""
+
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Paths simulated per batch (one unit of work for the process pool)
+BATCH_SIZE = 2000
+
+# Most random draws (paths x months x positions) held in memory at once;
+# 2M float64 normals is 16 MB, a few times that with the temporaries
+MAX_BATCH_ELEMENTS = 2_000_000
+
+# Path counts at or above this are split across worker processes
+PARALLEL_THRESHOLD = 20000
+
+# Percentiles reported for every month of the horizon
+PERCENTILES = (5, 25, 50, 75, 95)
+
+STEPS_PER_YEAR = 12
+
+_executor = None
+
+def _get_executor():
+    """Lazily start the shared process pool (after any gunicorn fork)"""
+    global _executor
+    if _executor is None:
+        workers = int(os.environ.get('SIMULATION_WORKERS', 0)) or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(_executor.shutdown)
+    return _executor
+
+def simulate_batch(values, expected_roi, volatility, horizon, paths, seed):
+    """Simulate ``paths`` futures and return total portfolio value per month
+
+    ``values``, ``expected_roi`` (percent) and ``volatility`` (annual) are
+    per-position arrays. Returns an array of shape (paths, horizon + 1).
+
+    Paths are drawn in chunks of at most MAX_BATCH_ELEMENTS normals, so a
+    portfolio of thousands of positions over a long horizon does not need
+    gigabytes at once. The generator fills draws path by path either way,
+    so chunking does not change the result for a seed.
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / STEPS_PER_YEAR
+
+    mu = np.asarray(expected_roi, dtype=np.float64) / 100
+    sigma = np.asarray(volatility, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    drift = (mu - 0.5 * sigma ** 2) * dt
+    shock = sigma * np.sqrt(dt)
+
+    totals = np.empty((paths, horizon + 1))
+    totals[:, 0] = np.sum(values)
+    chunk = max(1, MAX_BATCH_ELEMENTS // max(1, horizon * len(mu)))
+    for start in range(0, paths, chunk):
+        stop = min(start + chunk, paths)
+        # (paths, horizon, positions) log-returns, accumulated along the horizon
+        z = rng.standard_normal((stop - start, horizon, len(mu)))
+        log_growth = np.cumsum(drift + shock * z, axis=1)
+        totals[start:stop, 1:] = np.exp(log_growth) @ values
+    return totals
+
+def run_monte_carlo(values, expected_roi, volatility, paths=1000, horizon=12, seed=None):
+    """Run a Monte Carlo projection and summarise it as percentile bands
+
+    Args:
+        values: Current value of each position
+        expected_roi: Expected annual ROI of each position, in percent
+        volatility: Annual volatility of each position (e.g. 0.05)
+        paths: Number of simulated futures
+        horizon: Number of months to project
+        seed: Optional seed; the same seed always returns the same bands
+
+    Returns:
+        dict with one band entry per month plus summary statistics
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    batch_sizes = [BATCH_SIZE] * (paths // BATCH_SIZE)
+    if paths % BATCH_SIZE:
+        batch_sizes.append(paths % BATCH_SIZE)
+    child_seeds = seed_sequence.spawn(len(batch_sizes))
+
+    args = [
+        (values, expected_roi, volatility, horizon, size, child)
+        for size, child in zip(batch_sizes, child_seeds)
+    ]
+
+    if paths >= PARALLEL_THRESHOLD and len(args) > 1:
+        futures = [_get_executor().submit(simulate_batch, *a) for a in args]
+        batches = [future.result() for future in futures]
+    else:
+        batches = [simulate_batch(*a) for a in args]
+
+    totals = np.concatenate(batches)
+    bands = np.percentile(totals, PERCENTILES, axis=0)
+    mean = totals.mean(axis=0)
+    start_value = float(np.sum(values))
+    final = totals[:, -1]
+
+    return {
+        'paths': paths,
+        'horizon_months': horizon,
+        'seed': seed,
+        'start_value': round(start_value, 2),
+        'bands': [
+            dict(
+                {'month': month, 'mean': round(float(mean[month]), 2)},
+                **{f'p{p}': round(float(bands[i][month]), 2) for i, p in enumerate(PERCENTILES)}
+            )
+            for month in range(horizon + 1)
+        ],
+        'expected_final_value': round(float(final.mean()), 2),
+        'probability_of_loss': round(float(np.mean(final < start_value)), 4)
+    }
@@ -0,0 +1,143 @@
+"""
+Time series of portfolio value snapshots with daily and monthly rollups
+
+Every revaluation appends one row per revalued user whose portfolio changed
+since their last snapshot to ``portfolio_snapshots`` (user, UNIX time,
+amount invested, current value), read straight from the
+``portfolio_summary`` aggregates. In the same statement batch it folds the
+new rows into ``portfolio_daily`` and ``portfolio_monthly``, which keep the
+open/high/low/close value, the invested amount at the close and a sample
+count per UTC day or month. Charts then read a few hundred precomputed
+points instead of recomputing history.
+
+Rollups are maintained incrementally with upserts and assume snapshots are
+appended in time order, which holds as long as they are stamped with the
+time they are taken.
+"""
+
+from datetime import datetime, timezone
+
+# Finest resolution history_range picks when asked for 'auto' is the one
+# returning at most this many points
+MAX_AUTO_POINTS = 400
+
+# resolution -> (table, bucket column, SQL mapping a UNIX time to its bucket start)
+RESOLUTIONS = {
+    'raw': ('portfolio_snapshots', 'taken_at', '{t}'),
+    'daily': ('portfolio_daily', 'day_start', '({t} - {t} % 86400)'),
+    'monthly': ('portfolio_monthly', 'month_start',
+                "CAST(strftime('%s', {t}, 'unixepoch', 'start of month') AS INTEGER)"),
+}
+
+def record_snapshots(conn, first_user_id, last_user_id, taken_at):
+    """Snapshot every user with an id in [first, last] who holds investments
+
+    Runs inside the caller's transaction. ``taken_at`` is a UNIX time in
+    seconds. A user whose invested amount and value equal their latest
+    snapshot gets none (a repeat revaluation on the same day changes
+    nothing); a second snapshot in the same second replaces the first, and
+    only counts as a new sample in the rollups when no snapshot was there.
+    """
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS snapshot_batch (
+            user_id INTEGER PRIMARY KEY,
+            invested REAL NOT NULL,
+            current_value REAL NOT NULL,
+            is_new INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('DELETE FROM temp.snapshot_batch')
+    conn.execute('''
+        INSERT INTO temp.snapshot_batch (user_id, invested, current_value, is_new)
+        SELECT s.user_id, s.invested, s.current_value,
+               NOT EXISTS (SELECT 1 FROM portfolio_snapshots
+                           WHERE user_id = s.user_id AND taken_at = ?)
+        FROM (
+            SELECT user_id, SUM(invested) AS invested, SUM(current_value) AS current_value
+            FROM portfolio_summary
+            WHERE user_id BETWEEN ? AND ?
+            GROUP BY user_id
+        ) s
+        WHERE (s.invested, s.current_value) IS NOT (
+            SELECT invested, current_value FROM portfolio_snapshots
+            WHERE user_id = s.user_id
+            ORDER BY taken_at DESC
+            LIMIT 1
+        )
+    ''', (taken_at, first_user_id, last_user_id))
+
+    conn.execute('''
+        INSERT OR REPLACE INTO portfolio_snapshots (user_id, taken_at, invested, current_value)
+        SELECT user_id, ?, invested, current_value FROM temp.snapshot_batch
+    ''', (taken_at,))
+
+    for resolution in ('daily', 'monthly'):
+        table, bucket, _ = RESOLUTIONS[resolution]
+        conn.execute(f'''
+            INSERT INTO {table} (user_id, {bucket}, open_value, high_value, low_value,
+                                 close_value, invested, samples)
+            SELECT user_id, ?, current_value, current_value, current_value, current_value,
+                   invested, is_new
+            FROM temp.snapshot_batch
+            WHERE true  -- an upsert's SELECT needs a WHERE clause to parse
+            ON CONFLICT(user_id, {bucket}) DO UPDATE SET
+                high_value = MAX(high_value, excluded.high_value),
+                low_value = MIN(low_value, excluded.low_value),
+                close_value = excluded.close_value,
+                invested = excluded.invested,
+                samples = samples + excluded.samples
+        ''', (bucket_start(resolution, taken_at),))
+
+def delete_history(conn, users_sql, parameters=()):
+    """Delete the snapshots and rollups of every user id returned by ``users_sql``"""
+    for table, _, _ in RESOLUTIONS.values():
+        conn.execute(f'DELETE FROM {table} WHERE user_id IN ({users_sql})', parameters)
+
+def bucket_start(resolution, timestamp):
+    """Start of the bucket a UNIX time falls in, matching the SQL in RESOLUTIONS"""
+    if resolution == 'daily':
+        return timestamp - timestamp % 86400
+    if resolution == 'monthly':
+        moment = datetime.fromtimestamp(timestamp, timezone.utc)
+        return int(moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp())
+    return timestamp
+
+def _count(conn, resolution, user_id, since, until):
+    table, bucket, _ = RESOLUTIONS[resolution]
+    return conn.execute(f'''
+        SELECT COUNT(*) FROM {table}
+        WHERE user_id = ? AND {bucket} >= ? AND {bucket} < ?
+    ''', (user_id, bucket_start(resolution, since), until)).fetchone()[0]
+
+def history_range(conn, user_id, since, until, resolution='auto', limit=None):
+    """A user's portfolio history between two UNIX times, oldest point first
+
+    ``since`` is rounded down to the start of its bucket, so the bucket it
+    falls in is included; ``until`` is exclusive. 'auto' picks the finest
+    resolution with at most MAX_AUTO_POINTS points. ``limit`` keeps only the
+    most recent points. Returns ``(resolution, points)``.
+    """
+    if resolution == 'auto':
+        resolution = 'monthly'
+        for candidate in ('raw', 'daily'):
+            if _count(conn, candidate, user_id, since, until) <= MAX_AUTO_POINTS:
+                resolution = candidate
+                break
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of: auto, {', '.join(RESOLUTIONS)}")
+
+    table, bucket, _ = RESOLUTIONS[resolution]
+    if resolution == 'raw':
+        values = 'current_value, current_value, current_value, current_value, invested, 1'
+    else:
+        values = 'open_value, high_value, low_value, close_value, invested, samples'
+    rows = conn.execute(f'''
+        SELECT strftime('%Y-%m-%dT%H:%M:%SZ', {bucket}, 'unixepoch'), {values}
+        FROM {table}
+        WHERE user_id = ? AND {bucket} >= ? AND {bucket} < ?
+        ORDER BY {bucket} DESC
+        LIMIT ?
+    ''', (user_id, bucket_start(resolution, since), until, -1 if limit is None else limit)).fetchall()
+
+    columns = ('time', 'open', 'high', 'low', 'value', 'invested', 'samples')
+    return resolution, [dict(zip(columns, row)) for row in reversed(rows)]
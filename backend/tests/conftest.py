@@ -0,0 +1,31 @@
+"""
+Shared test fixtures
+
+Run from backend/:
+    python -m pytest -q
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py opens DATABASE_PATH on import; keep the tests off the real database.db
+_workdir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_PATH'] = os.path.join(_workdir, 'app.db')
+
+from models import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """A freshly seeded database with the catalogue read model on"""
+    db_path = str(tmp_path / 'test.db')
+    database = Database(db_path, pool_size=2, catalogue_path=db_path + '.catalogue')
+    yield database
+    database.close()
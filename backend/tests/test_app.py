@@ -0,0 +1,21 @@
+import pytest
+
+from app import app
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.mark.parametrize('query', ['seed=-1', 'user_id=-1', 'user_id=-5&seed=3'])
+def test_simulation_rejects_negative_seed_and_user_id(client, query):
+    response = client.get(f'/simulation?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert 'non-negative' in response.get_json()['message']
+
+def test_simulation_accepts_explicit_seed(client):
+    response = client.get('/simulation?seed=7&paths=10')
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
@@ -0,0 +1,23 @@
+from werkzeug.wrappers import Request
+
+from asgi import build_environ
+
+def scope(headers):
+    return {'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers}
+
+def test_repeated_cookie_headers_are_joined_with_semicolons():
+    environ = build_environ(scope([(b'cookie', b'a=1'), (b'cookie', b'b=2; c=3')]), b'')
+
+    assert environ['HTTP_COOKIE'] == 'a=1; b=2; c=3'
+
+def test_other_repeated_headers_are_joined_with_commas():
+    environ = build_environ(scope([(b'accept', b'text/html'), (b'Accept', b'application/json')]), b'')
+
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+
+def test_non_ascii_paths_reach_flask_decoded_once():
+    environ = build_environ(dict(scope([]), path='/projects/café', root_path='/api/ü'), b'')
+
+    request = Request(environ)
+    assert request.path == '/projects/café'
+    assert request.script_root == '/api/ü'
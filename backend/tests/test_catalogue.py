@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+@pytest.fixture
+def failing_refresh(db, monkeypatch):
+    """Make every read model refresh fail after the write has committed"""
+    def fail(*args):
+        raise sqlite3.OperationalError('Connection pool exhausted')
+    monkeypatch.setattr(db.catalogue, 'apply_funding', fail)
+    monkeypatch.setattr(db.catalogue, 'rebuild', fail)
+    return db
+
+def funding(db, project_id):
+    return next(project['current_funding'] for project in db.get_projects()
+                if project['id'] == project_id)
+
+def test_investment_succeeds_when_refresh_fails(failing_refresh):
+    db = failing_refresh
+    before = funding(db, 1)
+
+    result = db.make_investment(1, 1, 100.0)
+
+    assert result['success'] is True
+    assert db.get_user(1)['balance'] == 9900.0
+    # The stale read model is rebuilt by the next reader
+    assert funding(db, 1) == before + 100.0
+
+def test_batch_investment_succeeds_when_refresh_fails(failing_refresh):
+    db = failing_refresh
+
+    result = db.make_investments(1, [{'project_id': 1, 'amount': 50.0},
+                                     {'project_id': 2, 'amount': 25.0}])
+
+    assert result['success'] is True
+    assert result['new_balance'] == 9925.0
+    assert db.get_user(1)['balance'] == 9925.0
+
+def test_reset_succeeds_when_refresh_fails(db, monkeypatch):
+    before = funding(db, 1)
+    assert db.make_investment(1, 1, 100.0)['success']
+    monkeypatch.setattr(db.catalogue, 'rebuild', lambda: 1 / 0)
+
+    result = db.reset_users([1], 10000.0)
+
+    assert result['success'] is True
+    assert result['investments_cleared'] == 1
+    assert db.get_user(1)['balance'] == 10000.0
+    assert funding(db, 1) == before
+
+def test_page_cache_sits_in_front_of_read_model(db, monkeypatch):
+    reads = []
+    read_model = db._catalogue_projects
+    monkeypatch.setattr(db, '_catalogue_projects', lambda *args: reads.append(args) or read_model(*args))
+
+    first = db.get_projects_page(sort='roi', limit=5)
+    assert db.get_projects_page(sort='roi', limit=5) == first
+    assert len(reads) == 1
+
+    # An investment bumps the catalogue revision, so the next read misses
+    assert db.make_investment(1, first['projects'][0]['id'], 10.0)['success']
+    page = db.get_projects_page(sort='roi', limit=5)
+    assert len(reads) == 2
+    assert page['projects'][0]['current_funding'] == first['projects'][0]['current_funding'] + 10.0
+
+def reopen(tmp_path):
+    from models import Database
+    db_path = str(tmp_path / 'test.db')
+    return Database(db_path, pool_size=2, catalogue_path=db_path + '.catalogue')
+
+def test_recreated_database_ignores_leftover_catalogue_file(db, tmp_path):
+    before = funding(db, 1)
+    assert db.make_investment(1, 1, 500.0)['success']
+    assert funding(db, 1) == before + 500.0
+    db.close()
+
+    # Recreate the database next to the old read model file
+    (tmp_path / 'test.db').unlink()
+    recreated = reopen(tmp_path)
+    try:
+        assert funding(recreated, 1) == before
+        assert recreated.make_investment(1, 1, 100.0)['success']
+        assert funding(recreated, 1) == before + 100.0
+    finally:
+        recreated.close()
+
+def copy_database(source, target):
+    with sqlite3.connect(source) as source_conn, sqlite3.connect(target) as target_conn:
+        source_conn.backup(target_conn)
+
+def test_restored_backup_rebuilds_newer_catalogue_file(db, tmp_path):
+    before = funding(db, 1)
+    copy_database(tmp_path / 'test.db', tmp_path / 'backup.db')
+    assert db.make_investment(1, 1, 500.0)['success']
+    assert funding(db, 1) == before + 500.0
+    db.close()
+
+    copy_database(tmp_path / 'backup.db', tmp_path / 'test.db')
+    restored = reopen(tmp_path)
+    try:
+        assert funding(restored, 1) == before
+    finally:
+        restored.close()
@@ -0,0 +1,49 @@
+def balance(db, user_id=1):
+    return db.get_user(user_id)['balance']
+
+def project_funding(db):
+    return {project['id']: project['current_funding'] for project in db.get_projects()}
+
+def investment_count(db):
+    with db.connection(readonly=True) as conn:
+        return conn.execute('SELECT COUNT(*) FROM investments').fetchone()[0]
+
+def test_batch_applies_every_leg(db):
+    funding = project_funding(db)
+
+    result = db.make_investments(1, [{'project_id': 1, 'amount': 100.0},
+                                     {'project_id': 1, 'amount': 50.0},
+                                     {'project_id': 2, 'amount': 25.0}])
+
+    assert result['success'] is True
+    assert [leg['success'] for leg in result['results']] == [True, True, True]
+    assert balance(db) == 10000.0 - 175.0
+    after = project_funding(db)
+    assert after[1] == funding[1] + 150.0
+    assert after[2] == funding[2] + 25.0
+    assert investment_count(db) == 3
+
+def test_batch_with_unknown_project_applies_nothing(db):
+    funding = project_funding(db)
+
+    result = db.make_investments(1, [{'project_id': 1, 'amount': 100.0},
+                                     {'project_id': 999, 'amount': 50.0}])
+
+    assert result['success'] is False
+    assert [leg['success'] for leg in result['results']] == [False, False]
+    assert balance(db) == 10000.0
+    assert project_funding(db) == funding
+    assert investment_count(db) == 0
+    assert db.check_portfolio_summary()['consistent']
+
+def test_batch_over_the_balance_applies_nothing(db):
+    funding = project_funding(db)
+
+    result = db.make_investments(1, [{'project_id': 1, 'amount': 6000.0},
+                                     {'project_id': 2, 'amount': 5000.0}])
+
+    assert result['success'] is False
+    assert result['message'] == 'Insufficient balance'
+    assert balance(db) == 10000.0
+    assert project_funding(db) == funding
+    assert investment_count(db) == 0
@@ -0,0 +1,24 @@
+import sqlite3
+
+import migrations
+from migrations import get_schema_version, migrate
+
+# Fails if applied twice, like most real migrations
+WIDGETS = [(1, 'Add widgets', ['CREATE TABLE widgets (id INTEGER PRIMARY KEY)'])]
+
+def test_migration_applied_by_another_process_is_skipped(tmp_path, monkeypatch):
+    path = tmp_path / 'race.db'
+    conn = sqlite3.connect(path)
+
+    other = sqlite3.connect(path)
+    assert migrate(other, WIDGETS) == [1]
+    other.close()
+
+    # This worker read the version before the other one migrated the file
+    stale_reads = [0]
+    monkeypatch.setattr(migrations, 'get_schema_version',
+                        lambda c: stale_reads.pop() if stale_reads else get_schema_version(c))
+
+    assert migrate(conn, WIDGETS) == []
+    assert get_schema_version(conn) == 1
+    conn.close()
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+
+import pytest
+
+from models import ConnectionPool
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+def test_released_connection_is_reused(pool):
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    pool.release(second)
+
+    assert second is first
+    assert (pool.hits, pool.misses) == (1, 1)
+
+def test_reentrant_acquire_returns_the_held_connection(pool):
+    outer = pool.acquire()
+    inner = pool.acquire()
+    pool.release(inner)
+
+    assert inner is outer
+    assert pool.in_use == 1
+    pool.release(outer)
+    assert pool.in_use == 0
+
+def test_exhausted_pool_times_out(pool):
+    held = []
+    ready = threading.Barrier(3)
+    done = threading.Event()
+
+    def hold():
+        held.append(pool.acquire())
+        ready.wait()
+        done.wait()
+        pool.release(held[-1])
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='exhausted'):
+            pool.acquire()
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+def test_release_rolls_back_an_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE items (id INTEGER)')
+    conn.execute('BEGIN')
+    conn.execute('INSERT INTO items VALUES (1)')
+    pool.release(conn)
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+    pool.release(conn)
+
+def test_broken_idle_connection_is_replaced(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+
+    replacement = pool.acquire()
+    pool.release(replacement)
+
+    assert replacement is not conn
+    assert pool.health_check_failures == 1
@@ -0,0 +1,36 @@
+import pytest
+
+def assert_consistent(db):
+    check = db.check_portfolio_summary()
+    assert check['consistent'], check['mismatches']
+
+def age_investments(db, days=30):
+    with db.connection() as conn:
+        conn.execute("UPDATE investments SET investment_date = datetime('now', ?)", (f'-{days} days',))
+        conn.commit()
+
+@pytest.fixture
+def db(db):
+    with db.connection() as conn:
+        conn.execute("INSERT INTO users (username, balance) VALUES ('second_user', 10000.0)")
+        conn.commit()
+    return db
+
+def test_summary_stays_consistent_through_invest_revalue_and_reset(db):
+    assert db.make_investment(1, 1, 100.0)['success']
+    assert db.make_investment(2, 3, 250.0)['success']
+    assert db.make_investments(1, [{'project_id': 2, 'amount': 40.0},
+                                   {'project_id': 2, 'amount': 60.0},
+                                   {'project_id': 5, 'amount': 75.0}])['success']
+    assert_consistent(db)
+
+    age_investments(db)
+    assert db.update_investment_values(1)['investments_updated'] == 4
+    assert_consistent(db)
+    assert db.revalue_all_users()['success']
+    assert_consistent(db)
+
+    assert db.reset_user_completely(1, 10000.0)['success']
+    assert_consistent(db)
+    assert db.reset_users([1, 2], 10000.0)['success']
+    assert_consistent(db)
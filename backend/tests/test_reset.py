@@ -0,0 +1,56 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from benchmarks.reset_users import legacy_reset_user
+from benchmarks.suite import seed_database
+from models import Database
+
+DEFAULT_BALANCE = 10000.0
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('reset') / 'seed.db')
+    user_ids, _ = seed_database(path, users=20, projects=15, investments=600, seed=3)
+    return path, user_ids[:8]
+
+def state(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            'funding': conn.execute('SELECT id, current_funding FROM projects ORDER BY id').fetchall(),
+            'balances': conn.execute('SELECT id, balance FROM users ORDER BY id').fetchall(),
+            'investments': conn.execute('SELECT * FROM investments ORDER BY id').fetchall(),
+            'summary': conn.execute('SELECT * FROM portfolio_summary ORDER BY user_id, category').fetchall(),
+        }
+    finally:
+        conn.close()
+
+def reset_copy(seeded, tmp_path, strategy):
+    source, user_ids = seeded
+    path = str(tmp_path / f'{strategy}.db')
+    shutil.copyfile(source, path)
+    db = Database(path, pool_size=1)
+    try:
+        if strategy == 'bulk':
+            cleared = db.reset_users(user_ids, DEFAULT_BALANCE)['investments_cleared']
+        else:
+            reset = legacy_reset_user if strategy == 'legacy' else Database.reset_user_completely
+            cleared = sum(reset(db, user_id, DEFAULT_BALANCE)['investments_cleared'] for user_id in user_ids)
+        assert db.check_portfolio_summary()['consistent']
+    finally:
+        db.close()
+    return cleared, state(path)
+
+@pytest.mark.parametrize('strategy', ['single', 'bulk'])
+def test_set_based_resets_match_the_per_project_loop(seeded, tmp_path, strategy):
+    legacy_cleared, legacy = reset_copy(seeded, tmp_path, 'legacy')
+    cleared, after = reset_copy(seeded, tmp_path, strategy)
+
+    assert cleared == legacy_cleared > 0
+    # The bulk reset subtracts all users' totals from a project at once, so
+    # funding may differ from the one-user-at-a-time loop in the last bit
+    legacy_funding = dict(legacy.pop('funding'))
+    assert dict(after.pop('funding')) == pytest.approx(legacy_funding, rel=1e-12)
+    assert after == legacy
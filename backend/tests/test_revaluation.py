@@ -0,0 +1,146 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import revaluation
+from models import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """A database whose demo user holds six month-old positions"""
+    database = Database(str(tmp_path / 'revalue.db'), pool_size=8)
+    for project_id in range(1, 7):
+        assert database.make_investment(1, project_id, 100.0 * project_id)['success']
+    with database.connection() as conn:
+        conn.execute("UPDATE investments SET investment_date = datetime('now', '-30 days')")
+        conn.commit()
+    yield database
+    database.close()
+
+def portfolio_value(db, user_id=1):
+    with db.connection(readonly=True) as conn:
+        return conn.execute('''
+            SELECT SUM(current_value) - SUM(amount) FROM investments WHERE user_id = ?
+        ''', (user_id,)).fetchone()[0]
+
+def run_in_parallel(count, func):
+    """Call ``func(index)`` from ``count`` threads released together; returns the results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = func(index)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class StreamRandom(random.Random):
+    """random.Random whose random() replays a fixed sequence of draws"""
+
+    def __init__(self, draws):
+        super().__init__()
+        self.draws = iter(draws)
+
+    def random(self):
+        return next(self.draws)
+
+def legacy_revaluation(rows, risk_multiplier, rng, now):
+    """The original per-row update_investment_values loop: ({id: new value}, total change)"""
+    new_values = {}
+    total_balance_change = 0
+    for investment in rows:
+        days_invested = (now - datetime.fromisoformat(investment['investment_date'])).days
+        if days_invested < 1:
+            continue
+        expected_roi = investment['expected_roi'] / 100
+        random_factor = rng.uniform(-risk_multiplier(investment['risk_level']),
+                                    risk_multiplier(investment['risk_level']))
+        daily_performance = (expected_roi / 365) + (random_factor / 365)
+        original_amount = investment['amount']
+        new_value = max(original_amount * (1 + daily_performance) ** days_invested,
+                        original_amount * 0.1)
+        new_values[investment['id']] = new_value
+        total_balance_change += new_value - investment['current_value']
+    return new_values, total_balance_change
+
+def test_revaluation_matches_the_legacy_loop_bit_for_bit(db):
+    now = datetime(2026, 6, 15, 12, 30, 45)
+    legs = [{'project_id': project_id, 'amount': 10.0 + 7.3 * leg}
+            for leg in range(7) for project_id in range(1, 7)]
+    assert db.make_investments(1, legs)['success']
+    with db.connection() as conn:
+        # Ages from hours to years, some too young to revalue
+        for investment_id in range(1, len(legs) + 7):
+            if investment_id % 9 == 0:
+                age = timedelta(hours=investment_id % 20)
+            else:
+                age = timedelta(hours=investment_id * 37 % 900, days=investment_id ** 2 % 800)
+            conn.execute('UPDATE investments SET investment_date = ? WHERE id = ?',
+                         ((now - age).strftime('%Y-%m-%d %H:%M:%S'), investment_id))
+        conn.commit()
+        rows = conn.execute('''
+            SELECT i.*, p.expected_roi, p.risk_level
+            FROM investments i JOIN projects p ON i.project_id = p.id
+            WHERE i.user_id = 1 ORDER BY i.id
+        ''').fetchall()
+
+        # The engine draws once per position in id order and discards the
+        # draws of positions too young to revalue; the loop draws only for
+        # the positions it revalues
+        draws = db.streams.generator('revaluation', 1, now=now).random(len(rows)).tolist()
+        revalued_draws = [draw for row, draw in zip(rows, draws)
+                          if (now - datetime.fromisoformat(row['investment_date'])).days >= 1]
+        legacy_values, legacy_change = legacy_revaluation(
+            rows, db._get_risk_multiplier, StreamRandom(revalued_draws), now
+        )
+
+        result = revaluation.revalue_user(conn, 1, db._get_risk_multiplier, db.streams, now=now)
+        conn.commit()
+        values = dict(conn.execute('SELECT id, current_value FROM investments WHERE user_id = 1').fetchall())
+
+    assert result['investments_updated'] == len(legacy_values)
+    assert 0 < len(legacy_values) < len(rows)
+    assert {key: values[key] for key in legacy_values} == legacy_values
+    assert result['total_change'] == legacy_change
+
+def test_parallel_revaluations_apply_the_change_once(db):
+    balance = db.get_user(1)['balance']
+
+    results = run_in_parallel(4, lambda index: db.update_investment_values(1))
+
+    assert all(result['success'] for result in results)
+    gain = portfolio_value(db)
+    assert gain != 0
+    assert db.get_user(1)['balance'] == pytest.approx(balance + gain)
+    assert db.check_portfolio_summary()['consistent']
+
+def test_parallel_revalue_all_applies_the_change_once(db, monkeypatch):
+    # Hold each chunk after it has read its positions until the other one
+    # has too; with the write lock taken first, the second can't, and the
+    # wait times out
+    read_positions = threading.Barrier(2, timeout=0.5)
+    load = revaluation.load_positions_for_users
+
+    def load_then_wait(*args):
+        positions = load(*args)
+        try:
+            read_positions.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return positions
+
+    monkeypatch.setattr(revaluation, 'load_positions_for_users', load_then_wait)
+    balance = db.get_user(1)['balance']
+
+    results = run_in_parallel(2, lambda index: db.revalue_all_users())
+
+    assert all(result['success'] for result in results)
+    assert db.get_user(1)['balance'] == pytest.approx(balance + portfolio_value(db))
+    assert db.check_portfolio_summary()['consistent']
@@ -0,0 +1,33 @@
+import tracemalloc
+
+import numpy as np
+
+import simulation
+
+def portfolio(positions, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.random(positions) * 1000, rng.random(positions) * 20,
+            rng.choice([0.02, 0.05, 0.1], positions))
+
+def test_batch_memory_is_bounded_for_large_portfolios():
+    values, roi, volatility = portfolio(2000)
+
+    tracemalloc.start()
+    try:
+        totals = simulation.simulate_batch(values, roi, volatility, horizon=120, paths=50, seed=1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert totals.shape == (50, 121)
+    # Unchunked, the draws alone would be 50 x 120 x 2000 x 8 bytes = 96 MB
+    assert peak < 8 * simulation.MAX_BATCH_ELEMENTS * 4
+
+def test_chunking_does_not_change_results(monkeypatch):
+    values, roi, volatility = portfolio(30)
+    whole = simulation.simulate_batch(values, roi, volatility, horizon=24, paths=100, seed=7)
+
+    monkeypatch.setattr(simulation, 'MAX_BATCH_ELEMENTS', 24 * 30 * 7)
+    chunked = simulation.simulate_batch(values, roi, volatility, horizon=24, paths=100, seed=7)
+
+    np.testing.assert_allclose(chunked, whole, rtol=1e-12)
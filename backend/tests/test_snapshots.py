@@ -0,0 +1,40 @@
+import pytest
+
+from snapshots import record_snapshots
+
+DAY = 86400
+
+@pytest.fixture
+def conn(db):
+    assert db.make_investment(1, 1, 100.0)['success']
+    with db.connection() as conn:
+        yield conn
+
+def rows(conn, table):
+    return [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY 2')]
+
+def set_value(conn, current_value):
+    conn.execute('UPDATE portfolio_summary SET current_value = ? WHERE user_id = 1', (current_value,))
+
+def test_unchanged_portfolio_adds_no_snapshot(conn):
+    record_snapshots(conn, 1, 1, 10 * DAY)
+    record_snapshots(conn, 1, 1, 10 * DAY + 60)
+
+    assert len(rows(conn, 'portfolio_snapshots')) == 1
+    assert rows(conn, 'portfolio_daily')[0][-1] == 1
+
+    set_value(conn, 110.0)
+    record_snapshots(conn, 1, 1, 10 * DAY + 120)
+
+    assert len(rows(conn, 'portfolio_snapshots')) == 2
+    assert rows(conn, 'portfolio_daily')[0][-2:] == (100.0, 2)
+
+def test_replaced_snapshot_is_not_a_new_sample(conn):
+    record_snapshots(conn, 1, 1, 10 * DAY)
+    set_value(conn, 120.0)
+    record_snapshots(conn, 1, 1, 10 * DAY)
+
+    assert rows(conn, 'portfolio_snapshots') == [(1, 10 * DAY, 100.0, 120.0)]
+    for table in ('portfolio_daily', 'portfolio_monthly'):
+        _, _, open_value, high, low, close, invested, samples = rows(conn, table)[0]
+        assert (open_value, high, close, samples) == (100.0, 120.0, 120.0, 1)
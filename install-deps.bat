@@ -5,7 +5,7 @@ echo.
 echo 📂 Installing Backend Dependencies...
 cd backend
 echo Installing Python packages...
-pip install flask flask-cors
+pip install -r requirements.txt
 if %errorlevel% neq 0 (
     echo ❌ Failed to install Python dependencies!
     pause